@@ -51,5 +51,149 @@ def start(ctx, **kwargs):
     bot.run()
 
 
+@main.command('worldstate-server')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--port', default=8080, help="Port to serve the worldstate on.")
+@click.option('--requests-per-file', default=1, help="Number of requests to serve each recorded file for.")
+def worldstate_server(directory, **kwargs):
+    """Serve recorded worldstate files as a local stand-in for the worldstate endpoint."""
+
+    from aiohttp import web
+    from lib.worldstate_utils import RecordedWorldstateServer
+
+    server = RecordedWorldstateServer.from_directory(directory, kwargs['requests_per_file'])
+    web.run_app(server.get_app(), port=kwargs['port'])
+
+
+@main.command('worldstate-record')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--count', default=360, help="Number of times to poll the worldstate.")
+@click.option('--interval', default=10.0, help="Seconds between polls.")
+@click.option('--url', default=None, help="Worldstate endpoint to record from.")
+def worldstate_record(directory, **kwargs):
+    """Record every worldstate with changed fissures to a directory, for replaying later."""
+
+    import asyncio
+    from lib.worldstate_utils import record_worldstates, WORLDSTATE_URL
+
+    saved = asyncio.run(record_worldstates(directory, kwargs['count'], kwargs['interval'],
+                                           kwargs['url'] or WORLDSTATE_URL))
+    click.echo(f"Saved {saved} worldstates to {directory}")
+
+
+@main.command('tag-import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False), default='lib/data/tag_data.json')
+@click.option('--server', 'server_ids', type=int, multiple=True, required=True,
+              help="Server to link the imported tags to. Can be given more than once.")
+@click.option('--keep-existing', is_flag=True, help="Don't overwrite tags that already exist.")
+@click.option('--chunk-size', default=1000, help="Number of tags to send per query.")
+@click.pass_context
+def tag_import(ctx, path, server_ids, **kwargs):
+    """
+    Stream tags from a file in the legacy tag_data.json format into the database. A running bot picks the tags up
+    as its cached servers expire, within tag_resolver_ttl seconds.
+    """
+
+    import json
+    from lib.db.mercurius_db import MercuriusDatabase
+    from lib.tag_import_utils import iter_tag_data
+
+    bot_cfg = get_config(os.path.join(ctx.obj['basepath'], 'config.bot.json'))
+    database = MercuriusDatabase(user=bot_cfg['db_user'],
+                                 password=bot_cfg['db_password'],
+                                 host=bot_cfg['db_host'],
+                                 database='mercurius')
+
+    stats = database.bulk_insert_tags(iter_tag_data(path), list(server_ids),
+                                      overwrite=not kwargs['keep_existing'], chunk_size=kwargs['chunk_size'])
+    click.echo(json.dumps(stats, indent=4))
+
+
+@main.command('fissure-benchmark')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--servers', default=50, help="Number of synthetic servers.")
+@click.option('--log-channels', default=2, help="Fissure log channels per server.")
+@click.option('--list-channels', default=1, help="Fissure list channels per server.")
+@click.option('--users', default=500, help="Number of synthetic subscribers.")
+@click.option('--subscriptions-per-user', default=3, help="Fissure subscriptions per subscriber.")
+@click.option('--digest-ratio', default=0.0, help="Share of DM subscribers with DM digests enabled.")
+@click.option('--rest-latency', default=0.05, help="Simulated latency of each Discord REST call, in seconds.")
+@click.option('--seed', default=0, help="Seed for the synthetic data.")
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help="Write the full report here as JSON.")
+def fissure_benchmark(directory, **kwargs):
+    """Replay recorded worldstates through the fissure pipeline against stub Discord objects and database."""
+
+    import asyncio
+    import json
+    from lib.harness_utils import FissureReplayHarness
+
+    output = kwargs.pop('output')
+    harness = FissureReplayHarness.from_directory(directory, **kwargs)
+    report = asyncio.run(harness.run())
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    click.echo(json.dumps(report['summary'], indent=4))
+
+
+@main.command('subscription-benchmark')
+@click.option('--subscriptions', default=100000, help="Number of synthetic subscriptions.")
+@click.option('--users', default=40000, help="Number of users the subscriptions are spread over.")
+@click.option('--fissures', default=30, help="Number of random fissures to match.")
+@click.option('--seed', default=0, help="Seed for the synthetic data.")
+def subscription_benchmark(**kwargs):
+    """Compare matching fissures through the subscription index with scanning every subscription."""
+
+    import json
+    from lib.benchmark_utils import benchmark_subscription_index
+
+    click.echo(json.dumps(benchmark_subscription_index(**kwargs), indent=4))
+
+
+@main.command('autocomplete-benchmark')
+@click.option('--selections', default=3000, help="Number of random selections to autocomplete.")
+@click.option('--seed', default=0, help="Seed for the synthetic selections.")
+def autocomplete_benchmark(**kwargs):
+    """Compare fissure subscription autocomplete through the node facet index with filtering every node."""
+
+    import json
+    from lib.benchmark_utils import benchmark_node_autocomplete
+
+    click.echo(json.dumps(benchmark_node_autocomplete(**kwargs), indent=4))
+
+
+@main.command('embed-benchmark')
+@click.option('--users', default=10000, help="Number of synthetic DM subscribers.")
+@click.option('--subscriptions-per-user', default=3, help="Fissure subscriptions per subscriber.")
+@click.option('--fissures', default=8, help="Number of new fissures in the burst.")
+@click.option('--repeats', default=5, help="Number of runs the duration is averaged over.")
+@click.option('--seed', default=0, help="Seed for the synthetic data.")
+def embed_benchmark(**kwargs):
+    """Measure the allocations and time of building DM subscribers' fissure embeds for a burst of fissures."""
+
+    import asyncio
+    import json
+    from lib.benchmark_utils import benchmark_fissure_embeds
+
+    click.echo(json.dumps(asyncio.run(benchmark_fissure_embeds(**kwargs)), indent=4))
+
+
+@main.command('mercoin-benchmark')
+@click.option('--steals', default=500, help="Number of mercoin thefts.")
+@click.option('--users', default=10, help="Number of users stealing from each other.")
+@click.option('--starting-mercoins', default=5, help="Mercoins each user starts with.")
+@click.option('--latency', default=0.0005, help="Simulated latency of each database round trip, in seconds.")
+@click.option('--seed', default=0, help="Seed for the thefts.")
+def mercoin_benchmark(**kwargs):
+    """Compare the database round trips of mercoin thefts as separate calls and as one transaction."""
+
+    import json
+    from lib.benchmark_utils import benchmark_mercoin_steal
+
+    click.echo(json.dumps(benchmark_mercoin_steal(**kwargs), indent=4))
+
+
 if __name__ == '__main__':
-    main(obj={})
+    main(obj={})
\ No newline at end of file
@@ -0,0 +1,441 @@
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fissure_engine.common import sol_nodes
+from fissure_engine.fissure_engine import Fissure
+
+from lib.db.mercurius_db import MercuriusDatabase
+from lib.db.settings_cache import SettingsCache
+from lib.db.tag_resolver import TagResolver
+from lib.delivery_utils import DeliveryScheduler
+from lib.fissure_utils import (NODE_BLACKLIST, NODE_FILTER_RULES, SUBSCRIPTION_FIELDS, NodeFacetIndex,
+                               SubscriptionIndex, match_subscription)
+from lib.harness_utils import ERAS, FISSURE_TYPES, StubBot, StubDatabase, StubRest
+from lib.worldstate_utils import ReplayWorldstatePoller
+
+
+def _get_fissure_nodes() -> List[Dict[str, Any]]:
+    return [node for node in sol_nodes.values() if all(node.get(attr) for attr in ('node', 'type', 'planet',
+                                                                                     'enemy'))]
+
+
+def make_fissures(count: int, rng: random.Random) -> List[Fissure]:
+    """Create `count` fissures on random nodes, with random eras, tiers and fissure types."""
+    nodes = _get_fissure_nodes()
+    now = datetime.now()
+
+    fissures = []
+    for _ in range(count):
+        node = rng.choice(nodes)
+        fissures.append(Fissure(node['node'], node['type'], node['planet'], node.get('tileset', 'Space'),
+                                node['enemy'], rng.choice(ERAS), rng.randint(1, 5), now + timedelta(hours=1),
+                                rng.choice(FISSURE_TYPES), now, timedelta(hours=1)))
+
+    return fissures
+
+
+def make_subscriptions(count: int, users: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    Create `count` subscriptions spread over `users` users. Each field is set on about 30% of them, with values
+    taken from one random node so they can match, and every subscription sets at least one field.
+    """
+    nodes = _get_fissure_nodes()
+
+    subscriptions = []
+    for i in range(count):
+        node = rng.choice(nodes)
+        values = {
+            'fissure_type': rng.choice(FISSURE_TYPES),
+            'era': rng.choice(ERAS),
+            'node': node['node'],
+            'mission': node['type'],
+            'planet': node['planet'],
+            'tileset': node.get('tileset'),
+            'enemy': node['enemy'],
+            'max_tier': rng.randint(1, 5)
+        }
+
+        subscription = {field: values[field] if rng.random() < 0.3 else None for field in SUBSCRIPTION_FIELDS}
+        if all(value is None for value in subscription.values()):
+            subscription['era'] = values['era']
+        subscription['user_id'] = i % users
+        subscriptions.append(subscription)
+
+    return subscriptions
+
+
+def benchmark_subscription_index(subscriptions: int = 100000, users: int = 40000, fissures: int = 30,
+                                 seed: int = 0) -> Dict[str, Any]:
+    """
+    Time matching fissures against subscriptions through SubscriptionIndex and by scanning every subscription.
+
+    Args:
+        subscriptions: The number of synthetic subscriptions.
+        users: The number of users the subscriptions are spread over.
+        fissures: The number of random fissures to match.
+        seed: Seed for the synthetic data.
+
+    Returns:
+        The time per fissure of each approach in milliseconds, the index build time, the speedup, the number of
+        matches and whether both approaches matched the same users.
+    """
+    rng = random.Random(seed)
+    subscription_rows = make_subscriptions(subscriptions, users, rng)
+    fissure_list = make_fissures(fissures, rng)
+
+    start = time.perf_counter()
+    linear_matches = [{subscription['user_id'] for subscription in subscription_rows
+                       if match_subscription(subscription, fissure)} for fissure in fissure_list]
+    linear_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SubscriptionIndex()
+    index.load(subscription_rows)
+    build_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_matches = [set(index.match(fissure)) for fissure in fissure_list]
+    index_duration = time.perf_counter() - start
+
+    return {
+        'subscriptions': subscriptions,
+        'fissures': fissures,
+        'linear_ms_per_fissure': linear_duration * 1000 / fissures,
+        'index_ms_per_fissure': index_duration * 1000 / fissures,
+        'index_build_seconds': build_duration,
+        'speedup': linear_duration / index_duration if index_duration else None,
+        'matches': sum(len(matches) for matches in index_matches),
+        'identical': linear_matches == index_matches
+    }
+
+
+def _filter_nodes(selected_values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # The walk over every sol node that autocomplete made on each keystroke before NodeFacetIndex
+    nodes = list(sol_nodes.values())
+    for attr, values in NODE_BLACKLIST.items():
+        nodes = [node for node in nodes if attr not in node or node[attr] not in values]
+
+    for filter_key, filter_rules in NODE_FILTER_RULES.items():
+        filter_value = selected_values.get(filter_key)
+        for rule in filter_rules:
+            field, values = rule['field'], rule['values']
+            if rule['exclusive']:
+                if filter_value == rule['condition']:
+                    nodes = [node for node in nodes if node.get(field) in values]
+                elif filter_value is not None:
+                    nodes = [node for node in nodes if node.get(field) not in values]
+            elif filter_value == rule['condition']:
+                nodes = [node for node in nodes if field in node and node[field] in values]
+
+    return [node for node in nodes
+            if all(attr in node and node[attr].lower().startswith(value.lower())
+                   for attr, value in selected_values.items() if attr in node)]
+
+
+def _get_choices(nodes: List[Dict[str, Any]], current: str, key: str) -> List[str]:
+    choices = {node[key] for node in nodes if key in node} - {''}
+    return [choice for choice in choices if current.lower() in choice.lower()][:10]
+
+
+def make_autocomplete_selections(count: int, rng: random.Random) -> List[Dict[str, str]]:
+    """
+    Create `count` sets of selected values as autocomplete sees them: an era and fissure type some of the time,
+    plus prefixes of a random node's name, planet, tileset and enemy.
+    """
+    nodes = list(sol_nodes.values())
+
+    selections = []
+    for _ in range(count):
+        selected_values = {}
+        if rng.random() < 0.6:
+            selected_values['era'] = rng.choice(ERAS)
+        if rng.random() < 0.4:
+            selected_values['fissure_type'] = rng.choice(FISSURE_TYPES)
+
+        node = rng.choice(nodes)
+        for facet in ('node', 'planet', 'tileset', 'enemy'):
+            if rng.random() < 0.25 and node.get(facet):
+                selected_values[facet] = node[facet][:rng.randint(1, len(node[facet]))]
+
+        selections.append(selected_values)
+
+    return selections
+
+
+def benchmark_node_autocomplete(selections: int = 3000, seed: int = 0) -> Dict[str, Any]:
+    """
+    Time fissure subscription autocomplete through NodeFacetIndex and by filtering every sol node per call.
+
+    Args:
+        selections: The number of random selections to complete the node, planet, tileset and enemy facets for.
+        seed: Seed for the synthetic selections.
+
+    Returns:
+        The time per autocomplete call of each approach in microseconds, the index build time, the number of
+        selections the filtered nodes differ for, and the number of complete old results (fewer than 10 choices)
+        not contained in the new ones.
+    """
+    selection_list = make_autocomplete_selections(selections, random.Random(seed))
+    facets = ('node', 'planet', 'tileset', 'enemy')
+    calls = len(selection_list) * len(facets)
+
+    start = time.perf_counter()
+    index = NodeFacetIndex(list(sol_nodes.values()))
+    build_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    old_choices = [_get_choices(_filter_nodes(selected_values), selected_values.get(facet, ''), facet)
+                   for selected_values in selection_list for facet in facets]
+    old_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_choices = [index.get_choices(facet, selected_values.get(facet, ''), selected_values)
+                   for selected_values in selection_list for facet in facets]
+    new_duration = time.perf_counter() - start
+
+    filter_mismatches = sum(
+        sorted(map(id, _filter_nodes(selected_values))) != sorted(map(id, index.filter_nodes(selected_values)))
+        for selected_values in selection_list
+    )
+
+    return {
+        'calls': calls,
+        'old_us_per_call': old_duration * 10 ** 6 / calls,
+        'index_us_per_call': new_duration * 10 ** 6 / calls,
+        'index_build_seconds': build_duration,
+        'speedup': old_duration / new_duration if new_duration else None,
+        'filter_mismatches': filter_mismatches,
+        'missing_choices': sum(len(old) < 10 and not set(old) <= set(new)
+                               for old, new in zip(old_choices, new_choices))
+    }
+
+
+async def _measure(make: Callable[[], Awaitable[Any]], repeats: int) -> Tuple[Any, float, float]:
+    """Run `make` once under tracemalloc for its peak allocation, then `repeats` times untraced for its duration."""
+    tracemalloc.start()
+    try:
+        result = await make()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await make()
+    return result, peak, (time.perf_counter() - start) / repeats
+
+
+async def benchmark_fissure_embeds(users: int = 10000, subscriptions_per_user: int = 3, fissures: int = 8,
+                                   repeats: int = 5, seed: int = 0) -> Dict[str, Any]:
+    """
+    Measure building every DM subscriber's fissure embeds for a burst of new fissures, rendering each fissure's
+    embed once per tick as get_user_embeds does and rendering it again for every matching subscriber as it used to.
+
+    Args:
+        users: The number of synthetic DM subscribers, with subscriptions as seeded for the fissure benchmark.
+        subscriptions_per_user: Fissure subscriptions per subscriber.
+        fissures: The number of random new fissures in the burst.
+        repeats: The number of untraced runs the duration is averaged over.
+        seed: Seed for the synthetic data.
+
+    Returns:
+        The number of matched users and embeds handed out, and the peak allocation in MB and time per burst in
+        milliseconds of each approach.
+    """
+    # Imported here so the other benchmarks can be run without loading the cogs
+    from lib.cogs.Fissure import Fissure
+
+    rng = random.Random(seed)
+    rest = StubRest(0)
+    database = StubDatabase.seed(rest, [], 0, 0, users, subscriptions_per_user, 0.0, 0.0, rng)
+    cog = Fissure(StubBot(ReplayWorldstatePoller([]), database, rest, [], [], DeliveryScheduler()))
+
+    index = SubscriptionIndex()
+    index.load(database.subscriptions['DM'])
+    fissure_list = make_fissures(fissures, rng)
+
+    async def per_subscriber():
+        user_embeds = defaultdict(list)
+        for fissure in fissure_list:
+            for user_id in index.match(fissure):
+                user_embeds[user_id].append((fissure, cog.get_fissure_info_embed(fissure)))
+        return user_embeds
+
+    async def shared():
+        return await cog.get_user_embeds(fissure_list, index, cog.get_fissure_info_embeds(fissure_list))
+
+    user_embeds, old_peak, old_duration = await _measure(per_subscriber, repeats)
+    _, new_peak, new_duration = await _measure(shared, repeats)
+
+    return {
+        'users': len(user_embeds),
+        'embeds': sum(len(embeds) for embeds in user_embeds.values()),
+        'per_subscriber_peak_mb': old_peak / 10 ** 6,
+        'shared_peak_mb': new_peak / 10 ** 6,
+        'per_subscriber_ms': old_duration * 1000,
+        'shared_ms': new_duration * 1000
+    }
+
+
+class _MercoinConnection:
+    """
+    In-memory stand-in for the pymysql connection covering the users and mercoins queries, counting every
+    statement, ping, BEGIN, COMMIT and ROLLBACK as one round trip taking `latency` seconds.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.round_trips = 0
+        self.users = set()
+        self.mercoins = {}
+
+    def round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def ping(self, reconnect: bool = True) -> None:
+        self.round_trip()
+
+    def begin(self) -> None:
+        self.round_trip()
+
+    def commit(self) -> None:
+        self.round_trip()
+
+    def rollback(self) -> None:
+        self.round_trip()
+
+    def cursor(self) -> '_MercoinCursor':
+        return _MercoinCursor(self)
+
+
+class _MercoinCursor:
+    def __init__(self, connection: _MercoinConnection):
+        self.connection = connection
+        self.rows = []
+
+    def __enter__(self) -> '_MercoinCursor':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def execute(self, query: str, params: tuple) -> None:
+        self.connection.round_trip()
+        self._apply(' '.join(query.split()), params)
+
+    def executemany(self, query: str, rows: list) -> None:
+        self.connection.round_trip()
+        query = ' '.join(query.split())
+        for row in rows:
+            self._apply(query, row if isinstance(row, tuple) else (row,))
+
+    def _apply(self, query: str, params: tuple) -> None:
+        users, mercoins = self.connection.users, self.connection.mercoins
+        if query.startswith('SELECT EXISTS'):
+            self.rows = [(int(params[0] in users),)]
+        elif query.startswith('INSERT IGNORE INTO users'):
+            users.add(params[0])
+        elif query.startswith('SELECT amount'):
+            self.rows = [(mercoins[params[0]],)] if params[0] in mercoins else []
+        elif query.startswith('SELECT user_id, amount'):
+            self.rows = [(user_id, mercoins[user_id]) for user_id in params if user_id in mercoins]
+        elif query.startswith('UPDATE mercoins'):
+            if params[1] in mercoins:
+                mercoins[params[1]] = max(0, mercoins[params[1]] - params[0])
+        elif query.startswith('INSERT INTO mercoins'):
+            mercoins[params[0]] = mercoins.get(params[0], 0) + params[1]
+        else:
+            raise ValueError(f"Unexpected query in mercoin benchmark: {query}")
+
+    def fetchone(self) -> Optional[tuple]:
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self) -> list:
+        return self.rows
+
+
+class _MercoinBenchmarkDatabase(MercuriusDatabase):
+    """MercuriusDatabase on a _MercoinConnection, without connecting to MySQL or building the schema."""
+
+    def __init__(self, latency: float):
+        self.connection = _MercoinConnection(latency)
+        self.settings_cache = SettingsCache()
+        self.tag_resolver = TagResolver()
+        self._transaction_depth = 0
+
+
+def _steal_separately(database: MercuriusDatabase, user_id: int, target_id: int, rng: random.Random) -> None:
+    # The calls steal_mercoin made before it moved the coin in one transaction, each committed on its own
+    if not database.user_exists(user_id):
+        database.create_user(user_id)
+    if not database.user_exists(target_id) or not database.get_mercoins(target_id):
+        return
+    if database.get_mercoins(user_id) < 1:
+        return
+
+    if rng.random() < 0.5:
+        database.remove_mercoins(target_id, 1)
+        database.add_mercoins(user_id, 1)
+    else:
+        database.remove_mercoins(user_id, 1)
+        database.add_mercoins(target_id, 1)
+    database.get_mercoins(user_id)
+
+
+def _steal_in_transaction(database: MercuriusDatabase, user_id: int, target_id: int, rng: random.Random) -> None:
+    # The calls steal_mercoin makes now
+    with database.transaction():
+        balances = database.get_mercoin_balances([user_id, target_id], lock=True)
+        if not balances[target_id] or balances[user_id] < 1:
+            return
+
+        if rng.random() < 0.5:
+            database.transfer_mercoins(target_id, user_id, 1, balances=balances)
+        else:
+            database.transfer_mercoins(user_id, target_id, 1, balances=balances)
+
+
+def benchmark_mercoin_steal(steals: int = 500, users: int = 10, starting_mercoins: int = 5,
+                            latency: float = 0.0005, seed: int = 0) -> Dict[str, Any]:
+    """
+    Count the database round trips and time of mercoin thefts between random users, made as the separately
+    committed calls steal_mercoin used to make and as the single transaction it makes now, against an in-memory
+    connection with a fixed latency per round trip.
+
+    Args:
+        steals: The number of thefts.
+        users: The number of users stealing from each other.
+        starting_mercoins: The mercoins each user starts with.
+        latency: The simulated latency of each round trip, in seconds.
+        seed: Seed for the choice of users and the outcome of each theft.
+
+    Returns:
+        For each approach, the round trips and milliseconds per theft and the mercoins held once they're done,
+        which no theft should change.
+    """
+    report = {'steals': steals}
+    for name, steal in (('separate', _steal_separately), ('transaction', _steal_in_transaction)):
+        database = _MercoinBenchmarkDatabase(latency)
+        database.connection.users.update(range(users))
+        database.connection.mercoins.update(dict.fromkeys(range(users), starting_mercoins))
+
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        for _ in range(steals):
+            user_id, target_id = rng.sample(range(users), 2)
+            steal(database, user_id, target_id, rng)
+        duration = time.perf_counter() - start
+
+        report[name] = {
+            'round_trips_per_steal': database.connection.round_trips / steals,
+            'ms_per_steal': duration * 1000 / steals,
+            'total_mercoins': sum(database.connection.mercoins.values())
+        }
+
+    return report
@@ -11,12 +11,17 @@ from discord import Intents, HTTPException, Forbidden, NotFound
 from discord.ext import commands
 from discord.ext.commands import Bot as BotBase, MissingRole, MissingPermissions, CommandOnCooldown, CommandNotFound
 from discord.ext.commands import when_mentioned_or
-from fissure_engine.fissure_engine import FissureEngine
 from market_engine.Models.MarketDatabase import MarketDatabase
 from market_engine.Models.MarketItem import MarketItem
 from pytz import utc
 
+from lib.db.async_mercurius_db import AsyncMercuriusDatabase
 from lib.db.mercurius_db import MercuriusDatabase
+from lib.db.settings_cache import SettingsCache
+from lib.db.tag_resolver import TagResolver
+from lib.delivery_utils import DeliveryScheduler
+from lib.presence_utils import PresenceIndex
+from lib.worldstate_utils import PolledFissureEngine, WorldstatePoller, WORLDSTATE_URL
 
 cogs_dir = Path("lib/cogs")
 COGS = [p.stem for p in cogs_dir.glob("*.py")]
@@ -232,10 +237,18 @@ class Bot(BotBase):
         self.scheduler = AsyncIOScheduler(timezone=utc)
         self.market_db = None
         self.database = None
+        self.async_database = None
+        # Set once on_ready has tried to connect both databases, whether or not it succeeded
+        self.database_ready = asyncio.Event()
         self.guild = 939271447065526315
         self.vrc = 780376195182493707
         self.emoji_dict = {}
-        self.fissure_engine = FissureEngine()
+        self.worldstate_poller = WorldstatePoller(bot_config.get('worldstate_url', WORLDSTATE_URL))
+        self.fissure_engine = PolledFissureEngine(self.worldstate_poller)
+        self.presence_index = PresenceIndex()
+        self.delivery = DeliveryScheduler(
+            workers=bot_config.get('delivery_workers', DeliveryScheduler.DEFAULT_WORKERS),
+            global_rate=bot_config.get('delivery_global_rate', DeliveryScheduler.DEFAULT_GLOBAL_RATE))
 
         super().__init__(
             command_prefix=get_prefix,
@@ -360,6 +373,30 @@ class Bot(BotBase):
 
         return output_strings, output_items, subtypes, order_type
 
+    async def close(self):
+        await self.delivery.stop()
+        await self.worldstate_poller.close()
+
+        if self.async_database is not None:
+            await self.async_database.close()
+
+        await super().close()
+
+    async def on_presence_update(self, before: discord.Member, after: discord.Member):
+        self.presence_index.update_member(after)
+
+    async def on_member_join(self, member: discord.Member):
+        self.presence_index.add_member(member)
+
+    async def on_member_remove(self, member: discord.Member):
+        self.presence_index.remove_member(member)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        self.presence_index.add_guild(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.presence_index.remove_guild(guild)
+
     async def on_connect(self):
         self.logger.info("Bot connected.")
 
@@ -442,16 +479,42 @@ class Bot(BotBase):
                 self.market_db = None
                 self.logger.error("Could not connect to database. Market cog will not be loaded.", exc_info=True)
 
+            # Shared by both database objects so a change made through one is seen by the other
+            self.settings_cache = SettingsCache(
+                max_size=self.bot_config.get('settings_cache_size', SettingsCache.DEFAULT_MAX_SIZE),
+                ttl=self.bot_config.get('settings_cache_ttl', SettingsCache.DEFAULT_TTL))
+            self.tag_resolver = TagResolver(
+                max_size=self.bot_config.get('tag_resolver_size', TagResolver.DEFAULT_MAX_SIZE),
+                ttl=self.bot_config.get('tag_resolver_ttl', TagResolver.DEFAULT_TTL))
+
             try:
                 self.database: MercuriusDatabase = MercuriusDatabase(user=self.bot_config['db_user'],
                                                                      password=self.bot_config['db_password'],
                                                                      host=self.bot_config['db_host'],
-                                                                     database='mercurius')
+                                                                     database='mercurius',
+                                                                     settings_cache=self.settings_cache,
+                                                                     tag_resolver=self.tag_resolver)
                 self.database.build_database()
             except OperationalError as e:
                 self.database = None
                 self.logger.error("Could not connect to database.", exc_info=e)
 
+            try:
+                self.async_database: AsyncMercuriusDatabase = await AsyncMercuriusDatabase.create(
+                    user=self.bot_config['db_user'],
+                    password=self.bot_config['db_password'],
+                    host=self.bot_config['db_host'],
+                    database='mercurius',
+                    minsize=self.bot_config.get('db_pool_minsize', AsyncMercuriusDatabase.DEFAULT_POOL_MINSIZE),
+                    maxsize=self.bot_config.get('db_pool_maxsize', AsyncMercuriusDatabase.DEFAULT_POOL_MAXSIZE),
+                    settings_cache=self.settings_cache,
+                    tag_resolver=self.tag_resolver)
+            except OperationalError as e:
+                self.async_database = None
+                self.logger.error("Could not create database connection pool. Fissure updates, thread archiving and "
+                                  "saved fissure views will be disabled.", exc_info=e)
+            self.database_ready.set()
+
             self.database.insert_servers([x.id for x in self.guilds])
 
             while not self.cogs_ready.all_ready():
@@ -459,7 +522,11 @@ class Bot(BotBase):
 
             self.stdout = self.get_channel(self.stdout)
 
+            self.presence_index.build(self.guilds)
+
             self.ready = True
             self.logger.info("Bot ready.")
         else:
+            # Presence updates missed while disconnected are not replayed, so rebuild from the fresh member cache.
+            self.presence_index.build(self.guilds)
             self.logger.info("Bot reconnected.")
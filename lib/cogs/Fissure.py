@@ -1,11 +1,14 @@
 import asyncio
-import traceback
-import uuid
+import hashlib
+import io
+import json
+import time
 from asyncio import sleep
 from collections import defaultdict
 from datetime import datetime, timedelta
+from functools import partial
 from pprint import pprint
-from typing import List, Union
+from typing import Dict, List, Union
 
 import discord
 from aiohttp import ClientOSError
@@ -19,6 +22,11 @@ from fissure_engine.fissure_engine import FissureEngine
 from pymysql import IntegrityError
 from pytz import UTC
 
+from lib.delivery_utils import CoalescingQueue, DeliveryLane
+from lib.fissure_utils import get_embeds_hash, FissureDiffStream, NodeFacetIndex, RefreshScheduler, RenderCache, \
+    SubscriptionIndex, SubscriptionSnapshot
+from lib.trace_utils import FissureTracer
+
 
 class StatusNotificationView(discord.ui.View):
     def __init__(self, bot, user_id, status_settings):
@@ -149,6 +157,7 @@ class FissureSubscriptionView(discord.ui.View):
     async def delete_all_subscriptions(self):
         user_id = self.user.id
         self.bot.database.remove_all_fissure_subscriptions(user_id)
+        self.bot.cogs['fissure'].unindex_fissure_subscription(user_id)
         self.subscriptions.clear()
         await self.message.delete()
         self.stop()
@@ -161,6 +170,7 @@ class FissureSubscriptionView(discord.ui.View):
         async def delete_callback(interaction: discord.Interaction):
             user_id = self.user.id
             self.bot.database.remove_fissure_subscription(user_id, **subscription)
+            self.bot.cogs['fissure'].unindex_fissure_subscription(user_id, **subscription)
             self.subscriptions.remove(subscription)
 
             if not self.subscriptions:
@@ -268,13 +278,14 @@ class ButtonView(discord.ui.View):
             return
 
         view = FissureView(self.bot, self.button_configs)
+        config_hash = FissureView.get_config_hash(self.message_text, self.button_configs)
 
         if self.fissure_view_message is None:
             message = await interaction.channel.send(content=self.message_text, view=view)
 
             # Save the data associated with the view to the database
             self.bot.database.save_fissure_view(self.message_text, self.button_configs, interaction.channel.id,
-                                                message.id)
+                                                message.id, config_hash)
 
             await interaction.response.edit_message(content="Fissure view created successfully.", view=None, embed=None)
         else:
@@ -282,7 +293,8 @@ class ButtonView(discord.ui.View):
 
             await interaction.response.edit_message(content="Fissure view updated successfully.", view=None, embed=None)
 
-            self.bot.database.update_fissure_view(self.message_text, self.button_configs, self.fissure_view_message.id)
+            self.bot.database.update_fissure_view(self.message_text, self.button_configs, self.fissure_view_message.id,
+                                                  config_hash)
 
         self.stop()
 
@@ -549,22 +561,21 @@ class DataModal(discord.ui.Modal):
 
 
 class FissureView(discord.ui.View):
+    # Bump when the way buttons are built changes, so saved views are re-sent with the new components on startup
+    COMPONENT_VERSION = 2
+
     def __init__(self, bot, button_configs):
         super().__init__(timeout=None)
         self.bot = bot
 
-        used_custom_ids = []
-
-        for config in button_configs[:15]:
+        for i, config in enumerate(button_configs[:15]):
             emoji = config['emoji']
             text = config['text']
             fissure_data = config['fissure_data']
 
-            custom_id = f"fissure_button_{text.lower()}"
-            if custom_id in used_custom_ids:
-                custom_id += custom_id + str(uuid.uuid4())
+            # Custom IDs only depend on the saved config, so the view can be re-registered for its message on startup
+            custom_id = f"fissure_button_{i}_{text.lower()}"[:100]
 
-            used_custom_ids.append(custom_id)
             button = discord.ui.Button(
                 label=text,
                 emoji=emoji if emoji else None,
@@ -593,6 +604,7 @@ class FissureView(discord.ui.View):
             try:
                 self.bot.database.add_fissure_subscription(user_id, **fissure_data)
                 await interaction.response.send_message(f"You have subscribed to {text} fissures.", ephemeral=True)
+                await self.bot.cogs['fissure'].index_fissure_subscription(user_id, **fissure_data)
             except ValueError as e:
                 await interaction.response.send_message(str(e), ephemeral=True)
             except IntegrityError:
@@ -600,8 +612,33 @@ class FissureView(discord.ui.View):
 
         return button_callback
 
+    @classmethod
+    def get_config_hash(cls, message_text: str, button_configs: List[dict]) -> str:
+        """Hash of everything that decides what a saved fissure view message looks like."""
+        config = {'message_text': message_text, 'button_configs': button_configs, 'version': cls.COMPONENT_VERSION}
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
 
 class Fissure(Cog, name='fissure'):
+    # Maximum number of fissure log channels being posted to at once
+    FISSURE_LOG_CONCURRENCY = 50
+    # Number of expired fissure threads loaded and archived at a time
+    THREAD_ARCHIVE_BATCH_SIZE = 50
+    # Attempts at archiving a fissure thread before giving up on it, and how long to wait between them
+    THREAD_ARCHIVE_MAX_ATTEMPTS = 5
+    THREAD_ARCHIVE_RETRY_DELAY = timedelta(minutes=5)
+    # Seconds a digest DM waits for more fissures before it is sent
+    DM_DIGEST_WINDOW = 5
+    # Most embeds Discord allows in one message
+    MAX_MESSAGE_EMBEDS = 10
+    # Fissure list columns, as (field name, format string) for FissureEngine.get_fields
+    FISSURE_LIST_FIELDS = [('Era', '{era}'),
+                           ('Mission', '{mission} - {node} ({planet})'),
+                           ('Ends', '{expiry}')]
+    # Order in which FissureEngine.get_fields lists fissure types
+    FISSURE_LIST_SECTION_ORDER = [FissureEngine.FISSURE_TYPE_NORMAL, FissureEngine.FISSURE_TYPE_VOID_STORMS,
+                                  FissureEngine.FISSURE_TYPE_STEEL_PATH]
+
     def __init__(self, bot):
         self.bot = bot
         self.image_dict = {
@@ -622,6 +659,117 @@ class Fissure(Cog, name='fissure'):
             'Requiem': discord.Color.purple(),
             'Omnia': discord.Color.dark_gold()
         }
+        self.subscription_indexes = {
+            'DM': SubscriptionIndex(),
+            'Thread': SubscriptionIndex()
+        }
+        self.subscription_indexes_loaded = False
+        self.subscription_version = 0
+        self.subscription_snapshot = None
+        self.fissure_version = 0
+        self.fissure_list_refresh = 0
+        self.fissure_list_cache = RenderCache()
+        self.fissure_diffs = FissureDiffStream()
+        self.fissure_list_section_caches = defaultdict(RenderCache)
+        self.fissure_list_versions = {}
+        self.fissure_list_hashes = {}
+        self.suppressed_fissure_list_edits = 0
+        self.fissure_tracer = FissureTracer()
+        self.fissure_dm_digests = CoalescingQueue(self.send_fissure_dm_digest,
+                                                  window=bot.bot_config.get('fissure_dm_digest_window',
+                                                                            self.DM_DIGEST_WINDOW),
+                                                  max_items=self.MAX_MESSAGE_EMBEDS)
+        self.node_facet_index = NodeFacetIndex(list(sol_nodes.values()))
+        self.fissure_list_scheduler = RefreshScheduler(
+            rate=bot.bot_config.get('fissure_list_refresh_rate', RefreshScheduler.DEFAULT_RATE))
+
+    async def load_subscription_indexes(self) -> None:
+        """
+        Load every enabled fissure subscription into the in-memory subscription indexes, one per notification type.
+
+        Returns: None
+
+        """
+        for notification_type, index in self.subscription_indexes.items():
+            index.load(await self.bot.async_database.get_all_fissure_subscriptions(notification_type))
+
+        self.subscription_indexes_loaded = True
+        self.invalidate_subscription_snapshot()
+
+    def invalidate_subscription_snapshot(self) -> None:
+        """
+        Mark the current subscription snapshot as stale, so the next worldstate tick takes a new one.
+
+        Returns: None
+
+        """
+        self.subscription_version += 1
+
+    def get_subscription_snapshot(self) -> SubscriptionSnapshot:
+        """
+        Get the subscription snapshot for the current tick, only copying the indexes if they changed since the
+        last snapshot was taken.
+
+        Returns: The current SubscriptionSnapshot.
+
+        """
+        if self.subscription_snapshot is None or self.subscription_snapshot.version != self.subscription_version:
+            self.subscription_snapshot = SubscriptionSnapshot(self.subscription_version, self.subscription_indexes)
+
+        return self.subscription_snapshot
+
+    async def index_fissure_subscription(self, user_id: int, fissure_type: str = None, era: str = None,
+                                         node: str = None, mission: str = None, planet: str = None,
+                                         tileset: str = None, enemy: str = None, tier: int = None) -> None:
+        """
+        Add a newly stored subscription to the index matching the user's notification type.
+        Arguments mirror MercuriusDatabase.add_fissure_subscription.
+        """
+        notification_type, enabled = await asyncio.gather(
+            self.bot.async_database.get_fissure_notification_type(user_id),
+            self.bot.async_database.get_fissure_notifications_enabled(user_id))
+
+        if not enabled:
+            return
+
+        self.subscription_indexes[notification_type].add(user_id, {
+            "fissure_type": fissure_type,
+            "era": era,
+            "node": node,
+            "mission": mission,
+            "planet": planet,
+            "tileset": tileset,
+            "enemy": enemy,
+            "max_tier": tier
+        })
+        self.invalidate_subscription_snapshot()
+
+    def unindex_fissure_subscription(self, user_id: int, **conditions) -> None:
+        """
+        Remove subscriptions from the indexes. Arguments mirror MercuriusDatabase.remove_fissure_subscription;
+        with no conditions every subscription of the user is removed.
+        """
+        for index in self.subscription_indexes.values():
+            index.remove(user_id, **conditions)
+        self.invalidate_subscription_snapshot()
+
+    async def reindex_user_subscriptions(self, user_id: int) -> None:
+        """
+        Re-read a user's subscriptions after their notification type or enabled flag changed.
+        """
+        self.unindex_fissure_subscription(user_id)
+
+        subscriptions, notification_type, enabled = await asyncio.gather(
+            self.bot.async_database.get_fissure_subscriptions(user_id),
+            self.bot.async_database.get_fissure_notification_type(user_id),
+            self.bot.async_database.get_fissure_notifications_enabled(user_id))
+
+        if not enabled:
+            return
+
+        for subscription in subscriptions:
+            self.subscription_indexes[notification_type].add(user_id, subscription)
+        self.invalidate_subscription_snapshot()
 
     @commands.hybrid_command(name='setthreadnotificationserver', aliases=['stns'])
     @app_commands.describe(server='The server where you want to receive fissure thread notifications.')
@@ -668,10 +816,36 @@ class Fissure(Cog, name='fissure'):
             enabled = not current_setting
 
         self.bot.database.set_fissure_notifications_enabled(user_id, enabled)
+        await self.reindex_user_subscriptions(user_id)
 
         status = "enabled" if enabled else "disabled"
         await self.bot.send_message(ctx, f"Fissure notifications have been {status}.", ephemeral=True)
 
+    @commands.hybrid_command(name='fissuredigest', aliases=['digest'])
+    @app_commands.describe(
+        enabled='Whether to receive fissure DMs as digests. If not provided, the current setting will be toggled.')
+    async def fissure_dm_digest(self, ctx, enabled: bool = commands.parameter(default=None,
+                                                                              description="Whether to receive fissure DMs as digests. If not provided, the current setting will be toggled.")):
+        """
+        Enable, disable, or toggle fissure DM digests.
+
+        With digests enabled, fissures that match your subscriptions within a few seconds of each other are sent
+        together in one DM, up to 10 at a time, instead of one DM each.
+        """
+        user_id = ctx.author.id
+
+        # Check if the user exists in the users table
+        if not self.bot.database.user_exists(user_id):
+            self.bot.database.create_user(user_id)
+
+        if enabled is None:
+            enabled = not self.bot.database.get_fissure_dm_digest(user_id)
+
+        self.bot.database.set_fissure_dm_digest(user_id, enabled)
+
+        status = "enabled" if enabled else "disabled"
+        await self.bot.send_message(ctx, f"Fissure DM digests have been {status}.", ephemeral=True)
+
     @commands.hybrid_command(name='unsetfissurelist', aliases=['ufl'],
                              brief='Unset a fissure list message.')
     @app_commands.describe(message_id='The ID of the fissure list message to unset.')
@@ -872,6 +1046,8 @@ class Fissure(Cog, name='fissure'):
             self.bot.database.add_fissure_subscription(user_id, fissure_type, era, node, mission, planet, tileset,
                                                        enemy,
                                                        max_tier)
+            await self.index_fissure_subscription(user_id, fissure_type, era, node, mission, planet, tileset, enemy,
+                                                  max_tier)
             await self.bot.send_message(ctx, "Your fissure subscription has been added.", ephemeral=True)
         except ValueError as e:
             await self.bot.send_message(ctx, str(e), ephemeral=True)
@@ -1151,6 +1327,7 @@ class Fissure(Cog, name='fissure'):
             self.bot.database.create_user(user_id)
 
         self.bot.database.set_fissure_notification_type(user_id, notification_type)
+        await self.reindex_user_subscriptions(user_id)
 
         await self.bot.send_message(ctx, f"Your fissure notification type has been set to {notification_type}.",
                                     ephemeral=True)
@@ -1244,6 +1421,39 @@ class Fissure(Cog, name='fissure'):
             await self.bot.send_message(ctx, f'An error occurred while updating the fissure lists: {str(e)}',
                                         ephemeral=True)
 
+    @commands.command(name='fissurestats', description='Show fissure notification latency stats.', aliases=[])
+    @commands.is_owner()
+    async def fissure_stats(self, ctx):
+        """Show how long new fissures take to reach each notification stage, with the full export attached."""
+        embed = discord.Embed(title='Fissure Notification Latency',
+                              description='Seconds from fissure activation to each stage.',
+                              color=discord.Color.dark_gold())
+
+        for stage, stats in self.fissure_tracer.get_summary().items():
+            if not stats['count']:
+                value = 'No samples'
+            else:
+                value = (f"p50: {stats['p50']:.1f}s\n"
+                         f"p90: {stats['p90']:.1f}s\n"
+                         f"p99: {stats['p99']:.1f}s\n"
+                         f"Samples: {stats['count']}")
+            embed.add_field(name=stage.replace('_', ' ').title(), value=value, inline=True)
+
+        delivery_metrics = self.bot.delivery.get_metrics()
+        embed.add_field(name='Delivery Queues',
+                        value='\n'.join(f"{lane}: {metrics['depth']} queued, {metrics['failed']} failed"
+                                        for lane, metrics in delivery_metrics.items()),
+                        inline=False)
+
+        digest_stats = self.fissure_dm_digests.get_stats()
+        embed.add_field(name='DM Digests',
+                        value=f"{digest_stats['items']} fissures in {digest_stats['batches']} DMs, "
+                              f"{digest_stats['pending']} pending",
+                        inline=False)
+
+        export = io.BytesIO(self.fissure_tracer.export().encode())
+        await ctx.send(embed=embed, file=discord.File(fp=export, filename='fissure_stats.txt'))
+
     @commands.hybrid_command(name='createfissureview', description='Create a fissure view')
     @commands.has_permissions(manage_channels=True)
     async def create_fissure_view(self, ctx: commands.Context):
@@ -1284,7 +1494,8 @@ class Fissure(Cog, name='fissure'):
                     pass
 
             message = await ctx.channel.send(content=message_text, view=view)
-            new_fissure_views.append([message_text, button_configs, message.channel.id, message.id])
+            new_fissure_views.append([message_text, button_configs, message.channel.id, message.id,
+                                      FissureView.get_config_hash(message_text, button_configs)])
 
         self.bot.database.delete_all_fissure_views()
 
@@ -1337,66 +1548,123 @@ class Fissure(Cog, name='fissure'):
     async def update_all_fissure_lists(self) -> None:
         """
         Update all fissure lists across all configured channels.
+
+        Lists whose fissure types have not changed since their last render are skipped without rendering. The
+        rest are rendered up front and only the ones whose content changed are handed to the refresh scheduler,
+        which spreads their edits over the refresh window.
         """
-        fissure_list_dict = self.bot.database.get_fissure_list_channels()
+        fissure_list_dict = await self.bot.async_database.get_fissure_list_channels()
+        self.fissure_list_refresh += 1
 
-        async def update_server_fissure_lists(server_id: int, channel_configs: List[dict]) -> None:
-            """
-            Update the fissure lists for a server.
-            Args:
-                server_id (int): The ID of the server.
-                channel_configs (List[dict]): The list of channel configurations.
+        refresh_jobs = {}
+        for server_id, channel_configs in fissure_list_dict.items():
+            for channel_config in channel_configs:
+                channel_id = channel_config["channel_id"]
+                if self.bot.get_channel(channel_id) is None:
+                    continue
 
-            Returns:
+                # Skip lists whose fissure types are unchanged since the render their message already shows
+                message_id = channel_config["message_id"]
+                list_version = self.get_fissure_list_version(channel_config)
+                rendered_version, rendered_hash = self.fissure_list_versions.get(channel_config["id"], (None, None))
+                if message_id and list_version is not None and list_version == rendered_version \
+                        and self.fissure_list_hashes.get(message_id) == rendered_hash:
+                    self.suppressed_fissure_list_edits += 1
+                    continue
 
-            """
+                embeds = await self.get_fissure_list_config_embed(channel_config)
+                embeds_hash = get_embeds_hash(embeds)
+                self.fissure_list_versions[channel_config["id"]] = (list_version, embeds_hash)
 
-            async def update_channel_fissure_list(channel_config: dict) -> None:
-                """
-                Update the fissure list for a channel.
-                Args:
-                    channel_config (dict): The channel configuration.
+                if message_id and self.fissure_list_hashes.get(message_id) == embeds_hash:
+                    self.suppressed_fissure_list_edits += 1
+                    continue
 
-                Returns: None
+                refresh_jobs[channel_config["id"]] = partial(self.post_or_update_fissure_list,
+                                                             server_id, channel_id, channel_config, embeds)
 
-                """
-                try:
-                    channel_id = channel_config["channel_id"]
-                    await self.post_or_update_fissure_list(server_id, channel_id, channel_config)
-                    await asyncio.sleep(1)
-                except Exception as e:
-                    self.bot.logger.error(f"Error updating fissure list for server {server_id}, "
-                                          f"channel {channel_config['channel_id']}", exc_info=e)
+        report = await self.fissure_list_scheduler.run(refresh_jobs)
 
-            for channel_config in channel_configs:
-                await update_channel_fissure_list(channel_config)
-                await asyncio.sleep(2)
+        for config_id, error in report['errors']:
+            self.bot.logger.error(f"Error updating fissure list {config_id}", exc_info=error)
 
-        # Update the fissure lists for each server
-        server_update_tasks = [update_server_fissure_lists(server_id, channel_configs) for server_id, channel_configs in
-                               fissure_list_dict.items()]
+        if report['deferred']:
+            self.bot.logger.warning(f"Fissure list refresh is behind: {report['deferred']} lists deferred, "
+                                    f"oldest waiting {report['max_staleness']:.1f}s")
 
-        try:
-            await asyncio.gather(*server_update_tasks, return_exceptions=True)
-        except Exception as e:
-            print(f"Error updating fissure lists: {str(e)}")
-            traceback.print_exc()  # Print the traceback for debugging purposes
+        self.bot.logger.debug(f"Fissure list refresh: {report['refreshed']} refreshed, "
+                              f"max lag {report['max_lag']:.2f}s, took {report['duration']:.1f}s, "
+                              f"render cache: {self.fissure_list_cache.get_stats()}, "
+                              f"suppressed edits: {self.suppressed_fissure_list_edits}")
 
     @tasks.loop(seconds=10)
     async def update_fissure_list(self):
-        new_fissures, changed_fissure_types = await self.bot.fissure_engine.build_fissure_list(data_url="http://5.161.72.79/worldstate.php")
+        fissure_engine = self.bot.fissure_engine
+
+        fissures_changed = await self.bot.worldstate_poller.poll()
+
+        # Only rebuild when the fissures in the worldstate changed, or when one of ours expired in the meantime
+        if not fissures_changed and fissure_engine.last_update is not None \
+                and not fissure_engine.has_expired_fissures():
+            return
+
+        new_fissures, _ = await fissure_engine.build_fissure_list(data_url=self.bot.worldstate_poller.data_url)
+
+        diff = self.fissure_diffs.update(fissure_engine.fissure_lists,
+                                         fissure_engine.get_last_expiry(FissureEngine.ERA_LIST))
+        if diff:
+            self.fissure_version += 1
+            self.bot.logger.debug(f"Fissure diff {diff.version}: "
+                                  f"added {({t: len(f) for t, f in diff.added.items()})}, "
+                                  f"expired {({t: len(f) for t, f in diff.expired.items()})}, "
+                                  f"resets changed {sorted(diff.changed_resets)}")
+
+        if not self.subscription_indexes_loaded:
+            await self.load_subscription_indexes()
 
         if new_fissures:
-            self.bot.loop.create_task(self.send_new_fissures(new_fissures))
+            detected_at = time.time()
+            for fissure in new_fissures:
+                self.fissure_tracer.mark(fissure, 'detected', detected_at)
+
+            self.bot.loop.create_task(self.send_new_fissures(new_fissures, self.get_subscription_snapshot()))
+
+    async def send_new_fissures(self, new_fissures, snapshot: SubscriptionSnapshot):
+        """
+        Post new fissures to every fissure log channel, open subscriber threads on the posts, then send DMs.
+
+        Each channel posts its fissures in order, but channels run in parallel, up to FISSURE_LOG_CONCURRENCY at a
+        time. Threads are opened in a separate stage, so a channel's next post doesn't wait on the previous thread.
+
+        Args:
+            new_fissures: The new fissures to send.
+            snapshot: The subscription snapshot for this tick.
+
+        Returns: None
 
-    async def send_new_fissures(self, new_fissures):
+        """
         new_fissures = self.sort_new_fissures(new_fissures)
+        embeds = self.get_fissure_info_embeds(new_fissures)
 
-        fissure_log_dict = self.bot.database.get_fissure_log_channels()
+        fissure_log_dict = await self.bot.async_database.get_fissure_log_channels()
 
+        semaphore = asyncio.Semaphore(self.FISSURE_LOG_CONCURRENCY)
+        thread_tasks = []
+
+        async def post_channel_logs(channel, fissures):
+            async with semaphore:
+                for fissure in fissures:
+                    log_message = await self.bot.delivery.send(DeliveryLane.LOG, channel, embed=embeds[self.get_fissure_key(fissure)])
+                    self.fissure_tracer.mark(fissure, 'log_post')
+
+                    thread_tasks.append(asyncio.create_task(
+                        self.send_thread_notifications(fissure, log_message, snapshot)))
+
+        log_tasks = []
         for fissure_type, server_dict in fissure_log_dict.items():
             fissures_of_type = [fissure for fissure in new_fissures if fissure.fissure_type == fissure_type]
-            embeds_of_type = [self.get_fissure_info_embed(fissure) for fissure in fissures_of_type]
+            if not fissures_of_type:
+                continue
 
             for server_id, channel_ids in server_dict.items():
                 server = self.bot.get_guild(server_id)
@@ -1405,105 +1673,138 @@ class Fissure(Cog, name='fissure'):
 
                 channels = list(filter(None, map(server.get_channel, channel_ids)))
                 for channel in channels:
-                    for fissure, embed in zip(fissures_of_type, embeds_of_type):
-                        log_message = await channel.send(embed=embed)
-                        await self.send_thread_notifications(fissure, log_message)
+                    log_tasks.append(post_channel_logs(channel, fissures_of_type))
 
-        await self.send_fissure_subscription_dms(new_fissures)
+        for result in await asyncio.gather(*log_tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.bot.logger.error("Failed to send fissure log.", exc_info=result)
 
-    async def get_user_status(self, user_id):
-        user = self.bot.get_user(user_id)
-        if user is None:
-            return 'Offline'
-
-        member = None
-        for guild in self.bot.guilds:
-            member = guild.get_member(user_id)
-            if member:
-                break
+        log_latency = self.fissure_tracer.get_summary()['log_post']
+        self.bot.logger.debug(f"Fissure log latency: p50 {log_latency['p50']}s, p99 {log_latency['p99']}s")
 
-        if member is None:
-            return 'Offline'
+        for result in await asyncio.gather(*thread_tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.bot.logger.error("Failed to send fissure thread notifications.", exc_info=result)
 
-        return str(member.status)
+        await self.send_fissure_subscription_dms(new_fissures, snapshot, embeds)
 
-    async def send_thread_notifications(self, fissure, log_message: discord.Message):
-        subscriptions = self.bot.database.get_all_fissure_subscriptions('Thread')
-        thread_users = [sub['user_id'] for sub in subscriptions if self.match_subscription(sub, fissure)]
+    def get_user_status(self, user_id):
+        return self.bot.presence_index.get_status(user_id, 'Offline')
 
-        # Remove duplicates
-        thread_users = list(set(thread_users))
+    async def send_thread_notifications(self, fissure, log_message: discord.Message, snapshot: SubscriptionSnapshot):
+        thread_users = list(snapshot.match(fissure, 'Thread'))
 
         if not thread_users:
             return
 
+        notification_settings = await self.bot.async_database.get_fissure_notification_settings(thread_users)
+
         thread_user_ids = []
         for user_id in thread_users:
-            thread_server_id = self.bot.database.get_thread_notification_server(user_id)
+            settings = notification_settings[user_id]
+            thread_server_id = settings['thread_server_id']
 
-            member_status = await self.get_user_status(user_id)
+            member_status = self.get_user_status(user_id)
 
             if ((thread_server_id is None or thread_server_id == log_message.guild.id) and
-                    self.bot.database.get_fissure_notification_status(user_id).get(member_status, True)):
+                    settings['status'].get(member_status, True)):
                 thread_user_ids.append(user_id)
 
         if not thread_user_ids:
             return
 
-        thread = await log_message.create_thread(name=f"{log_message.embeds[0].description.split('\n')[0]}")
+        thread_name = log_message.embeds[0].description.split('\n')[0]
+        thread = await self.bot.delivery.submit(DeliveryLane.THREAD, self.bot.delivery.get_route(log_message.channel),
+                                                lambda: log_message.create_thread(name=thread_name))
 
         thread_mentions = [f"<@{user_id}>" for user_id in thread_user_ids]
         mention_chunks = self.split_mentions(" ".join(thread_mentions))
 
         for chunk in mention_chunks:
-            await thread.send(chunk)
-
-        # Schedule a job to lock and archive the thread when the fissure expires
-        self.bot.scheduler.add_job(
-            self.lock_and_archive_thread,
-            'date',
-            run_date=fissure.expiry,
-            args=[thread]
-        )
+            await self.bot.delivery.send(DeliveryLane.THREAD, thread, content=chunk)
+        self.fissure_tracer.mark(fissure, 'thread_mention')
+
+        # Lock and archive the thread once the fissure expires
+        await self.bot.async_database.add_fissure_thread_archive(thread.id, log_message.channel.id, fissure.expiry)
 
-    async def send_fissure_subscription_dms(self, new_fissures):
-        subscriptions = self.bot.database.get_all_fissure_subscriptions('DM')
-        user_embeds = await self.get_user_embeds(new_fissures, subscriptions)
+    async def send_fissure_subscription_dms(self, new_fissures, snapshot: SubscriptionSnapshot,
+                                            embeds: Dict[tuple, discord.Embed] = None):
+        if embeds is None:
+            embeds = self.get_fissure_info_embeds(new_fissures)
+
+        user_embeds = await self.get_user_embeds(new_fissures, snapshot.indexes['DM'], embeds)
+        notification_settings = await self.bot.async_database.get_fissure_notification_settings(list(user_embeds))
 
         user_send_tasks = []
-        for user_id, embeds in user_embeds.items():
+        user_send_ids = []
+        for user_id, fissure_embeds in user_embeds.items():
             user = self.bot.get_user(user_id)
             if user:
-                member_status = await self.get_user_status(user_id)
+                member_status = self.get_user_status(user_id)
+
+                settings = notification_settings[user_id]
+                if not settings['status'].get(member_status, True):
+                    continue
+
+                # Digest users get their fissures merged into as few DMs as possible
+                if settings['digest']:
+                    self.fissure_dm_digests.add(user_id, fissure_embeds)
+                    continue
+
+                for fissure, embed in fissure_embeds:
+                    user_send_tasks.append(self.send_embeds_to_user(user, [embed], [fissure]))
+                    user_send_ids.append(user_id)
 
-                if self.bot.database.get_fissure_notification_status(user_id).get(member_status, True):
-                    for embed in embeds:
-                        user_send_tasks.append(self.send_embeds_to_user(user, [embed]))
+        results = await asyncio.gather(*user_send_tasks, return_exceptions=True)
+        for user_id, result in zip(user_send_ids, results):
+            if isinstance(result, Exception):
+                self.bot.logger.error(f"Failed to send fissure DM to user {user_id}.", exc_info=result)
 
-        await asyncio.gather(*user_send_tasks)
+    async def send_fissure_dm_digest(self, user_id: int, embeds: list) -> None:
+        """
+        Send a user's coalesced fissure DMs as a single message.
 
-    async def send_embeds_to_user(self, user, embeds):
+        Args:
+            user_id: The ID of the user to send the digest to.
+            embeds: The (fissure, embed) pairs to send, at most MAX_MESSAGE_EMBEDS of them.
+
+        Returns: None
+
+        """
+        user = self.bot.get_user(user_id)
+        if user is None:
+            return
+
+        await self.send_embeds_to_user(user, [embed for _, embed in embeds], [fissure for fissure, _ in embeds])
+
+    async def send_embeds_to_user(self, user, embeds, fissures=()):
         try:
-            await user.send(embeds=embeds)
+            await self.bot.delivery.send(DeliveryLane.DM, user, embeds=embeds)
         except discord.Forbidden:
-            pass
+            return
 
-    async def get_user_embeds(self, new_fissures, subscriptions):
-        user_embeds = defaultdict(list)
-        user_fissure_sent = defaultdict(set)
+        for fissure in fissures:
+            self.fissure_tracer.mark(fissure, 'dm')
 
-        for fissure in new_fissures:
-            matching_subscriptions = [sub for sub in subscriptions if self.match_subscription(sub, fissure)]
+    async def get_user_embeds(self, new_fissures, subscription_index: SubscriptionIndex,
+                              embeds: Dict[tuple, discord.Embed]):
+        """
+        Get the fissures each DM subscriber should be sent, with their embeds.
 
-            for subscription in matching_subscriptions:
-                user_id = subscription["user_id"]
+        Args:
+            new_fissures: The new fissures.
+            subscription_index: The DM subscription index to match the fissures against.
+            embeds: The tick's fissure embeds, from get_fissure_info_embeds. Every subscriber shares them.
 
-                if fissure in user_fissure_sent[user_id]:
-                    continue
+        Returns: A dict of user ID to a list of (fissure, embed) pairs.
 
-                embed = self.get_fissure_info_embed(fissure)
-                user_embeds[user_id].append(embed)
-                user_fissure_sent[user_id].add(fissure)
+        """
+        user_embeds = defaultdict(list)
+
+        for fissure in new_fissures:
+            fissure_embed = (fissure, embeds[self.get_fissure_key(fissure)])
+            for user_id in subscription_index.match(fissure):
+                user_embeds[user_id].append(fissure_embed)
 
         return user_embeds
 
@@ -1511,6 +1812,71 @@ class Fissure(Cog, name='fissure'):
         # Lock and archive the thread
         await thread.edit(locked=True, archived=True)
 
+    @tasks.loop(seconds=60)
+    async def archive_expired_threads(self) -> None:
+        """
+        Lock and archive the fissure threads whose fissures have expired, including any that expired while the bot
+        was offline. Due threads are loaded from the database a batch at a time.
+
+        Returns: None
+
+        """
+        while True:
+            due_threads = await self.bot.async_database.get_due_fissure_thread_archives(datetime.now(),
+                                                                                       self.THREAD_ARCHIVE_BATCH_SIZE)
+            if not due_threads:
+                return
+
+            results = await asyncio.gather(*[self.archive_fissure_thread(due_thread['thread_id'],
+                                                                         due_thread['channel_id'])
+                                             for due_thread in due_threads],
+                                           return_exceptions=True)
+
+            done_thread_ids = []
+            retry_thread_ids = []
+            for due_thread, result in zip(due_threads, results):
+                if not isinstance(result, Exception):
+                    done_thread_ids.append(due_thread['thread_id'])
+                elif due_thread['attempts'] + 1 >= self.THREAD_ARCHIVE_MAX_ATTEMPTS:
+                    self.bot.logger.error(f"Giving up on archiving fissure thread {due_thread['thread_id']} after "
+                                          f"{self.THREAD_ARCHIVE_MAX_ATTEMPTS} attempts", exc_info=result)
+                    done_thread_ids.append(due_thread['thread_id'])
+                else:
+                    self.bot.logger.error(f"Failed to archive fissure thread {due_thread['thread_id']}",
+                                          exc_info=result)
+                    retry_thread_ids.append(due_thread['thread_id'])
+
+            await self.bot.async_database.remove_fissure_thread_archives(done_thread_ids)
+
+            # Failed threads are pushed past this run's cutoff, so the next batch moves on to the threads behind them
+            await self.bot.async_database.retry_fissure_thread_archives(
+                retry_thread_ids, datetime.now() + self.THREAD_ARCHIVE_RETRY_DELAY)
+
+    async def archive_fissure_thread(self, thread_id: int, channel_id: int) -> None:
+        """
+        Lock and archive a fissure thread by ID, through the delivery scheduler so that archiving a large backlog
+        stays within rate limits. Threads that are gone, can no longer be edited or are rejected by Discord for any
+        other non-retryable reason, such as having been archived already, count as archived.
+
+        Args:
+            thread_id: The ID of the thread.
+            channel_id: The ID of the log channel the thread belongs to.
+
+        Returns: None
+
+        """
+        async def lock_and_archive():
+            thread = self.bot.get_channel(thread_id) or await self.bot.fetch_channel(thread_id)
+            await self.lock_and_archive_thread(thread)
+
+        try:
+            await self.bot.delivery.submit(DeliveryLane.THREAD, ('channel', channel_id), lock_and_archive)
+        except discord.HTTPException as e:
+            # Only rate limits and server errors are worth retrying
+            if e.status == 429 or e.status >= 500:
+                raise
+            self.bot.logger.debug(f"Fissure thread {thread_id} could not be archived ({e.status}), dropping it")
+
     def split_mentions(self, mentions: str, max_length: int = 2000) -> List[str]:
         mentions_list = mentions.split()
         chunks = []
@@ -1546,21 +1912,27 @@ class Fissure(Cog, name='fissure'):
 
         return sorted(new_fissures, key=sort_key)
 
-    def match_subscription(self, subscription: dict, fissure: fissure_engine.Fissure) -> bool:
-        for key, value in subscription.items():
-            if key == "user_id":
-                continue
-            if value is None:
-                continue
-            if key == "mission":
-                if value.lower() not in fissure.mission.lower():
-                    return False
-            elif key == "max_tier":
-                if fissure.tier > value:
-                    return False
-            elif getattr(fissure, key) != value:
-                return False
-        return True
+    @staticmethod
+    def get_fissure_key(fissure: fissure_engine.Fissure) -> tuple:
+        return fissure.node, fissure.fissure_type, fissure.era, fissure.expiry
+
+    def get_fissure_info_embeds(self, fissures: List[fissure_engine.Fissure]) -> Dict[tuple, discord.Embed]:
+        """
+        Render the info embed of each fissure once, for every log post, thread and DM of a tick to share.
+
+        Args:
+            fissures: The fissures to render.
+
+        Returns: A dict of fissure key (see get_fissure_key) to embed.
+
+        """
+        embeds = {}
+        for fissure in fissures:
+            key = self.get_fissure_key(fissure)
+            if key not in embeds:
+                embeds[key] = self.get_fissure_info_embed(fissure)
+
+        return embeds
 
     def get_fissure_info_embed(self, fissure: fissure_engine.Fissure):
         embed = discord.Embed(colour=self.color_dict[fissure.era], timestamp=fissure.activation)
@@ -1607,57 +1979,143 @@ class Fissure(Cog, name='fissure'):
         if era_list is None:
             era_list = self.bot.fissure_engine.get_era_list(fissure_types)
 
-        embeds = []
-
-        fissures = self.bot.fissure_engine.get_fissures(fissure_type=fissure_types,
-                                                        era=era_list,
-                                                        tier=list(range(1, max_tier + 1)))
-
-        era_resets = self.bot.fissure_engine.get_resets(fissure_type=fissure_types,
-                                                        display_type=display_type,
-                                                        image_dict=self.bot.emoji_dict,
-                                                        era_list=era_list)
+        sections = {fissure_type: await self.get_fissure_list_section(fissure_type, display_type, era_list, max_tier)
+                    for fissure_type in fissure_types}
 
         embed = discord.Embed(colour=discord.Colour.dark_gold())
 
-        fields = [('Era', '{era}'),
-                  ('Mission', '{mission} - {node} ({planet})'),
-                  ('Ends', '{expiry}')]
-
-        field_values = self.bot.fissure_engine.get_fields(fissures, fields, display_type, self.bot.emoji_dict)
+        listed_sections = [sections[fissure_type] for fissure_type in self.FISSURE_LIST_SECTION_ORDER
+                           if fissure_type in sections and sections[fissure_type]['fissures']]
 
-        if not fissures:
+        if not listed_sections:
             embed.description = "There are no valid fissures available right now."
         else:
-            # Determine the number of sublists (one per fissure type) in field_values
-            num_fissure_types = max(len(values) for values in field_values.values())
-
-            # Create an embed for each fissure type
-            for fissure_type_index in range(num_fissure_types):
-                for field_name, _ in fields:
+            # Add one set of fields per fissure type
+            for section_index, section in enumerate(listed_sections):
+                for field_name, _ in self.FISSURE_LIST_FIELDS:
                     max_length = 40 if field_name == 'Mission' else 1024
 
-                    # Access the appropriate sublist for the current fissure type
-                    # and handle cases where some fields might have fewer entries
-                    value_list = field_values.get(field_name, [])
-                    value = value_list[fissure_type_index] if fissure_type_index < len(value_list) else "N/A"
+                    value = self.list_to_field_string(section['values'][field_name], max_length)
 
                     # Only add field names for the first fissure type
-                    field_name = field_name if fissure_type_index == 0 else ""
+                    embed.add_field(name=field_name if section_index == 0 else "", value=value, inline=True)
+
+        for i, fissure_type in enumerate(fissure_types):
+            embed.add_field(name='', value='\n'.join(sections[fissure_type]['resets']), inline=True if i < 2 else False)
+
+        return [embed]
+
+    async def get_fissure_list_section(self, fissure_type: str, display_type: str, era_list: List[str],
+                                       max_tier: int) -> dict:
+        """
+        Get the part of a fissure list showing one fissure type: its fissure count, field values and resets.
+
+        Sections are cached against the version of their fissure type in the fissure diff stream, so they are only
+        rebuilt when that type changes. Time Left sections depend on the current time and are always rebuilt.
+
+        Args:
+            fissure_type: The fissure type of the section.
+            display_type: The display type of the list.
+            era_list: The eras to show.
+            max_tier: The highest mission tier to show.
+
+        Returns: A dict with the number of fissures, the field values keyed by field name and the reset lines.
 
-                    embed.add_field(name=field_name, value=self.list_to_field_string(value, max_length), inline=True)
+        """
+        async def render():
+            engine = self.bot.fissure_engine
+            fissures = engine.get_fissures(fissure_type=[fissure_type], era=era_list,
+                                           tier=list(range(1, max_tier + 1)))
+
+            field_values = engine.get_fields(fissures, self.FISSURE_LIST_FIELDS, display_type, self.bot.emoji_dict)
 
-        for i, (fissure_type, resets) in enumerate(era_resets.items()):
             fissure_type_identifier = fissure_engine.get_fissure_type_identifier(fissure_type, self.bot.emoji_dict)
-            resets = [f"{fissure_type_identifier} {item}" for item in resets]
+            resets = engine.get_single_reset(fissure_type, display_type, self.bot.emoji_dict, era_list)
 
-            embed.add_field(name='', value='\n'.join(resets), inline=True if i < 2 else False)
+            return {
+                'fissures': len(fissures),
+                'values': {field_name: values[0] for field_name, values in field_values.items()},
+                'resets': [f"{fissure_type_identifier} {item}" for item in resets]
+            }
 
-        embeds.append(embed)
+        if display_type == FissureEngine.DISPLAY_TYPE_TIME_LEFT:
+            return await render()
 
-        return embeds
+        # Emojis are loaded once the bot is ready, possibly after the first sections were rendered
+        signature = (display_type, tuple(era_list), max_tier, len(self.bot.emoji_dict))
+        return await self.fissure_list_section_caches[fissure_type].get(self.fissure_diffs.type_versions[fissure_type],
+                                                                        signature, render)
 
-    async def post_or_update_fissure_list(self, server_id: int, channel_id: int, channel_config: dict) -> None:
+    def get_fissure_list_version(self, channel_config: dict):
+        """
+        Get the versions of the fissure types a fissure list shows, which change whenever its content could.
+
+        Returns: The versions, or None for Time Left lists, whose content changes with the time.
+
+        """
+        if channel_config["display_type"] == FissureEngine.DISPLAY_TYPE_TIME_LEFT:
+            return None
+
+        return self.fissure_diffs.get_versions(self.get_fissure_list_config_types(channel_config))
+
+    async def get_cached_fissure_list_embed(self, fissure_types: List[str], display_type: str, era_list: List[str],
+                                            max_tier: int) -> List[discord.Embed]:
+        """
+        Get the fissure list embeds for a configuration, building them only once per version of the fissure data
+        and sharing them between every channel with the same configuration.
+
+        Time Left lists depend on the current time as well, so they are only shared within a single refresh of
+        all fissure lists.
+
+        Args:
+            fissure_types: The fissure types to show.
+            display_type: The display type of the list.
+            era_list: The eras to show.
+            max_tier: The highest mission tier to show.
+
+        Returns: The list of embeds.
+
+        """
+        signature = (tuple(fissure_types), display_type, tuple(era_list) if era_list is not None else None, max_tier)
+        if display_type == FissureEngine.DISPLAY_TYPE_TIME_LEFT:
+            signature += (self.fissure_list_refresh,)
+
+        return await self.fissure_list_cache.get(self.fissure_version, signature,
+                                                 lambda: self.get_fissure_list_embed(fissure_types,
+                                                                                     display_type=display_type,
+                                                                                     era_list=era_list,
+                                                                                     max_tier=max_tier))
+
+    @staticmethod
+    def get_fissure_list_config_types(channel_config: dict) -> List[str]:
+        return [fissure_type for fissure_type in [FissureEngine.FISSURE_TYPE_NORMAL,
+                                                  FissureEngine.FISSURE_TYPE_STEEL_PATH,
+                                                  FissureEngine.FISSURE_TYPE_VOID_STORMS]
+                if channel_config[f"show_{fissure_type.lower().replace(' ', '_')}"]]
+
+    async def get_fissure_list_config_embed(self, channel_config: dict) -> List[discord.Embed]:
+        """
+        Get the fissure list embeds for a fissure list channel configuration.
+
+        Args:
+            channel_config: The fissure list channel configuration.
+
+        Returns: The list of embeds.
+
+        """
+        era_list = self.get_era_list_from_config(channel_config)
+        max_tier = channel_config["max_tier"]
+        display_type = channel_config["display_type"]
+
+        fissure_types = self.get_fissure_list_config_types(channel_config)
+
+        return await self.get_cached_fissure_list_embed(fissure_types,
+                                                        display_type=display_type,
+                                                        era_list=era_list,
+                                                        max_tier=max_tier)
+
+    async def post_or_update_fissure_list(self, server_id: int, channel_id: int, channel_config: dict,
+                                          embeds: List[discord.Embed] = None) -> None:
         """
         Post or update the fissure list for a channel.
 
@@ -1665,6 +2123,7 @@ class Fissure(Cog, name='fissure'):
             server_id: The ID of the server containing the channel to post the fissure list in.
             channel_id: The ID of the channel to post the fissure list in.
             channel_config: The fissure list channel configuration.
+            embeds: The already rendered fissure list, rendered from the configuration if not given.
 
         Returns: None
 
@@ -1673,20 +2132,10 @@ class Fissure(Cog, name='fissure'):
         if channel is None:
             return
 
-        era_list = self.get_era_list_from_config(channel_config)
-        max_tier = channel_config["max_tier"]
-        display_type = channel_config["display_type"]
         message_id = channel_config["message_id"]
 
-        fissure_types = [fissure_type for fissure_type in [FissureEngine.FISSURE_TYPE_NORMAL,
-                                                           FissureEngine.FISSURE_TYPE_STEEL_PATH,
-                                                           FissureEngine.FISSURE_TYPE_VOID_STORMS]
-                         if channel_config[f"show_{fissure_type.lower().replace(' ', '_')}"]]
-
-        embeds = await self.get_fissure_list_embed(fissure_types,
-                                                   display_type=display_type,
-                                                   era_list=era_list,
-                                                   max_tier=max_tier)
+        if embeds is None:
+            embeds = await self.get_fissure_list_config_embed(channel_config)
 
         # Update the existing message if it exists, otherwise post a new message
         # Ignore errors that result from temporary Discord outages or connection issues
@@ -1698,7 +2147,8 @@ class Fissure(Cog, name='fissure'):
             self.bot.logger.error(f"Error updating fissure list for server {server_id}, \
                                     channel {channel_config['channel_id']}", exc_info=e)
             message = await channel.send(embeds=embeds)
-            self.bot.database.set_fissure_list_message_id(channel_config["id"], message.id)
+            self.fissure_list_hashes[message.id] = get_embeds_hash(embeds)
+            await self.bot.async_database.set_fissure_list_message_id(channel_config["id"], message.id)
 
     async def update_fissure_list_message(self, channel: discord.TextChannel, message_id: int,
                                           embeds: List[discord.Embed]) -> None:
@@ -1713,161 +2163,62 @@ class Fissure(Cog, name='fissure'):
 
         """
 
-        if message_id:
-            message = await channel.fetch_message(message_id)
-            await message.edit(embeds=embeds)
-        else:
+        if not message_id:
             raise Exception("Message ID not found.")
 
-    def filter_nodes(self, interaction: discord.Interaction, selected_values: dict = None) -> List[dict]:
-        filter_rules = {
-            'era': [
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Venus', 'Earth', 'Mars'],
-                    'condition': FissureEngine.ERA_LITH,
-                    'exclusive': True
-                },
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Ceres', 'Jupiter', 'Phobos', 'Saturn'],
-                    'condition': FissureEngine.ERA_MESO,
-                    'exclusive': True
-                },
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Neptune', 'Europa', 'Uranus', 'Void'],
-                    'condition': FissureEngine.ERA_NEO,
-                    'exclusive': False
-                },
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Pluto', 'Sedna', 'Eris', 'Void'],
-                    'condition': FissureEngine.ERA_AXI,
-                    'exclusive': False
-                },
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Kuva Fortress'],
-                    'condition': FissureEngine.ERA_REQUIEM,
-                    'exclusive': True
-                },
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Lua', 'Zariman Ten Zero', "Albrecht's Laboratories"],
-                    'condition': FissureEngine.ERA_OMNIA,
-                    'exclusive': True
-                }
-            ],
-            'fissure_type': [
-                {
-                    'field': 'planet',
-                    'type': 'whitelist',
-                    'values': ['Saturn Proxima', 'Earth Proxima', 'Venus Proxima', 'Neptune Proxima', 'Pluto Proxima',
-                               'Veil Proxima'],
-                    'condition': FissureEngine.FISSURE_TYPE_VOID_STORMS,
-                    'exclusive': True
-                }
-            ]
-        }
+        # Skip the edit entirely if the message already shows exactly this content
+        embeds_hash = get_embeds_hash(embeds)
+        if self.fissure_list_hashes.get(message_id) == embeds_hash:
+            self.suppressed_fissure_list_edits += 1
+            return
+
+        await channel.get_partial_message(message_id).edit(embeds=embeds)
+        self.fissure_list_hashes[message_id] = embeds_hash
 
+    @staticmethod
+    def get_selected_node_values(interaction: discord.Interaction, selected_values: dict = None) -> dict:
         if selected_values is None:
             selected_values = {
                 attr: getattr(interaction.namespace, attr)
                 for attr in interaction.namespace.__dict__
-                if getattr(interaction.namespace, attr)
             }
-        else:
-            # Map the keys from selected_values to match the keys in sol_nodes
-            key_mapping = {
-                'mission': 'type'
-            }
-            selected_values = {
-                key_mapping.get(key, key): value
-                for key, value in selected_values.items()
-            }
-
-        blacklisted_nodes = {'type': ['Relay', 'Ancient Retribution', 'Salvage', 'Arena', 'Conclave', 'Hijack',
-                                      'Assassination', 'Pursuit (Archwing)', 'Mobile Defense (Archwing)',
-                                      'Sabotage (Archwing)', 'Orphix', 'Rush (Archwing)', 'Exterminate (Archwing)',
-                                      'Interception (Archwing)', 'Assassinate', 'Void Armageddon', 'Defection',
-                                      'Free Roam'],
-                             'enemy': ['Tenno'],
-                             'planet': ['Mercury']}
-
-        filtered_nodes = sol_nodes.values()
-
-        # Apply blacklist filter
-        for attr, values in blacklisted_nodes.items():
-            filtered_nodes = [node for node in filtered_nodes if attr not in node or node[attr] not in values]
-
-        for filter_key, filter_rules_list in filter_rules.items():
-            filter_value = selected_values.get(filter_key)
-            for filter_rule in filter_rules_list:
-                if filter_rule['exclusive']:
-                    if filter_value == filter_rule['condition']:
-                        filtered_nodes = [node for node in filtered_nodes if
-                                          node.get(filter_rule['field']) in filter_rule['values']]
-                    elif filter_value is not None:
-                        filtered_nodes = [node for node in filtered_nodes if
-                                          node.get(filter_rule['field']) not in filter_rule['values']]
-                else:
-                    if filter_value == filter_rule['condition']:
-                        field = filter_rule['field']
-                        filter_type = filter_rule['type']
-                        values = filter_rule['values']
-
-                        if filter_type == 'whitelist':
-                            filtered_nodes = [node for node in filtered_nodes if
-                                              field in node and node[field] in values]
-                        elif filter_type == 'blacklist':
-                            filtered_nodes = [node for node in filtered_nodes if
-                                              field not in node or node[field] not in values]
 
-        filtered_nodes = [
-            node for node in filtered_nodes
-            if all(
-                attr in node and node[attr].lower().startswith(value.lower()) for attr, value in selected_values.items()
-                if attr in node)
-        ]
+        # Map the keys from selected_values to match the keys in sol_nodes
+        key_mapping = {
+            'mission': 'type'
+        }
+        return {
+            key_mapping.get(key, key): value
+            for key, value in selected_values.items() if value
+        }
 
-        return filtered_nodes
+    def filter_nodes(self, interaction: discord.Interaction, selected_values: dict = None) -> List[dict]:
+        return self.node_facet_index.filter_nodes(self.get_selected_node_values(interaction, selected_values))
 
-    def get_choices(self, nodes: List[dict], current: str, key: str) -> List[Choice[str]]:
-        choices = {node[key] for node in nodes if key in node} - {''}
+    def get_choices(self, interaction: discord.Interaction, current: str, key: str) -> List[Choice[str]]:
+        choices = self.node_facet_index.get_choices(key, current, self.get_selected_node_values(interaction))
 
-        return [Choice(name=choice, value=choice) for choice in choices if current.lower() in choice.lower()][:10]
+        return [Choice(name=choice, value=choice) for choice in choices]
 
     @add_fissure_subscription.autocomplete('node')
     async def node_autocomplete(self, interaction: discord.Interaction, current: str) -> List[Choice[str]]:
-        filtered_nodes = self.filter_nodes(interaction)
-        return self.get_choices(filtered_nodes, current, 'node')
+        return self.get_choices(interaction, current, 'node')
 
     @add_fissure_subscription.autocomplete('mission')
     async def mission_autocomplete(self, interaction: discord.Interaction, current: str) -> List[Choice[str]]:
-        filtered_nodes = self.filter_nodes(interaction)
-        return self.get_choices(filtered_nodes, current, 'type')
+        return self.get_choices(interaction, current, 'type')
 
     @add_fissure_subscription.autocomplete('planet')
     async def planet_autocomplete(self, interaction: discord.Interaction, current: str) -> List[Choice[str]]:
-        filtered_nodes = self.filter_nodes(interaction)
-        return self.get_choices(filtered_nodes, current, 'planet')
+        return self.get_choices(interaction, current, 'planet')
 
     @add_fissure_subscription.autocomplete('tileset')
     async def tileset_autocomplete(self, interaction: discord.Interaction, current: str) -> List[Choice[str]]:
-        filtered_nodes = self.filter_nodes(interaction)
-        return self.get_choices(filtered_nodes, current, 'tileset')
+        return self.get_choices(interaction, current, 'tileset')
 
     @add_fissure_subscription.autocomplete('enemy')
     async def enemy_autocomplete(self, interaction: discord.Interaction, current: str) -> List[Choice[str]]:
-        filtered_nodes = self.filter_nodes(interaction)
-        return self.get_choices(filtered_nodes, current, 'enemy')
+        return self.get_choices(interaction, current, 'enemy')
 
     async def cog_unload(self) -> None:
         """
@@ -1878,49 +2229,86 @@ class Fissure(Cog, name='fissure'):
         """
         self.update_fissure_list.cancel()
         self.update_all_fissure_lists.cancel()
+        self.archive_expired_threads.cancel()
+        await self.fissure_dm_digests.flush_all()
 
     async def cog_load(self) -> None:
         """
-        Start the update tasks when the cog is loaded.
+        Start the update tasks when the cog is loaded, if the database connection pool is up. On startup it isn't
+        created yet, and on_ready starts them instead.
 
         Returns: None
 
         """
+        if self.bot.async_database is None:
+            return
+
         self.update_fissure_list.start()
         self.update_all_fissure_lists.start()
+        self.archive_expired_threads.start()
 
     @Cog.listener()
     async def on_ready(self) -> None:
         """
-        Start the update tasks, and recreate all saved fissure views on startup.
+        Start the update tasks, and recreate all saved fissure views on startup. Every task needs the database
+        connection pool, so none of them are started if it couldn't be created.
 
         Returns: None
 
         """
         if not self.bot.ready:
+            await self.bot.database_ready.wait()
+            if self.bot.async_database is None:
+                self.bot.logger.error("No database connection pool, fissure tasks and views were not started.")
+                self.bot.cogs_ready.ready_up("Fissure")
+                return
+
             self.update_fissure_list.start()
 
             self.bot.cogs_ready.ready_up("Fissure")
             await sleep(5)
             self.update_all_fissure_lists.start()
+            self.archive_expired_threads.start()
 
-            # Recreate all saved fissure views on startup
-            fissure_views = self.bot.database.get_all_fissure_views()
-            for view_data in fissure_views:
-                message_text = view_data['message_text']
-                button_configs = view_data['button_configs']
-                channel_id = view_data['channel_id']
-                message_id = view_data['message_id']
+            await self.register_fissure_views()
 
-                view = FissureView(self.bot, button_configs)
-                channel = self.bot.get_channel(channel_id)
-                if channel:
-                    try:
-                        message = await channel.fetch_message(message_id)
-                        await message.edit(content=message_text, view=view)
-                        await sleep(1)
-                    except discord.NotFound:
-                        pass
+    async def register_fissure_views(self) -> None:
+        """
+        Re-register all saved fissure views as persistent views for their messages.
+
+        Registering is local, so only messages whose saved config changed since they were last sent (or that were
+        sent before config hashes were stored) are edited.
+
+        Returns: None
+
+        """
+        stale_views = []
+        for view_data in await self.bot.async_database.get_all_fissure_views():
+            view = FissureView(self.bot, view_data['button_configs'])
+            self.bot.add_view(view, message_id=view_data['message_id'])
+
+            config_hash = FissureView.get_config_hash(view_data['message_text'], view_data['button_configs'])
+            if view_data['config_hash'] != config_hash:
+                stale_views.append((view_data, view, config_hash))
+
+        async def update_fissure_view_message(view_data, view, config_hash):
+            channel = self.bot.get_channel(view_data['channel_id'])
+            if channel is None:
+                return
+
+            try:
+                await self.bot.delivery.edit(DeliveryLane.LOG, channel.get_partial_message(view_data['message_id']),
+                                             content=view_data['message_text'], view=view)
+            except discord.NotFound:
+                return
+
+            await self.bot.async_database.set_fissure_view_config_hash(view_data['message_id'], config_hash)
+
+        results = await asyncio.gather(*[update_fissure_view_message(*stale_view) for stale_view in stale_views],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.bot.logger.error("Failed to update fissure view.", exc_info=result)
 
 
 async def setup(bot):
@@ -513,7 +513,7 @@ class Fun(Cog, name="fun"):
     async def steal_mercoin(self, ctx: commands.Context, target: Optional[Member]):
         """
         Has a 50% chance to steal exactly 1 mercoin from the target user and gives it to the invoking user.
-        Requires the bot to have a database instance at self.bot.db supporting add_mercoins/get_mercoins.
+        Requires the bot to have a database instance at self.bot.database supporting transfer_mercoins.
         50% chance to fail and lose 1 mercoin instead.
         50% chance to succeed and steal 1 mercoin from the target user.
         """
@@ -525,42 +525,40 @@ class Fun(Cog, name="fun"):
             return
 
         db = getattr(self.bot, 'database', None)
-        if db is None or not hasattr(db, 'add_mercoins') or not hasattr(db, 'get_mercoins'):
+        if db is None or not hasattr(db, 'transfer_mercoins'):
             await ctx.send("Database is not configured for mercoins.", delete_after=10)
             return
 
+        if target is None or target.id == ctx.author.id:
+            await ctx.send("You cannot steal from yourself.", delete_after=10)
+            return
+
         user_id = ctx.author.id
+        error = None
         try:
-            if hasattr(db, 'user_exists') and hasattr(db, 'create_user'):
-                if not db.user_exists(user_id):
-                    db.create_user(user_id)
-
-            if target is None or target.id == ctx.author.id:
-                await ctx.send("You cannot steal from yourself.", delete_after=10)
-                return
-
-            if target is not None and hasattr(db, 'user_exists') and hasattr(db, 'create_user'):
-                if not db.user_exists(target.id) or not db.get_mercoins(target.id):
-                    await ctx.send("Target user does not have any mercoins to steal.", delete_after=10)
-                    return
-
-            if db.get_mercoins(user_id) < 1:
-                await ctx.send("You need at least 1 mercoin to attempt a theft.", delete_after=10)
-                return
-
-            if random.random() < 0.5:
-                db.remove_mercoins(target.id, 1)  # remove 1 from target
-                db.add_mercoins(user_id, 1)
-                success = True
-            else:
-                db.remove_mercoins(user_id, 1)  # remove 1 from self
-                db.add_mercoins(target.id, 1)  # give 1 to target
-                success = False
-            total = db.get_mercoins(user_id)
+            # Both balances are locked while they're checked and the coin moves, so concurrent thefts can't
+            # overdraw either user. Nothing in this block may await. Both users hold mercoins by the time a
+            # transfer runs, so it can reuse the balances read here instead of creating and re-reading the users.
+            with db.transaction():
+                balances = db.get_mercoin_balances([user_id, target.id], lock=True)
+                if not balances[target.id]:
+                    error = "Target user does not have any mercoins to steal."
+                elif balances[user_id] < 1:
+                    error = "You need at least 1 mercoin to attempt a theft."
+                elif random.random() < 0.5:
+                    _, total = db.transfer_mercoins(target.id, user_id, 1, balances=balances)
+                    success = True
+                else:
+                    total, _ = db.transfer_mercoins(user_id, target.id, 1, balances=balances)
+                    success = False
         except Exception:
             await ctx.send("There was an error processing your mercoin purchase.", delete_after=10)
             return
 
+        if error:
+            await ctx.send(error, delete_after=10)
+            return
+
         await ctx.send(
             f"{ctx.author.mention} {'successfully stole 1 mercoin from ' + target.display_name if success else 'failed and lost 1 mercoin to ' + target.display_name}. "
             f"You now have **{total}** mercoin{'s' if total != 1 else ''}."
@@ -14,6 +14,8 @@ from discord.ext import commands, tasks
 from discord.ext.commands import Cog
 from pytz import UTC
 
+from lib.delivery_utils import DeliveryLane
+
 with open('lib/data/giveaway_data.json') as f:
     x = json.load(f)
     giveaway_data = {int(k): v for k, v in x.items()}
@@ -283,7 +285,7 @@ class Giveaway(Cog, name="giveaway"):
 
             embed = get_embed(giveaway_data['prize'], author, role_obj, giveaway_data['winners'], current_time,
                               giveaway_time, None, giveaway_data['start_time'], giveaway_data['duration'])
-            await message_obj.edit(embed=embed)
+            await self.bot.delivery.edit(DeliveryLane.LOG, message_obj, embed=embed)
         except HTTPException:
             log_entry(f"Unspecified error for channel: {giveaway_data['channel']} and guild: {giveaway_data['guild']}"
                       f" for giveaway {message_id} with prize {giveaway_data['prize']} "
@@ -361,8 +363,8 @@ class Giveaway(Cog, name="giveaway"):
             set_giveaway_complete(message_id)
             msg_embed = get_embed(giveaway_data['prize'], author, role_obj, giveaway_data['winners'], datetime.now(tz=UTC),
                                   None, winner_list, giveaway_data['start_time'], giveaway_data['duration'])
-            await message_obj.edit(embed=msg_embed)
-            await channel_obj.send(content=" ".join(winner_list), embed=embed)
+            await self.bot.delivery.edit(DeliveryLane.LOG, message_obj, embed=msg_embed)
+            await self.bot.delivery.send(DeliveryLane.LOG, channel_obj, content=" ".join(winner_list), embed=embed)
         except Forbidden:
             log_entry(f"Unspecified error for channel: {giveaway_data['channel']} and guild: {giveaway_data['guild']}"
                       f" for giveaway {message_id} with prize {giveaway_data['prize']} "
@@ -409,7 +411,7 @@ class Giveaway(Cog, name="giveaway"):
         embed = get_embed(giveaway_prize, author, role_obj, winners, current_time, duration, winner_list, current_time,
                           duration)
 
-        giveaway_msg = await channel_obj.send(embed=embed)
+        giveaway_msg = await self.bot.delivery.send(DeliveryLane.LOG, channel_obj, embed=embed)
 
         await giveaway_msg.add_reaction("🎉")
 
@@ -76,7 +76,7 @@ def get_guild_target(ctx, target: Optional[Guild]):
     return target
 
 
-async def get_server_embed(guild):
+async def get_server_embed(guild, presence_index=None):
     embed = discord.Embed(color=guild.owner.color,
                           timestamp=datetime.utcnow())
 
@@ -87,10 +87,13 @@ async def get_server_embed(guild):
     if guild.description:
         embed.description = guild.description
 
-    statuses = [len(list(filter(lambda m: str(m.status) == "online", guild.members))),
-                len(list(filter(lambda m: str(m.status) == "idle", guild.members))),
-                len(list(filter(lambda m: str(m.status) == "dnd", guild.members))),
-                len(list(filter(lambda m: str(m.status) == "offline", guild.members)))]
+    if presence_index is not None:
+        statuses = list(presence_index.get_status_counts(guild.id).values())
+    else:
+        statuses = [len(list(filter(lambda m: str(m.status) == "online", guild.members))),
+                    len(list(filter(lambda m: str(m.status) == "idle", guild.members))),
+                    len(list(filter(lambda m: str(m.status) == "dnd", guild.members))),
+                    len(list(filter(lambda m: str(m.status) == "offline", guild.members)))]
 
     fields = [("ID", guild.id, True),
               ("Owner", guild.owner, True),
@@ -136,7 +139,7 @@ class Info(Cog, name="info"):
     async def server_info(self, ctx: commands.Context):
         """Display information about the current server."""
         target = get_guild_target(ctx, None)
-        embed = await get_server_embed(target)
+        embed = await get_server_embed(target, self.bot.presence_index)
 
         await self.bot.send_message(ctx, embed=embed)
 
@@ -6,6 +6,7 @@ from discord.ext import tasks
 from discord.ext.commands import command, Cog, has_permissions, MissingRequiredArgument
 from discord.utils import get
 
+from lib.delivery_utils import DeliveryLane
 from lib.starboard_utils import add_new_starboard, update_star_count, get_guild_starboard_emojis, \
     get_guild_starboard_channels, add_new_sb_message, get_sb_message, get_sb_data, update_sb_message_data
 
@@ -147,13 +148,15 @@ class Starboard(Cog, name="starboard"):
 
                                 self.kekboard_posts.append(payload.message_id)
 
-                                star_message = await sb_channel.send(
+                                star_message = await self.bot.delivery.send(
+                                    DeliveryLane.LOG, sb_channel,
                                     content=emoji_str + " " + str(emoji_count) + " <#" + str(payload.channel_id) + ">",
                                     embed=embed)
                                 add_new_sb_message(payload.message_id, emoji, star_message.id)
                             else:
                                 star_message = await sb_channel.fetch_message(msg_id)
-                                await star_message.edit(
+                                await self.bot.delivery.edit(
+                                    DeliveryLane.LOG, star_message,
                                     content=emoji_str + " " + str(emoji_count) + " <#" + str(payload.channel_id) + ">",
                                     embed=embed)
                             posted = True
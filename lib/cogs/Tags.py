@@ -14,16 +14,10 @@ class Tags(Cog, name="tags"):
         self.bot = bot
 
     async def tag_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
-        server_tags = self.bot.database.get_server_tags(interaction.guild.id)
-        tag_names = [tag["tag_name"] for tag in server_tags]
-
-        if not current:
-            # If the user hasn't typed anything, return the first 25 tag names as choices
-            return [app_commands.Choice(name=tag, value=tag) for tag in tag_names[:25]]
-        else:
-            # If the user has typed something, filter the tag names based on the input and return the first 25 matches
-            filtered_tags = [tag for tag in tag_names if current.lower() in tag.lower()]
-            return [app_commands.Choice(name=tag, value=tag) for tag in filtered_tags[:25]]
+        # Answered from the tag resolver's sorted name index, so typing doesn't query the database. With nothing
+        # typed yet this returns the first 25 tag names alphabetically.
+        tag_names = self.bot.database.find_tag_names(interaction.guild.id, current)
+        return [app_commands.Choice(name=tag, value=tag) for tag in tag_names]
     @commands.hybrid_command(name='tag', description="Retrieves a tag by its name and displays its content.", aliases=['t'])
     @app_commands.describe(tag="The name of the tag to retrieve.",
                            target="The member to mention in the tag message.")
@@ -198,8 +192,10 @@ class Tags(Cog, name="tags"):
     async def bulk_insert_tags(self, ctx: commands.Context,
                                server_id: int = commands.parameter(description="The ID of the server to insert the tags into.")):
         """Inserts multiple tags at once."""
-        self.bot.database.bulk_insert_tags(tag_data, [server_id])
-        await self.bot.send_message(ctx, f"Tags inserted into server {server_id}.", ephemeral=True)
+        stats = self.bot.database.bulk_insert_tags(tag_data, [server_id])
+        await self.bot.send_message(ctx, f"Tags inserted into server {server_id}: {stats['created']} created, "
+                                         f"{stats['updated']} updated, {stats['duplicates']} duplicate names skipped "
+                                         f"({stats['rows_per_second']:.0f} rows/s).", ephemeral=True)
 
     @Cog.listener()
     async def on_message(self, message):
@@ -212,10 +208,10 @@ class Tags(Cog, name="tags"):
 
         for prefix in prefixes:
             if message.content.startswith(prefix):
+                # Tag names are matched case-insensitively, and after the server's tags are first loaded this
+                # is answered from memory, so ordinary commands don't cost a query
                 tag_name = message.content[len(prefix):].strip()
-                tag_info = self.bot.database.retrieve_tag(tag_name.lower(), message.guild.id)
-                if not tag_info:
-                    tag_info = self.bot.database.retrieve_tag(tag_name, message.guild.id)
+                tag_info = self.bot.database.retrieve_tag(tag_name, message.guild.id)
 
                 if tag_info:
                     content = tag_info["content"]
@@ -86,6 +86,22 @@ class Utility(Cog, name="utility"):
             await ctx.send(
                 f"Slash commands could not be synced, try again later, exception: {e}")
 
+    @commands.command(name='cachestats', description='Shows settings cache and tag resolver statistics.', aliases=[])
+    @commands.is_owner()
+    async def cache_stats(self, ctx):
+        """Shows settings cache and tag resolver statistics."""
+        settings_stats = self.bot.settings_cache.get_stats()
+        tag_stats = self.bot.tag_resolver.get_stats()
+
+        def format_hit_rate(stats):
+            return f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else 'n/a'
+
+        await ctx.send(f"Settings cache: {settings_stats['entries']} entries, {settings_stats['hits']} hits, "
+                       f"{settings_stats['misses']} misses, hit rate {format_hit_rate(settings_stats)}\n"
+                       f"Tag resolver: {tag_stats['tags']} tags over {tag_stats['servers']} servers, "
+                       f"{tag_stats['hits']} hits, {tag_stats['misses']} misses, "
+                       f"hit rate {format_hit_rate(tag_stats)}")
+
     async def handle_commit(self):
         print('Pulling from GitHub...')
         await self.bot.stdout.send("Pulling from GitHub...")
@@ -0,0 +1,684 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Union, Tuple, List, Any, Optional, Iterable, AsyncIterator
+
+import aiomysql
+import pymysql
+from aiomysql import Pool
+
+from lib.db.mercurius_db import MercuriusDatabase
+from lib.db.settings_cache import SettingsCache
+from lib.db.tag_resolver import ServerTags, TagResolver
+
+
+class AsyncMercuriusDatabase(MercuriusDatabase):
+    """
+    Non-blocking variant of MercuriusDatabase backed by an aiomysql connection pool.
+
+    Every public method of MercuriusDatabase has an awaitable equivalent here with the same name, arguments and
+    return value, so queries issued from the cogs never block the event loop and can run concurrently, up to the
+    size of the pool.
+
+    Use `AsyncMercuriusDatabase.create(...)` to build an instance, since opening the pool has to be awaited.
+    """
+
+    DEFAULT_POOL_MINSIZE = 1
+    DEFAULT_POOL_MAXSIZE = 10
+
+    def __init__(self, user: str, password: str, host: str, database: str,
+                 minsize: int = DEFAULT_POOL_MINSIZE, maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 settings_cache: Optional[SettingsCache] = None, tag_resolver: Optional[TagResolver] = None) -> None:
+        # The synchronous connection set up by MercuriusDatabase is deliberately not opened here.
+        self.settings_cache = settings_cache if settings_cache is not None else SettingsCache()
+        self.tag_resolver = tag_resolver if tag_resolver is not None else TagResolver()
+        # The connection of the transaction the current task is in, if any. Being a context variable, other tasks
+        # keep using the pool while one task holds a transaction open.
+        self._transaction_connection: ContextVar[Optional[aiomysql.Connection]] = ContextVar(
+            f'transaction_connection_{id(self)}', default=None)
+        self.user = user
+        self.password = password
+        self.host = host
+        self.database = database
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.pool: Optional[Pool] = None
+
+    @classmethod
+    async def create(cls, user: str, password: str, host: str, database: str,
+                     minsize: int = DEFAULT_POOL_MINSIZE,
+                     maxsize: int = DEFAULT_POOL_MAXSIZE,
+                     settings_cache: Optional[SettingsCache] = None,
+                     tag_resolver: Optional[TagResolver] = None) -> 'AsyncMercuriusDatabase':
+        db = cls(user, password, host, database, minsize=minsize, maxsize=maxsize, settings_cache=settings_cache,
+                 tag_resolver=tag_resolver)
+        await db.connect()
+        return db
+
+    async def connect(self) -> None:
+        self.pool = await aiomysql.create_pool(user=self.user,
+                                               password=self.password,
+                                               host=self.host,
+                                               db=self.database,
+                                               minsize=self.minsize,
+                                               maxsize=self.maxsize,
+                                               autocommit=True)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    async def build_database(self) -> None:
+        with open("lib/db/build.sql", "r") as f:
+            sql = f.read()
+        for sql_stmt in sql.split(";"):
+            if sql_stmt.strip():
+                await self._execute_query(sql_stmt)
+
+        await self.migrate_database()
+
+    async def migrate_database(self) -> None:
+        for table_name, column_name, definition in self._COLUMN_MIGRATIONS:
+            if not await self._column_exists(table_name, column_name):
+                await self._execute_query(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}",
+                                          commit=True)
+
+        if await self._execute_query("SELECT 1 FROM server_visibility LIMIT 1", fetch='one') is None:
+            await self.rebuild_server_visibility()
+
+    async def rebuild_server_visibility(self) -> None:
+        servers = [row[0] for row in await self._execute_query("SELECT server_id FROM servers", fetch='all')]
+        links = await self._execute_query("SELECT server_id, linked_server_id FROM linked_servers", fetch='all')
+
+        await self._execute_query("DELETE FROM server_visibility", commit=True)
+        rows = self._build_server_visibility(servers, links)
+        if rows:
+            await self._execute_query(self._INSERT_SERVER_VISIBILITY_QUERY, rows, many=True, commit=True)
+        self.tag_resolver.clear()
+
+    async def _execute_query(self, query: str, *params, fetch: str = 'all',
+                             commit: bool = False, many: bool = False) -> Union[Tuple, List[Tuple], int, None]:
+        connection = self._transaction_connection.get()
+        if connection is not None:
+            # Committed by transaction() when the unit of work ends
+            return await self._execute_on_connection(connection, query, params, fetch, False, many)
+
+        async with self.pool.acquire() as connection:
+            return await self._execute_on_connection(connection, query, params, fetch, commit, many)
+
+    @staticmethod
+    async def _execute_on_connection(connection: aiomysql.Connection, query: str, params: Tuple, fetch: str,
+                                     commit: bool, many: bool) -> Union[Tuple, List[Tuple], int, None]:
+        async with connection.cursor() as cur:
+            if many:
+                await cur.executemany(query, params[0])
+            else:
+                await cur.execute(query, params)
+            if commit:
+                await connection.commit()
+            if fetch == 'lastrowid':
+                return cur.lastrowid
+            if fetch == 'one':
+                return await cur.fetchone()
+            elif fetch == 'all':
+                return await cur.fetchall()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator['AsyncMercuriusDatabase']:
+        """
+        Awaitable equivalent of MercuriusDatabase.transaction. The task holds one pooled connection for the whole
+        block, so unlike the synchronous version it's safe to await inside it.
+        """
+        if self._transaction_connection.get() is not None:
+            yield self
+            return
+
+        async with self.pool.acquire() as connection:
+            await connection.begin()
+            token = self._transaction_connection.set(connection)
+            try:
+                yield self
+            except BaseException:
+                await connection.rollback()
+                raise
+            else:
+                await connection.commit()
+            finally:
+                self._transaction_connection.reset(token)
+
+    async def _get_user_setting(self, user_id: int, setting: str, query: str, default: Any) -> Any:
+        value = self.settings_cache.get(user_id, setting)
+        if value is SettingsCache.MISSING:
+            # Another task can change the setting while the query is awaited
+            generation = self.settings_cache.generation
+            result = await self._execute_query(query, user_id, fetch='one')
+            value = result[0] if result else default
+            self.settings_cache.set(user_id, setting, value, generation=generation)
+        return value
+
+    async def _table_exists(self, table_name: str) -> bool:
+        q = """
+        SELECT 1
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+        """
+        return await self._execute_query(q, table_name, fetch='one') is not None
+
+    async def _column_exists(self, table_name: str, column_name: str) -> bool:
+        q = """
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """
+        return await self._execute_query(q, table_name, column_name, fetch='one') is not None
+
+    async def ensure_mercoin_schema(self) -> None:
+        await self._execute_query(self._ENSURE_USERS_SQL, commit=True)
+        await self._execute_query(self._ENSURE_MERCOINS_SQL, commit=True)
+
+    async def maybe_initialize_schema(self) -> None:
+        users_ok = await self._table_exists("users")
+        mer_ok = await self._table_exists("mercoins")
+        if users_ok and mer_ok:
+            return
+        try:
+            await self.build_database()
+        except Exception:
+            await self.ensure_mercoin_schema()
+
+    async def insert_servers(self, servers: List[int]) -> None:
+        await self._execute_query(self._INSERT_SERVER_QUERY, servers, many=True, commit=True)
+        await self._execute_query(self._INSERT_SERVER_VISIBILITY_QUERY,
+                                  [(server_id, server_id) for server_id in servers], many=True, commit=True)
+
+    async def set_platform(self, user: str, platform: str) -> None:
+        await self._execute_query(self._SET_PLATFORM_QUERY, user, platform, commit=True)
+        self.settings_cache.set(user, 'platform', platform)
+
+    async def get_platform(self, user: str) -> str:
+        return await self._get_user_setting(user, 'platform', self._GET_PLATFORM_QUERY, 'pc')
+
+    async def set_graph_style(self, user: str, style: str) -> None:
+        await self._execute_query(self._SET_GRAPH_STYLE_QUERY, user, style, commit=True)
+        self.settings_cache.set(user, 'graph_style', style)
+
+    async def get_graph_style(self, user: str) -> str:
+        return await self._get_user_setting(user, 'graph_style', self._GET_GRAPH_STYLE_QUERY, 'ggplot')
+
+    async def set_fissure_log_channel(self, server_id: int, channel_id: int, fissure_type: str) -> None:
+        await self._execute_query(self._SET_FISSURE_LOG_CHANNEL_QUERY, server_id, channel_id, fissure_type,
+                                  commit=True)
+
+    async def unset_fissure_log_channel(self, server_id: int, channel_id: int, fissure_type: str) -> None:
+        await self._execute_query(self._UNSET_FISSURE_LOG_CHANNEL_QUERY, server_id, channel_id, fissure_type,
+                                  commit=True)
+
+    async def get_fissure_log_channels(self) -> defaultdict:
+        results = await self._execute_query(self._GET_FISSURE_LOG_CHANNEL_QUERY, fetch='all')
+        fissure_log_dict = defaultdict(lambda: defaultdict(list))
+        for fissure_type, server_id, channel_id in results:
+            fissure_log_dict[fissure_type][server_id].append(channel_id)
+        return fissure_log_dict
+
+    async def set_fissure_list_channel(self, server_id: int, channel_id: int, message_id: int, max_tier: int,
+                                       show_lith: bool, show_meso: bool, show_neo: bool, show_axi: bool,
+                                       show_requiem: bool, show_omnia: bool, display_type: str,
+                                       show_normal: bool, show_steel_path: bool, show_void_storms: bool) -> None:
+        await self._execute_query(self._SET_FISSURE_LIST_CHANNEL_QUERY, server_id, channel_id, message_id, max_tier,
+                                  show_lith, show_meso, show_neo, show_axi, show_requiem, show_omnia, display_type,
+                                  show_normal, show_steel_path, show_void_storms, commit=True)
+
+    async def unset_fissure_list_channel(self, server_id: int, channel_id: int, message_id: int) -> None:
+        await self._execute_query(self._UNSET_FISSURE_LIST_CHANNEL_QUERY, server_id, channel_id, message_id,
+                                  commit=True)
+
+    async def set_fissure_list_message_id(self, fissure_list_id: int, message_id: int) -> None:
+        await self._execute_query(self._SET_FISSURE_LIST_MESSAGE_ID_QUERY, message_id, fissure_list_id, commit=True)
+
+    async def get_fissure_list_channels(self) -> defaultdict:
+        results = await self._execute_query(self._GET_FISSURE_LIST_CHANNEL_QUERY, fetch='all')
+        fissure_list_dict = defaultdict(list)
+        for row in results:
+            channel_config = {
+                "id": row[0],
+                "server_id": row[1],
+                "channel_id": row[2],
+                "message_id": row[3],
+                "max_tier": row[4],
+                "show_lith": row[5],
+                "show_meso": row[6],
+                "show_neo": row[7],
+                "show_axi": row[8],
+                "show_requiem": row[9],
+                "show_omnia": row[10],
+                "display_type": row[11],
+                "show_normal": row[12],
+                "show_steel_path": row[13],
+                "show_void_storms": row[14]
+            }
+            fissure_list_dict[row[1]].append(channel_config)
+        return fissure_list_dict
+
+    async def set_fissure_list_defaults(self, user_id: int, **kwargs) -> None:
+        params = [user_id] + [kwargs.get(field, None) for field in self._FISSURE_LIST_DEFAULTS_FIELDS]
+        await self._execute_query(self._UPSERT_FISSURE_LIST_DEFAULTS_QUERY, *params, commit=True)
+
+    async def update_fissure_list_defaults(self, user_id: int, **kwargs) -> None:
+        update_fields = [f"{field} = %s" for field in kwargs]
+        if not update_fields:
+            return
+        query = f"UPDATE fissure_list_defaults SET {', '.join(update_fields)} WHERE user_id = %s"
+        params = list(kwargs.values()) + [user_id]
+        await self._execute_query(query, *params, commit=True)
+
+    async def get_fissure_list_defaults(self, user_id: int) -> Dict[str, Any]:
+        defaults = await self._execute_query(self._GET_FISSURE_LIST_DEFAULTS_QUERY, user_id, fetch='one')
+        if defaults:
+            return dict(zip(self._FISSURE_LIST_DEFAULTS_FIELDS, defaults))
+        return None
+
+    async def add_fissure_subscription(self, user_id: int, fissure_type: str = None, era: str = None,
+                                       node: str = None, mission: str = None, planet: str = None,
+                                       tileset: str = None, enemy: str = None, tier: int = None) -> None:
+        if not any([fissure_type, era, node, mission, planet, tileset, enemy, tier]):
+            raise ValueError("Cannot add a blank subscription")
+
+        existing_subscriptions = await self.get_fissure_subscriptions(user_id)
+        new_subscription = {
+            "fissure_type": fissure_type,
+            "era": era,
+            "node": node,
+            "mission": mission,
+            "planet": planet,
+            "tileset": tileset,
+            "enemy": enemy,
+            "max_tier": tier
+        }
+        if new_subscription in existing_subscriptions:
+            raise ValueError("You're already subscribed to this fissure. To manage subscriptions type /listfissuresubscriptions")
+
+        await self._execute_query(self._ADD_FISSURE_SUBSCRIPTION_QUERY, user_id, fissure_type, era, node, mission,
+                                  planet, tileset, enemy, tier, commit=True)
+
+    async def remove_fissure_subscription(self, user_id: int, fissure_type: str = None, era: str = None,
+                                          node: str = None, mission: str = None, planet: str = None,
+                                          tileset: str = None, enemy: str = None, max_tier: int = None) -> None:
+        conditions = [
+            ("fissure_type", fissure_type),
+            ("era", era),
+            ("node", node),
+            ("mission", mission),
+            ("planet", planet),
+            ("tileset", tileset),
+            ("enemy", enemy),
+            ("max_tier", max_tier)
+        ]
+        query = str(self._REMOVE_FISSURE_SUBSCRIPTION_QUERY)
+        params = [user_id]
+        for column, value in conditions:
+            if value is not None:
+                query += f" AND {column} = %s"
+                params.append(value)
+        await self._execute_query(query, *params, commit=True)
+
+    async def remove_all_fissure_subscriptions(self, user_id: int) -> None:
+        await self._execute_query(self._REMOVE_FISSURE_SUBSCRIPTION_QUERY, user_id, commit=True)
+
+    async def get_fissure_subscriptions(self, user_id: int) -> List[Dict[str, Union[str, int]]]:
+        subscriptions = await self._execute_query(self._GET_FISSURE_SUBSCRIPTIONS_QUERY, user_id, fetch='all')
+        return [
+            {
+                "fissure_type": row[0],
+                "era": row[1],
+                "node": row[2],
+                "mission": row[3],
+                "planet": row[4],
+                "tileset": row[5],
+                "enemy": row[6],
+                "max_tier": row[7]
+            }
+            for row in subscriptions
+        ]
+
+    async def get_all_fissure_subscriptions(self, notification_type: str = 'DM') -> List[Dict[str, Union[str, int]]]:
+        subscriptions = await self._execute_query(self._GET_ALL_FISSURE_SUBSCRIPTIONS_QUERY, notification_type,
+                                                  fetch='all')
+        return [
+            {
+                "user_id": row[0],
+                "fissure_type": row[1],
+                "era": row[2],
+                "node": row[3],
+                "mission": row[4],
+                "planet": row[5],
+                "tileset": row[6],
+                "enemy": row[7],
+                "max_tier": row[8]
+            }
+            for row in subscriptions
+        ]
+
+    async def user_exists(self, user_id: int) -> bool:
+        exists = await self._execute_query(self._USER_EXISTS_QUERY, user_id, fetch='one')
+        return exists[0] == 1
+
+    async def create_user(self, user_id: int) -> None:
+        await self._execute_query(self._CREATE_USER_QUERY, user_id, commit=True)
+
+    async def save_fissure_view(self, message_text: str, button_configs: List[dict], channel_id: int,
+                                message_id: int, config_hash: str = None) -> None:
+        await self._execute_query(self._SAVE_FISSURE_VIEW_QUERY, message_text, json.dumps(button_configs),
+                                  channel_id, message_id, config_hash, commit=True)
+
+    async def get_all_fissure_views(self) -> List[dict]:
+        results = await self._execute_query(self._GET_ALL_FISSURE_VIEWS_QUERY, fetch='all')
+        return [
+            {
+                "message_text": row[0],
+                "button_configs": json.loads(row[1]),
+                "channel_id": row[2],
+                "message_id": row[3],
+                "config_hash": row[4]
+            }
+            for row in results
+        ]
+
+    async def get_fissure_view_by_message_id(self, message_id: int) -> Union[dict, None]:
+        result = await self._execute_query(self._GET_FISSURE_VIEW_BY_MESSAGE_ID_QUERY, message_id, fetch='one')
+        if result:
+            return {
+                "message_text": result[0],
+                "button_configs": json.loads(result[1]),
+                "channel_id": result[2],
+                "message_id": result[3],
+                "config_hash": result[4]
+            }
+        return None
+
+    async def update_fissure_view(self, message_text: str, button_configs: List[dict], message_id: int,
+                                  config_hash: str = None) -> None:
+        await self._execute_query(self._UPDATE_FISSURE_VIEW_QUERY, message_text, json.dumps(button_configs),
+                                  config_hash, message_id, commit=True)
+
+    async def set_fissure_view_config_hash(self, message_id: int, config_hash: str) -> None:
+        await self._execute_query(self._SET_FISSURE_VIEW_CONFIG_HASH_QUERY, config_hash, message_id, commit=True)
+
+    async def delete_all_fissure_views(self) -> None:
+        await self._execute_query("DELETE FROM fissure_views", commit=True)
+
+    async def get_fissure_notification_type(self, user_id: int) -> str:
+        return await self._get_user_setting(user_id, 'notification_type', self._GET_FISSURE_NOTIFICATION_TYPE_QUERY,
+                                            'DM')
+
+    async def set_fissure_notification_type(self, user_id: int, notification_type: str) -> None:
+        await self._execute_query(self._SET_FISSURE_NOTIFICATION_TYPE_QUERY, notification_type, user_id,
+                                  commit=True)
+        self.settings_cache.invalidate(user_id, 'notification_type')
+
+    async def set_thread_notification_server(self, user_id: int, server_id: int) -> None:
+        await self._execute_query(self._SET_THREAD_NOTIFICATION_SERVER_QUERY, server_id, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'thread_server_id')
+
+    async def get_thread_notification_server(self, user_id: int) -> int:
+        return await self._get_user_setting(user_id, 'thread_server_id', self._GET_THREAD_NOTIFICATION_SERVER_QUERY,
+                                            None)
+
+    async def get_fissure_notifications_enabled(self, user_id: int) -> bool:
+        return await self._get_user_setting(user_id, 'enabled', self._GET_FISSURE_NOTIFICATIONS_ENABLED_QUERY, True)
+
+    async def set_fissure_notifications_enabled(self, user_id: int, enabled: bool) -> None:
+        await self._execute_query(self._SET_FISSURE_NOTIFICATIONS_ENABLED_QUERY, enabled, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'enabled')
+
+    async def get_fissure_dm_digest(self, user_id: int) -> bool:
+        return bool(await self._get_user_setting(user_id, 'digest', self._GET_FISSURE_DM_DIGEST_QUERY, False))
+
+    async def set_fissure_dm_digest(self, user_id: int, enabled: bool) -> None:
+        await self._execute_query(self._SET_FISSURE_DM_DIGEST_QUERY, enabled, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'digest')
+
+    async def get_fissure_notification_status(self, user_id: int) -> dict:
+        status = self.settings_cache.get(user_id, 'status')
+        if status is SettingsCache.MISSING:
+            generation = self.settings_cache.generation
+            result = await self._execute_query(self._GET_FISSURE_NOTIFICATION_STATUS_QUERY, user_id, fetch='one')
+            status = self._build_fissure_notification_status(result)
+            self.settings_cache.set(user_id, 'status', status, generation=generation)
+
+        return dict(status)
+
+    async def get_fissure_notification_settings(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return {}
+
+        query = self._GET_FISSURE_NOTIFICATION_SETTINGS_QUERY.format(placeholders=', '.join(['%s'] * len(user_ids)))
+        results = await self._execute_query(query, *user_ids, fetch='all')
+        return self._build_fissure_notification_settings(user_ids, results)
+
+    async def add_fissure_thread_archive(self, thread_id: int, channel_id: int, expiry: datetime) -> None:
+        await self._execute_query(self._ADD_FISSURE_THREAD_ARCHIVE_QUERY, thread_id, channel_id, expiry, commit=True)
+
+    async def get_due_fissure_thread_archives(self, before: datetime, limit: int = 100) -> List[Dict[str, int]]:
+        results = await self._execute_query(self._GET_DUE_FISSURE_THREAD_ARCHIVES_QUERY, before, limit, fetch='all')
+        return [{'thread_id': row[0], 'channel_id': row[1], 'attempts': row[2]} for row in results]
+
+    async def remove_fissure_thread_archives(self, thread_ids: List[int]) -> None:
+        if not thread_ids:
+            return
+
+        query = self._REMOVE_FISSURE_THREAD_ARCHIVES_QUERY.format(placeholders=', '.join(['%s'] * len(thread_ids)))
+        await self._execute_query(query, *thread_ids, commit=True)
+
+    async def retry_fissure_thread_archives(self, thread_ids: List[int], retry_at: datetime) -> None:
+        if not thread_ids:
+            return
+
+        query = self._RETRY_FISSURE_THREAD_ARCHIVES_QUERY.format(placeholders=', '.join(['%s'] * len(thread_ids)))
+        await self._execute_query(query, retry_at, *thread_ids, commit=True)
+
+    async def set_fissure_notification_status(self, user_id: int, status: str, enabled: bool) -> None:
+        query = f"""
+        INSERT INTO fissure_notification_status (user_id, {status})
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE {status} = VALUES({status})
+        """
+        await self._execute_query(query, user_id, enabled, commit=True)
+        self._update_cached_fissure_notification_status(user_id, status, enabled)
+
+    async def set_item_settings(self, user_id: int, item_id: str, plat_notification_threshold: int = None,
+                                daily_messages: bool = False, favorite: bool = True) -> None:
+        await self._execute_query(self._SET_ITEM_SETTINGS_QUERY, user_id, item_id, plat_notification_threshold,
+                                  daily_messages, favorite, commit=True)
+
+    async def get_item_settings_by_user(self, user_id: int) -> List[Dict[str, Union[str, int, bool]]]:
+        results = await self._execute_query(self._GET_ITEM_SETTINGS_BY_USER_QUERY, user_id, fetch='all')
+        return [
+            {
+                "item_id": row[0],
+                "plat_notification_threshold": row[1],
+                "daily_messages": row[2],
+                "favorite": row[3]
+            }
+            for row in results
+        ]
+
+    async def get_item_settings_by_user_and_item(self, user_id: int,
+                                                 item_id: str) -> Union[Dict[str, Union[int, bool]], None]:
+        result = await self._execute_query(self._GET_ITEM_SETTINGS_BY_USER_AND_ITEM_QUERY, user_id, item_id,
+                                           fetch='one')
+        if result:
+            return {
+                "plat_notification_threshold": result[0],
+                "daily_messages": result[1],
+                "favorite": result[2]
+            }
+        return None
+
+    async def remove_item_settings_by_user_and_item(self, user_id: int, item_id: str) -> None:
+        await self._execute_query(self._REMOVE_ITEM_SETTINGS_BY_USER_AND_ITEM_QUERY, user_id, item_id, commit=True)
+
+    async def remove_all_item_settings_by_user(self, user_id: int) -> None:
+        await self._execute_query(self._REMOVE_ALL_ITEM_SETTINGS_BY_USER_QUERY, user_id, commit=True)
+
+    async def set_market_notifications_mute_status(self, user_id: int, mute_status: bool) -> None:
+        await self._execute_query(self._SET_MARKET_NOTIFICATIONS_MUTE_STATUS_QUERY, mute_status, user_id,
+                                  commit=True)
+
+    async def get_market_notifications_mute_status(self, user_id: int) -> bool:
+        result = await self._execute_query(self._GET_MARKET_NOTIFICATIONS_MUTE_STATUS_QUERY, user_id, fetch='one')
+        return result[0] if result else True
+
+    async def store_tag(self, tag_name: str, content: str, autodelete: bool, dm: bool, server_id: int) -> None:
+        tag_id = await self._execute_query(self._STORE_TAG_QUERY, tag_name, content, autodelete, dm,
+                                           fetch='lastrowid', commit=True)
+        self.tag_resolver.invalidate_tag(tag_name=tag_name)
+        await self.link_tag_to_server(tag_id, server_id)
+
+    async def get_visible_servers(self, server_id: int) -> List[int]:
+        results = await self._execute_query(self._GET_VISIBLE_SERVERS_QUERY, server_id, fetch='all')
+        return [row[0] for row in results]
+
+    async def get_visible_tags(self, server_id: int) -> ServerTags:
+        tags = self.tag_resolver.get_tags(server_id)
+        if tags is None:
+            generation = self.tag_resolver.generation
+            visible_servers = await self.get_visible_servers(server_id)
+            results = await self._execute_query(self._GET_SERVER_TAGS_QUERY, server_id, fetch='all')
+            tags = self.tag_resolver.set_tags(server_id, visible_servers, self._build_server_tags(results),
+                                              generation)
+        return tags
+
+    async def retrieve_tag(self, tag_name: str, server_id: int) -> Optional[Dict[str, Any]]:
+        tag = (await self.get_visible_tags(server_id)).get(tag_name.lower())
+        if tag:
+            return {"content": tag["content"], "autodelete": tag["autodelete"], "dm": tag["dm"]}
+        return None
+
+    async def delete_tag(self, tag_id: int, server_id: int) -> None:
+        tag_server_link_query = "DELETE FROM tag_server_link WHERE tag_id = %s AND server_id = %s"
+        await self._execute_query(tag_server_link_query, tag_id, server_id, commit=True)
+        try:
+            query = f"DELETE FROM tags WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
+            await self._execute_query(query, tag_id, server_id, commit=True)
+        except pymysql.err.IntegrityError:
+            pass
+        finally:
+            self.tag_resolver.invalidate_tag(tag_id=tag_id)
+
+    async def update_autodelete(self, tag_id: int, autodelete: bool, server_id: int) -> None:
+        query = f"UPDATE tags SET autodelete = %s WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
+        await self._execute_query(query, autodelete, tag_id, server_id, commit=True)
+        self.tag_resolver.invalidate_tag(tag_id=tag_id)
+
+    async def update_dm(self, tag_id: int, dm: bool, server_id: int) -> None:
+        query = f"UPDATE tags SET dm = %s WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
+        await self._execute_query(query, dm, tag_id, server_id, commit=True)
+        self.tag_resolver.invalidate_tag(tag_id=tag_id)
+
+    async def link_tag_to_server(self, tag_id: int, server_id: int) -> None:
+        await self._execute_query(self._LINK_TAG_TO_SERVER_QUERY, tag_id, server_id, commit=True)
+        self.tag_resolver.invalidate_servers(server_id)
+
+    async def link_servers(self, server_id: int, linked_server_id: int) -> None:
+        async with self.transaction():
+            await self._execute_query(self._LINK_SERVERS_QUERY, server_id, linked_server_id,
+                                      server_id, linked_server_id, linked_server_id, server_id, commit=True)
+            await self._execute_query(self._INSERT_SERVER_VISIBILITY_QUERY,
+                                      [(server_id, server_id), (linked_server_id, linked_server_id)], many=True,
+                                      commit=True)
+            await self._execute_query(self._LINK_SERVER_VISIBILITY_QUERY, linked_server_id, server_id,
+                                      linked_server_id, server_id, commit=True)
+        self.tag_resolver.invalidate_servers(server_id, linked_server_id)
+
+    async def bulk_insert_tags(self, tags: Union[Dict[str, Dict[str, Any]], Iterable[Tuple[str, Dict[str, Any]]]],
+                               server_ids: List[int], overwrite: bool = True,
+                               chunk_size: int = MercuriusDatabase.DEFAULT_TAG_IMPORT_CHUNK_SIZE) -> Dict[str, Any]:
+        stats = self._new_tag_import_stats()
+        start = time.perf_counter()
+
+        try:
+            async with self.transaction():
+                for chunk in self._chunk_tag_import(tags, chunk_size, stats):
+                    query = self._GET_TAG_IDS_BY_NAME_QUERY.format(placeholders=', '.join(['%s'] * len(chunk)))
+                    names = [row[0] for row in chunk]
+
+                    existing_rows = await self._execute_query(query, *names, fetch='all')
+                    rows = self._get_tag_rows_to_write(chunk, existing_rows, overwrite, stats)
+                    if rows:
+                        await self._execute_query(self._STORE_TAG_QUERY, rows, many=True, commit=True)
+
+                    id_rows = await self._execute_query(query, *names, fetch='all')
+                    link_rows = self._get_tag_link_rows(chunk, id_rows, server_ids, stats)
+                    if link_rows:
+                        await self._execute_query(self._BULK_LINK_TAG_TO_SERVER_QUERY, link_rows, many=True,
+                                                  commit=True)
+        finally:
+            self.tag_resolver.clear()
+
+        return self._finish_tag_import_stats(stats, start)
+
+    async def get_tag_id(self, tag_name: str, server_id: int) -> Optional[int]:
+        tag = (await self.get_visible_tags(server_id)).get(tag_name.lower())
+        return tag["id"] if tag else None
+
+    async def get_server_tags(self, server_id: int) -> List[Dict[str, Any]]:
+        return [dict(tag) for tag in (await self.get_visible_tags(server_id)).values()]
+
+    async def find_tag_names(self, server_id: int, text: str, limit: int = 25) -> List[str]:
+        return (await self.get_visible_tags(server_id)).find_names(text, limit)
+
+    async def add_mercoins(self, user_id: int, amount: int = 1) -> None:
+        if amount is None:
+            amount = 1
+        if amount == 0:
+            return
+        await self.create_user(user_id)  # ensure FK row
+        await self._execute_query(self._ADD_MERCOINS_QUERY, user_id, amount, commit=True)
+
+    async def remove_mercoins(self, user_id: int, amount: int = 1) -> None:
+        if amount is None:
+            amount = 1
+        if amount == 0:
+            return
+        await self.create_user(user_id)  # ensure FK row
+        await self._execute_query(self._REMOVE_MERCOINS_QUERY, amount, user_id, commit=True)
+
+    async def get_mercoins(self, user_id: int) -> int:
+        result = await self._execute_query(self._GET_MERCOINS_QUERY, user_id, fetch='one')
+        return result[0] if result else 0
+
+    async def get_mercoin_balances(self, user_ids: List[int], lock: bool = False) -> Dict[int, int]:
+        query = self._GET_MERCOIN_BALANCES_QUERY.format(placeholders=', '.join(['%s'] * len(user_ids)))
+        if lock:
+            query += " FOR UPDATE"
+
+        balances = {user_id: 0 for user_id in user_ids}
+        balances.update(await self._execute_query(query, *user_ids, fetch='all'))
+        return balances
+
+    async def transfer_mercoins(self, from_user_id: int, to_user_id: int, amount: int = 1,
+                                balances: Optional[Dict[int, int]] = None) -> Optional[Tuple[int, int]]:
+        self._check_mercoin_transfer(from_user_id, to_user_id, amount)
+
+        async with self.transaction():
+            if balances is None:
+                await self._execute_query(self._CREATE_USER_QUERY, [from_user_id, to_user_id], many=True,
+                                          commit=True)
+                balances = await self.get_mercoin_balances([from_user_id, to_user_id], lock=True)
+
+            return await self._apply_mercoin_transfer(from_user_id, to_user_id, amount, balances)
+
+    async def _apply_mercoin_transfer(self, from_user_id: int, to_user_id: int, amount: int,
+                                      balances: Dict[int, int]) -> Optional[Tuple[int, int]]:
+        if balances[from_user_id] < amount:
+            return None
+
+        await self._execute_query(self._ADD_MERCOINS_QUERY, [(from_user_id, -amount), (to_user_id, amount)],
+                                  many=True, commit=True)
+        return balances[from_user_id] - amount, balances[to_user_id] + amount
@@ -5,7 +5,8 @@ CREATE TABLE IF NOT EXISTS users (
     fissure_notification_type ENUM('DM', 'Thread') DEFAULT 'DM',
     thread_notification_server_id BIGINT,
     fissure_notifications_enabled BOOLEAN DEFAULT true,
-    mute_market_notifications BOOLEAN DEFAULT true
+    mute_market_notifications BOOLEAN DEFAULT true,
+    fissure_dm_digest BOOLEAN DEFAULT false
 );
 
 
@@ -80,7 +81,8 @@ CREATE TABLE IF NOT EXISTS fissure_views (
     message_text VARCHAR(255) NOT NULL,
     button_configs JSON NOT NULL,
     channel_id BIGINT NOT NULL,
-    message_id BIGINT NOT NULL
+    message_id BIGINT NOT NULL,
+    config_hash CHAR(64)
 );
 
 CREATE TABLE IF NOT EXISTS fissure_notification_status (
@@ -92,6 +94,14 @@ CREATE TABLE IF NOT EXISTS fissure_notification_status (
     FOREIGN KEY (user_id) REFERENCES users (discord_id)
 );
 
+CREATE TABLE IF NOT EXISTS fissure_thread_archives (
+    thread_id BIGINT PRIMARY KEY,
+    channel_id BIGINT NOT NULL,
+    expiry DATETIME NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    INDEX idx_fissure_thread_archives_expiry (expiry)
+);
+
 CREATE TABLE IF NOT EXISTS item_settings (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id BIGINT NOT NULL,
@@ -127,6 +137,14 @@ CREATE TABLE IF NOT EXISTS linked_servers (
     FOREIGN KEY (linked_server_id) REFERENCES servers(server_id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS server_visibility (
+    server_id BIGINT NOT NULL,
+    visible_server_id BIGINT NOT NULL,
+    PRIMARY KEY (server_id, visible_server_id),
+    FOREIGN KEY (server_id) REFERENCES servers(server_id) ON DELETE CASCADE,
+    FOREIGN KEY (visible_server_id) REFERENCES servers(server_id) ON DELETE CASCADE
+);
+
 CREATE TABLE IF NOT EXISTS mercoins (
     user_id BIGINT NOT NULL,
     amount BIGINT NOT NULL DEFAULT 0,
@@ -1,10 +1,16 @@
 import json
+import time
 from collections import defaultdict
-from typing import Dict, Union, Tuple, List, Any, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Union, Tuple, List, Any, Optional, Iterable, Iterator, Set
 
 import pymysql
 from pymysql import Connection, OperationalError
 
+from lib.db.settings_cache import SettingsCache
+from lib.db.tag_resolver import ServerTags, TagResolver
+
 
 class MercuriusDatabase:
     _SET_PLATFORM_QUERY = """INSERT INTO users (discord_id, platform) 
@@ -101,6 +107,26 @@ class MercuriusDatabase:
     WHERE user_id = %s
     """
 
+    _UPSERT_FISSURE_LIST_DEFAULTS_QUERY = """
+    INSERT INTO fissure_list_defaults (user_id, show_normal, show_steel_path, show_void_storms, max_tier, 
+                                       show_lith, show_meso, show_neo, show_axi, show_requiem, show_omnia)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE 
+        show_normal = COALESCE(VALUES(show_normal), show_normal),
+        show_steel_path = COALESCE(VALUES(show_steel_path), show_steel_path),
+        show_void_storms = COALESCE(VALUES(show_void_storms), show_void_storms),
+        max_tier = COALESCE(VALUES(max_tier), max_tier),
+        show_lith = COALESCE(VALUES(show_lith), show_lith),
+        show_meso = COALESCE(VALUES(show_meso), show_meso),
+        show_neo = COALESCE(VALUES(show_neo), show_neo),
+        show_axi = COALESCE(VALUES(show_axi), show_axi),
+        show_requiem = COALESCE(VALUES(show_requiem), show_requiem),
+        show_omnia = COALESCE(VALUES(show_omnia), show_omnia)
+    """
+
+    _FISSURE_LIST_DEFAULTS_FIELDS = ['show_normal', 'show_steel_path', 'show_void_storms', 'max_tier',
+                                     'show_lith', 'show_meso', 'show_neo', 'show_axi', 'show_requiem', 'show_omnia']
+
     _USER_EXISTS_QUERY = """
     SELECT EXISTS(SELECT 1 FROM users WHERE discord_id = %s)
     """
@@ -122,28 +148,50 @@ class MercuriusDatabase:
     WHERE user_id = %s
     """
 
+    _GET_ALL_FISSURE_SUBSCRIPTIONS_QUERY = """
+    SELECT fs.user_id, fs.fissure_type, fs.era, fs.node, fs.mission, fs.planet, fs.tileset, fs.enemy, fs.max_tier
+    FROM fissure_subscriptions fs
+    JOIN users u ON fs.user_id = u.discord_id
+    WHERE u.fissure_notification_type = %s
+    AND u.fissure_notifications_enabled = true
+    """
+
     _SAVE_FISSURE_VIEW_QUERY = """
-    INSERT INTO fissure_views (message_text, button_configs, channel_id, message_id)
-    VALUES (%s, %s, %s, %s)
+    INSERT INTO fissure_views (message_text, button_configs, channel_id, message_id, config_hash)
+    VALUES (%s, %s, %s, %s, %s)
     """
 
     _GET_ALL_FISSURE_VIEWS_QUERY = """
-    SELECT message_text, button_configs, channel_id, message_id
+    SELECT message_text, button_configs, channel_id, message_id, config_hash
     FROM fissure_views
     """
 
     _GET_FISSURE_VIEW_BY_MESSAGE_ID_QUERY = """
-    SELECT message_text, button_configs, channel_id, message_id
+    SELECT message_text, button_configs, channel_id, message_id, config_hash
     FROM fissure_views
     WHERE message_id = %s
     """
 
     _UPDATE_FISSURE_VIEW_QUERY = """
     UPDATE fissure_views
-    SET message_text = %s, button_configs = %s
+    SET message_text = %s, button_configs = %s, config_hash = %s
+    WHERE message_id = %s
+    """
+
+    _SET_FISSURE_VIEW_CONFIG_HASH_QUERY = """
+    UPDATE fissure_views
+    SET config_hash = %s
     WHERE message_id = %s
     """
 
+    # Columns added to existing tables after they were first created, as (table, column, definition).
+    # build.sql only creates missing tables, so these are added to older databases by migrate_database.
+    _COLUMN_MIGRATIONS = [
+        ('fissure_views', 'config_hash', 'CHAR(64)'),
+        ('users', 'fissure_dm_digest', 'BOOLEAN DEFAULT false'),
+        ('fissure_thread_archives', 'attempts', 'INT NOT NULL DEFAULT 0'),
+    ]
+
     _GET_FISSURE_NOTIFICATION_TYPE_QUERY = """
     SELECT fissure_notification_type 
     FROM users 
@@ -168,6 +216,71 @@ class MercuriusDatabase:
         WHERE discord_id = %s
         """
 
+    _SET_THREAD_NOTIFICATION_SERVER_QUERY = """
+    UPDATE users
+    SET thread_notification_server_id = %s
+    WHERE discord_id = %s
+    """
+
+    _GET_FISSURE_DM_DIGEST_QUERY = """
+    SELECT fissure_dm_digest
+    FROM users
+    WHERE discord_id = %s
+    """
+
+    _SET_FISSURE_DM_DIGEST_QUERY = """
+    UPDATE users
+    SET fissure_dm_digest = %s
+    WHERE discord_id = %s
+    """
+
+    _GET_THREAD_NOTIFICATION_SERVER_QUERY = """
+    SELECT thread_notification_server_id
+    FROM users
+    WHERE discord_id = %s
+    """
+
+    _GET_FISSURE_NOTIFICATION_STATUS_QUERY = """
+    SELECT online, idle, dnd, offline
+    FROM fissure_notification_status
+    WHERE user_id = %s
+    """
+
+    _GET_FISSURE_NOTIFICATION_SETTINGS_QUERY = """
+    SELECT u.discord_id, u.thread_notification_server_id, u.fissure_notifications_enabled, u.fissure_dm_digest,
+           COALESCE(s.online, true), COALESCE(s.idle, true), COALESCE(s.dnd, true), COALESCE(s.offline, true)
+    FROM users u
+    LEFT JOIN fissure_notification_status s ON s.user_id = u.discord_id
+    WHERE u.discord_id IN ({placeholders})
+    """
+
+    _ADD_FISSURE_THREAD_ARCHIVE_QUERY = """
+    INSERT INTO fissure_thread_archives (thread_id, channel_id, expiry)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE expiry = VALUES(expiry)
+    """
+
+    _GET_DUE_FISSURE_THREAD_ARCHIVES_QUERY = """
+    SELECT thread_id, channel_id, attempts
+    FROM fissure_thread_archives
+    WHERE expiry <= %s
+    ORDER BY expiry
+    LIMIT %s
+    """
+
+    _REMOVE_FISSURE_THREAD_ARCHIVES_QUERY = """
+    DELETE FROM fissure_thread_archives
+    WHERE thread_id IN ({placeholders})
+    """
+
+    # Failed archives are pushed back by moving their expiry, which after the first attempt is when the thread is
+    # next due rather than when its fissure expired
+    _RETRY_FISSURE_THREAD_ARCHIVES_QUERY = """
+    UPDATE fissure_thread_archives
+    SET attempts = attempts + 1, expiry = %s
+    WHERE thread_id IN ({placeholders})
+    """
+
     _SET_ITEM_SETTINGS_QUERY = """
     INSERT INTO item_settings (user_id, item_id, plat_notification_threshold, daily_messages, favorite)
     VALUES (%s, %s, %s, %s, %s)
@@ -207,29 +320,25 @@ class MercuriusDatabase:
     WHERE discord_id = %s
     """
 
+    # Setting the ID through LAST_INSERT_ID makes an update report the existing tag's ID as the insert ID, so
+    # store_tag gets the ID from the upsert either way.
     _STORE_TAG_QUERY = """
     INSERT INTO tags (tag_name, content, autodelete, dm)
     VALUES (%s, %s, %s, %s)
     ON DUPLICATE KEY UPDATE
+        id = LAST_INSERT_ID(id),
         content = VALUES(content),
         autodelete = VALUES(autodelete),
         dm = VALUES(dm)
     """
 
+    # server_visibility holds every (server, server whose tags it can see) pair, including each server itself and
+    # servers linked through other servers, so tag visibility is a single join on its primary key.
     _TAG_SERVER_LINK_SUBQUERY = """
-    SELECT tag_id
-    FROM tag_server_link
-    WHERE server_id IN (
-        SELECT server_id
-        FROM linked_servers
-        WHERE linked_server_id = %s
-        UNION
-        SELECT linked_server_id
-        FROM linked_servers
-        WHERE server_id = %s
-        UNION
-        SELECT %s
-    )
+    SELECT tsl.tag_id
+    FROM server_visibility sv
+    JOIN tag_server_link tsl ON tsl.server_id = sv.visible_server_id
+    WHERE sv.server_id = %s
     """
 
     _LINK_TAG_TO_SERVER_QUERY = """
@@ -237,6 +346,16 @@ class MercuriusDatabase:
     VALUES (%s, %s)
     """
 
+    _GET_TAG_IDS_BY_NAME_QUERY = """SELECT id, tag_name FROM tags WHERE tag_name IN ({placeholders})"""
+
+    # Re-importing tags that are already linked to a server isn't an error
+    _BULK_LINK_TAG_TO_SERVER_QUERY = """
+    INSERT IGNORE INTO tag_server_link (tag_id, server_id)
+    VALUES (%s, %s)
+    """
+
+    DEFAULT_TAG_IMPORT_CHUNK_SIZE = 1000
+
     _LINK_SERVERS_QUERY = """
     INSERT INTO linked_servers (server_id, linked_server_id)
     SELECT %s, %s
@@ -247,6 +366,36 @@ class MercuriusDatabase:
     )
     """
 
+    _GET_SERVER_TAGS_QUERY = """
+    SELECT DISTINCT t.id, t.tag_name, t.content, t.autodelete, t.dm
+    FROM server_visibility sv
+    JOIN tag_server_link tsl ON tsl.server_id = sv.visible_server_id
+    JOIN tags t ON t.id = tsl.tag_id
+    WHERE sv.server_id = %s
+    """
+
+    _GET_VISIBLE_SERVERS_QUERY = """SELECT visible_server_id FROM server_visibility WHERE server_id = %s"""
+
+    _INSERT_SERVER_VISIBILITY_QUERY = """
+    INSERT IGNORE INTO server_visibility (server_id, visible_server_id)
+    VALUES (%s, %s)
+    """
+
+    # Merges the closures of two servers being linked: every server that can see one of them can now see every
+    # server visible from the other, in both directions. Relies on both servers having their own row.
+    _LINK_SERVER_VISIBILITY_QUERY = """
+    INSERT IGNORE INTO server_visibility (server_id, visible_server_id)
+    SELECT a.server_id, b.server_id
+    FROM server_visibility a
+    JOIN server_visibility b ON b.visible_server_id = %s
+    WHERE a.visible_server_id = %s
+    UNION
+    SELECT b.server_id, a.server_id
+    FROM server_visibility a
+    JOIN server_visibility b ON b.visible_server_id = %s
+    WHERE a.visible_server_id = %s
+    """
+
     _ADD_MERCOINS_QUERY = """
     INSERT INTO mercoins (user_id, amount)
     VALUES (%s, %s)
@@ -263,6 +412,10 @@ class MercuriusDatabase:
     SELECT amount FROM mercoins WHERE user_id = %s
     """
 
+    _GET_MERCOIN_BALANCES_QUERY = """
+    SELECT user_id, amount FROM mercoins WHERE user_id IN ({placeholders})
+    """
+
     _ENSURE_USERS_SQL = """
     CREATE TABLE IF NOT EXISTS users (
         discord_id BIGINT PRIMARY KEY NOT NULL,
@@ -271,7 +424,8 @@ class MercuriusDatabase:
         fissure_notification_type ENUM('DM', 'Thread') DEFAULT 'DM',
         thread_notification_server_id BIGINT,
         fissure_notifications_enabled BOOLEAN DEFAULT true,
-        mute_market_notifications BOOLEAN DEFAULT true
+        mute_market_notifications BOOLEAN DEFAULT true,
+        fissure_dm_digest BOOLEAN DEFAULT false
     )
     """
 
@@ -284,12 +438,20 @@ class MercuriusDatabase:
     )
     """
 
-    def __init__(self, user: str, password: str, host: str, database: str) -> None:
+    def __init__(self, user: str, password: str, host: str, database: str,
+                 settings_cache: Optional[SettingsCache] = None, tag_resolver: Optional[TagResolver] = None) -> None:
+        self.settings_cache = settings_cache if settings_cache is not None else SettingsCache()
+        self.tag_resolver = tag_resolver if tag_resolver is not None else TagResolver()
+        self._transaction_depth = 0
+
+        # Autocommit so reads see rows written through the async pool rather than a snapshot taken at the first read
+        # of an open implicit transaction; transaction() starts an explicit one where statements must be grouped.
         try:
             self.connection: Connection = pymysql.connect(user=user,
                                                           password=password,
                                                           host=host,
-                                                          database=database)
+                                                          database=database,
+                                                          autocommit=True)
         except OperationalError:
             with pymysql.connect(user=user,
                                  password=password,
@@ -299,7 +461,8 @@ class MercuriusDatabase:
             self.connection = pymysql.connect(user=user,
                                               password=password,
                                               host=host,
-                                              database=database)
+                                              database=database,
+                                              autocommit=True)
 
         # Auto-initialize core schema if needed (idempotent)
         self.maybe_initialize_schema()
@@ -311,21 +474,135 @@ class MercuriusDatabase:
             if sql_stmt.strip():
                 self._execute_query(sql_stmt)
 
+        self.migrate_database()
+
+    def migrate_database(self) -> None:
+        for table_name, column_name, definition in self._COLUMN_MIGRATIONS:
+            if not self._column_exists(table_name, column_name):
+                self._execute_query(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}", commit=True)
+
+        # server_visibility is derived from servers and linked_servers, so fill it in if it was just created
+        if self._execute_query("SELECT 1 FROM server_visibility LIMIT 1", fetch='one') is None:
+            self.rebuild_server_visibility()
+
+    @staticmethod
+    def _build_server_visibility(servers: List[int], links: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Compute the server_visibility rows for a set of servers and links between them.
+
+        Links work in both directions and chain, so each group of servers connected through links can see each
+        other's tags.
+
+        Args:
+            servers: The IDs of every server.
+            links: The (server_id, linked_server_id) rows of linked_servers.
+
+        Returns:
+            A (server_id, visible_server_id) row for every pair of servers in the same group, including each
+            server paired with itself.
+        """
+        parents = {server_id: server_id for server_id in servers}
+
+        def find(server_id: int) -> int:
+            parents.setdefault(server_id, server_id)
+            while parents[server_id] != server_id:
+                parents[server_id] = parents[parents[server_id]]
+                server_id = parents[server_id]
+            return server_id
+
+        for server_id, linked_server_id in links:
+            parents[find(server_id)] = find(linked_server_id)
+
+        groups = defaultdict(list)
+        for server_id in list(parents):
+            groups[find(server_id)].append(server_id)
+
+        return [(server_id, visible_server_id)
+                for group in groups.values()
+                for server_id in group
+                for visible_server_id in group]
+
+    def rebuild_server_visibility(self) -> None:
+        """Recompute server_visibility from servers and linked_servers."""
+        servers = [row[0] for row in self._execute_query("SELECT server_id FROM servers", fetch='all')]
+        links = self._execute_query("SELECT server_id, linked_server_id FROM linked_servers", fetch='all')
+
+        self._execute_query("DELETE FROM server_visibility", commit=True)
+        rows = self._build_server_visibility(servers, links)
+        if rows:
+            self._execute_query(self._INSERT_SERVER_VISIBILITY_QUERY, rows, many=True, commit=True)
+        self.tag_resolver.clear()
+
     def _execute_query(self, query: str, *params, fetch: str = 'all',
-                       commit: bool = False, many: bool = False) -> Union[Tuple, List[Tuple], None]:
-        self.connection.ping(reconnect=True)
+                       commit: bool = False, many: bool = False) -> Union[Tuple, List[Tuple], int, None]:
+        # Reconnecting in the middle of a transaction would silently drop its earlier statements
+        if not self._transaction_depth:
+            self.connection.ping(reconnect=True)
         with self.connection.cursor() as cur:
             if many:
                 cur.executemany(query, params[0])
             else:
                 cur.execute(query, params)
-            if commit:
+            if commit and not self._transaction_depth:
                 self.connection.commit()
+            if fetch == 'lastrowid':
+                return cur.lastrowid
             if fetch == 'one':
                 return cur.fetchone()
             elif fetch == 'all':
                 return cur.fetchall()
 
+    def _get_user_setting(self, user_id: int, setting: str, query: str, default: Any) -> Any:
+        """
+        Read a single-column user setting through the settings cache.
+
+        Args:
+            user_id: The Discord ID of the user.
+            setting: The cache name of the setting.
+            query: The query selecting the setting's column for a user.
+            default: The value to use when the user has no row.
+
+        Returns:
+            The cached or freshly queried value.
+        """
+        value = self.settings_cache.get(user_id, setting)
+        if value is SettingsCache.MISSING:
+            result = self._execute_query(query, user_id, fetch='one')
+            value = result[0] if result else default
+            self.settings_cache.set(user_id, setting, value)
+        return value
+
+    @contextmanager
+    def transaction(self) -> Iterator['MercuriusDatabase']:
+        """
+        Run several statements as one unit of work: the per-statement commits of the methods called inside are
+        skipped, and everything is committed once when the block exits, or rolled back if it raises.
+
+        Transactions nest; only the outermost one commits. The block must not await anything, since every caller
+        shares this connection.
+
+        Example:
+            with database.transaction():
+                balances = database.get_mercoin_balances([a, b], lock=True)
+                database.transfer_mercoins(a, b, 1)
+        """
+        if not self._transaction_depth:
+            self.connection.ping(reconnect=True)
+            self.connection.begin()
+
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                self.connection.rollback()
+            raise
+
+        self._transaction_depth -= 1
+        if not self._transaction_depth:
+            self.connection.commit()
+
     def _table_exists(self, table_name: str) -> bool:
         q = """
         SELECT 1
@@ -334,6 +611,14 @@ class MercuriusDatabase:
         """
         return self._execute_query(q, table_name, fetch='one') is not None
 
+    def _column_exists(self, table_name: str, column_name: str) -> bool:
+        q = """
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """
+        return self._execute_query(q, table_name, column_name, fetch='one') is not None
+
     def ensure_mercoin_schema(self) -> None:
         """Create users + mercoins tables if missing; safe to call repeatedly."""
         self._execute_query(self._ENSURE_USERS_SQL, commit=True)
@@ -357,20 +642,22 @@ class MercuriusDatabase:
 
     def insert_servers(self, servers: List[int]) -> None:
         self._execute_query(self._INSERT_SERVER_QUERY, servers, many=True, commit=True)
+        self._execute_query(self._INSERT_SERVER_VISIBILITY_QUERY, [(server_id, server_id) for server_id in servers],
+                            many=True, commit=True)
 
     def set_platform(self, user: str, platform: str) -> None:
         self._execute_query(self._SET_PLATFORM_QUERY, user, platform, commit=True)
+        self.settings_cache.set(user, 'platform', platform)
 
     def get_platform(self, user: str) -> str:
-        platform = self._execute_query(self._GET_PLATFORM_QUERY, user, fetch='one')
-        return platform[0] if platform else 'pc'
+        return self._get_user_setting(user, 'platform', self._GET_PLATFORM_QUERY, 'pc')
 
     def set_graph_style(self, user: str, style: str) -> None:
         self._execute_query(self._SET_GRAPH_STYLE_QUERY, user, style, commit=True)
+        self.settings_cache.set(user, 'graph_style', style)
 
     def get_graph_style(self, user: str) -> str:
-        style = self._execute_query(self._GET_GRAPH_STYLE_QUERY, user, fetch='one')
-        return style[0] if style else 'ggplot'
+        return self._get_user_setting(user, 'graph_style', self._GET_GRAPH_STYLE_QUERY, 'ggplot')
 
     def set_fissure_log_channel(self, server_id: int, channel_id: int, fissure_type: str) -> None:
         self._execute_query(self._SET_FISSURE_LOG_CHANNEL_QUERY, server_id, channel_id, fissure_type, commit=True)
@@ -424,27 +711,8 @@ class MercuriusDatabase:
         return fissure_list_dict
 
     def set_fissure_list_defaults(self, user_id: int, **kwargs) -> None:
-        query = """
-        INSERT INTO fissure_list_defaults (user_id, show_normal, show_steel_path, show_void_storms, max_tier, 
-                                           show_lith, show_meso, show_neo, show_axi, show_requiem, show_omnia)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE 
-            show_normal = COALESCE(VALUES(show_normal), show_normal),
-            show_steel_path = COALESCE(VALUES(show_steel_path), show_steel_path),
-            show_void_storms = COALESCE(VALUES(show_void_storms), show_void_storms),
-            max_tier = COALESCE(VALUES(max_tier), max_tier),
-            show_lith = COALESCE(VALUES(show_lith), show_lith),
-            show_meso = COALESCE(VALUES(show_meso), show_meso),
-            show_neo = COALESCE(VALUES(show_neo), show_neo),
-            show_axi = COALESCE(VALUES(show_axi), show_axi),
-            show_requiem = COALESCE(VALUES(show_requiem), show_requiem),
-            show_omnia = COALESCE(VALUES(show_omnia), show_omnia)
-        """
-        params = [user_id] + [kwargs.get(field, None) for field in [
-            'show_normal', 'show_steel_path', 'show_void_storms', 'max_tier',
-            'show_lith', 'show_meso', 'show_neo', 'show_axi', 'show_requiem', 'show_omnia'
-        ]]
-        self._execute_query(query, *params, commit=True)
+        params = [user_id] + [kwargs.get(field, None) for field in self._FISSURE_LIST_DEFAULTS_FIELDS]
+        self._execute_query(self._UPSERT_FISSURE_LIST_DEFAULTS_QUERY, *params, commit=True)
 
     def update_fissure_list_defaults(self, user_id: int, **kwargs) -> None:
         update_fields = [f"{field} = %s" for field in kwargs]
@@ -535,14 +803,7 @@ class MercuriusDatabase:
         ]
 
     def get_all_fissure_subscriptions(self, notification_type: str = 'DM') -> List[Dict[str, Union[str, int]]]:
-        query = """
-        SELECT fs.user_id, fs.fissure_type, fs.era, fs.node, fs.mission, fs.planet, fs.tileset, fs.enemy, fs.max_tier
-        FROM fissure_subscriptions fs
-        JOIN users u ON fs.user_id = u.discord_id
-        WHERE u.fissure_notification_type = %s
-        AND u.fissure_notifications_enabled = true
-        """
-        subscriptions = self._execute_query(query, notification_type, fetch='all')
+        subscriptions = self._execute_query(self._GET_ALL_FISSURE_SUBSCRIPTIONS_QUERY, notification_type, fetch='all')
         return [
             {
                 "user_id": row[0],
@@ -565,8 +826,10 @@ class MercuriusDatabase:
     def create_user(self, user_id: int) -> None:
         self._execute_query(self._CREATE_USER_QUERY, user_id, commit=True)
 
-    def save_fissure_view(self, message_text: str, button_configs: List[dict], channel_id: int, message_id: int) -> None:
-        self._execute_query(self._SAVE_FISSURE_VIEW_QUERY, message_text, json.dumps(button_configs), channel_id, message_id, commit=True)
+    def save_fissure_view(self, message_text: str, button_configs: List[dict], channel_id: int, message_id: int,
+                          config_hash: str = None) -> None:
+        self._execute_query(self._SAVE_FISSURE_VIEW_QUERY, message_text, json.dumps(button_configs), channel_id,
+                            message_id, config_hash, commit=True)
 
     def get_all_fissure_views(self) -> List[dict]:
         results = self._execute_query(self._GET_ALL_FISSURE_VIEWS_QUERY, fetch='all')
@@ -575,7 +838,8 @@ class MercuriusDatabase:
                 "message_text": row[0],
                 "button_configs": json.loads(row[1]),
                 "channel_id": row[2],
-                "message_id": row[3]
+                "message_id": row[3],
+                "config_hash": row[4]
             }
             for row in results
         ]
@@ -587,55 +851,54 @@ class MercuriusDatabase:
                 "message_text": result[0],
                 "button_configs": json.loads(result[1]),
                 "channel_id": result[2],
-                "message_id": result[3]
+                "message_id": result[3],
+                "config_hash": result[4]
             }
         return None
 
-    def update_fissure_view(self, message_text: str, button_configs: List[dict], message_id: int) -> None:
-        self._execute_query(self._UPDATE_FISSURE_VIEW_QUERY, message_text, json.dumps(button_configs), message_id,
-                            commit=True)
+    def update_fissure_view(self, message_text: str, button_configs: List[dict], message_id: int,
+                            config_hash: str = None) -> None:
+        self._execute_query(self._UPDATE_FISSURE_VIEW_QUERY, message_text, json.dumps(button_configs), config_hash,
+                            message_id, commit=True)
+
+    def set_fissure_view_config_hash(self, message_id: int, config_hash: str) -> None:
+        self._execute_query(self._SET_FISSURE_VIEW_CONFIG_HASH_QUERY, config_hash, message_id, commit=True)
 
     def delete_all_fissure_views(self) -> None:
         self._execute_query("DELETE FROM fissure_views", commit=True)
 
+    # The UPDATE-only setters below don't create a users row, so they invalidate the cached value instead of
+    # storing the new one, which would be wrong for users without a row.
     def get_fissure_notification_type(self, user_id: int) -> str:
-        result = self._execute_query(self._GET_FISSURE_NOTIFICATION_TYPE_QUERY, user_id, fetch='one')
-        return result[0] if result else 'DM'
+        return self._get_user_setting(user_id, 'notification_type', self._GET_FISSURE_NOTIFICATION_TYPE_QUERY, 'DM')
 
     def set_fissure_notification_type(self, user_id: int, notification_type: str) -> None:
         self._execute_query(self._SET_FISSURE_NOTIFICATION_TYPE_QUERY, notification_type, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'notification_type')
 
     def set_thread_notification_server(self, user_id: int, server_id: int) -> None:
-        query = """
-        UPDATE users
-        SET thread_notification_server_id = %s
-        WHERE discord_id = %s
-        """
-        self._execute_query(query, server_id, user_id, commit=True)
+        self._execute_query(self._SET_THREAD_NOTIFICATION_SERVER_QUERY, server_id, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'thread_server_id')
 
     def get_thread_notification_server(self, user_id: int) -> int:
-        query = """
-        SELECT thread_notification_server_id
-        FROM users
-        WHERE discord_id = %s
-        """
-        result = self._execute_query(query, user_id, fetch='one')
-        return result[0] if result else None
+        return self._get_user_setting(user_id, 'thread_server_id', self._GET_THREAD_NOTIFICATION_SERVER_QUERY, None)
 
     def get_fissure_notifications_enabled(self, user_id: int) -> bool:
-        result = self._execute_query(self._GET_FISSURE_NOTIFICATIONS_ENABLED_QUERY, user_id, fetch='one')
-        return result[0] if result else True
+        return self._get_user_setting(user_id, 'enabled', self._GET_FISSURE_NOTIFICATIONS_ENABLED_QUERY, True)
 
     def set_fissure_notifications_enabled(self, user_id: int, enabled: bool) -> None:
         self._execute_query(self._SET_FISSURE_NOTIFICATIONS_ENABLED_QUERY, enabled, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'enabled')
 
-    def get_fissure_notification_status(self, user_id: int) -> dict:
-        query = """
-        SELECT online, idle, dnd, offline
-        FROM fissure_notification_status
-        WHERE user_id = %s
-        """
-        result = self._execute_query(query, user_id, fetch='one')
+    def get_fissure_dm_digest(self, user_id: int) -> bool:
+        return bool(self._get_user_setting(user_id, 'digest', self._GET_FISSURE_DM_DIGEST_QUERY, False))
+
+    def set_fissure_dm_digest(self, user_id: int, enabled: bool) -> None:
+        self._execute_query(self._SET_FISSURE_DM_DIGEST_QUERY, enabled, user_id, commit=True)
+        self.settings_cache.invalidate(user_id, 'digest')
+
+    @staticmethod
+    def _build_fissure_notification_status(result: Optional[Tuple]) -> dict:
         if result:
             return {
                 'online': result[0],
@@ -651,6 +914,81 @@ class MercuriusDatabase:
                 'offline': True
             }
 
+    def get_fissure_notification_status(self, user_id: int) -> dict:
+        status = self.settings_cache.get(user_id, 'status')
+        if status is SettingsCache.MISSING:
+            result = self._execute_query(self._GET_FISSURE_NOTIFICATION_STATUS_QUERY, user_id, fetch='one')
+            status = self._build_fissure_notification_status(result)
+            self.settings_cache.set(user_id, 'status', status)
+
+        # Callers are free to modify the dict they get back
+        return dict(status)
+
+    def _update_cached_fissure_notification_status(self, user_id: int, status: str, enabled: bool) -> None:
+        cached_status = self.settings_cache.get(user_id, 'status')
+        if cached_status is SettingsCache.MISSING:
+            return
+
+        self.settings_cache.set(user_id, 'status', {**cached_status, status: enabled})
+
+    @staticmethod
+    def _build_fissure_notification_settings(user_ids: List[int], rows: List[Tuple]) -> Dict[int, Dict[str, Any]]:
+        settings = {
+            user_id: {
+                'thread_server_id': None,
+                'enabled': True,
+                'digest': False,
+                'status': {'online': True, 'idle': True, 'dnd': True, 'offline': True}
+            }
+            for user_id in user_ids
+        }
+        for user_id, thread_server_id, enabled, digest, online, idle, dnd, offline in rows:
+            settings[user_id] = {
+                'thread_server_id': thread_server_id,
+                'enabled': bool(enabled) if enabled is not None else True,
+                'digest': bool(digest),
+                'status': {'online': bool(online), 'idle': bool(idle), 'dnd': bool(dnd), 'offline': bool(offline)}
+            }
+        return settings
+
+    def get_fissure_notification_settings(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Fetch the thread server, notifications enabled flag, DM digest flag and status toggles for many users in one
+        query.
+
+        Users without a row in the users table get the same defaults as the single-user getters.
+        """
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return {}
+
+        query = self._GET_FISSURE_NOTIFICATION_SETTINGS_QUERY.format(placeholders=', '.join(['%s'] * len(user_ids)))
+        results = self._execute_query(query, *user_ids, fetch='all')
+        return self._build_fissure_notification_settings(user_ids, results)
+
+    def add_fissure_thread_archive(self, thread_id: int, channel_id: int, expiry: datetime) -> None:
+        self._execute_query(self._ADD_FISSURE_THREAD_ARCHIVE_QUERY, thread_id, channel_id, expiry, commit=True)
+
+    def get_due_fissure_thread_archives(self, before: datetime, limit: int = 100) -> List[Dict[str, int]]:
+        """Get up to `limit` fissure threads due to be archived by `before`, soonest expiry first."""
+        results = self._execute_query(self._GET_DUE_FISSURE_THREAD_ARCHIVES_QUERY, before, limit, fetch='all')
+        return [{'thread_id': row[0], 'channel_id': row[1], 'attempts': row[2]} for row in results]
+
+    def remove_fissure_thread_archives(self, thread_ids: List[int]) -> None:
+        if not thread_ids:
+            return
+
+        query = self._REMOVE_FISSURE_THREAD_ARCHIVES_QUERY.format(placeholders=', '.join(['%s'] * len(thread_ids)))
+        self._execute_query(query, *thread_ids, commit=True)
+
+    def retry_fissure_thread_archives(self, thread_ids: List[int], retry_at: datetime) -> None:
+        """Count a failed attempt at archiving fissure threads and make them due again at `retry_at`."""
+        if not thread_ids:
+            return
+
+        query = self._RETRY_FISSURE_THREAD_ARCHIVES_QUERY.format(placeholders=', '.join(['%s'] * len(thread_ids)))
+        self._execute_query(query, retry_at, *thread_ids, commit=True)
+
     def set_fissure_notification_status(self, user_id: int, status: str, enabled: bool) -> None:
         query = f"""
         INSERT INTO fissure_notification_status (user_id, {status})
@@ -658,6 +996,7 @@ class MercuriusDatabase:
         ON DUPLICATE KEY UPDATE {status} = VALUES({status})
         """
         self._execute_query(query, user_id, enabled, commit=True)
+        self._update_cached_fissure_notification_status(user_id, status, enabled)
 
     def set_item_settings(self, user_id: int, item_id: str, plat_notification_threshold: int = None,
                           daily_messages: bool = False, favorite: bool = True) -> None:
@@ -700,17 +1039,48 @@ class MercuriusDatabase:
         return result[0] if result else True
 
     def store_tag(self, tag_name: str, content: str, autodelete: bool, dm: bool, server_id: int) -> None:
-        self._execute_query(self._STORE_TAG_QUERY, tag_name, content, autodelete, dm, commit=True)
-        tag_id = self._execute_query(f"SELECT id FROM tags WHERE tag_name = %s", (tag_name,), fetch='one')[0]
+        tag_id = self._execute_query(self._STORE_TAG_QUERY, tag_name, content, autodelete, dm, fetch='lastrowid',
+                                     commit=True)
+        # The upsert may have changed an existing tag that other servers can see
+        self.tag_resolver.invalidate_tag(tag_name=tag_name)
         self.link_tag_to_server(tag_id, server_id)
 
+    @staticmethod
+    def _build_server_tags(rows: List[Tuple]) -> List[Dict[str, Any]]:
+        return [
+            {"id": row[0], "tag_name": row[1], "content": row[2], "autodelete": row[3], "dm": row[4]}
+            for row in rows
+        ]
+
+    def get_visible_servers(self, server_id: int) -> List[int]:
+        """Get the servers whose tags are visible in a server, including the server itself."""
+        results = self._execute_query(self._GET_VISIBLE_SERVERS_QUERY, server_id, fetch='all')
+        return [row[0] for row in results]
+
+    def get_visible_tags(self, server_id: int) -> ServerTags:
+        """
+        Get the tags visible in a server through the tag resolver, loading them if the server isn't resolved yet.
+
+        Args:
+            server_id: The ID of the server.
+
+        Returns:
+            The visible tags keyed by lowercased tag name. The dict is shared with the resolver and must not be
+            modified.
+        """
+        tags = self.tag_resolver.get_tags(server_id)
+        if tags is None:
+            generation = self.tag_resolver.generation
+            visible_servers = self.get_visible_servers(server_id)
+            results = self._execute_query(self._GET_SERVER_TAGS_QUERY, server_id, fetch='all')
+            tags = self.tag_resolver.set_tags(server_id, visible_servers, self._build_server_tags(results),
+                                              generation)
+        return tags
+
     def retrieve_tag(self, tag_name: str, server_id: int) -> Optional[Dict[str, Any]]:
-        tag_id = self.get_tag_id(tag_name, server_id)
-        if tag_id:
-            query = f"SELECT content, autodelete, dm FROM tags WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
-            result = self._execute_query(query, tag_id, server_id, server_id, server_id, fetch='one')
-            if result:
-                return {"content": result[0], "autodelete": result[1], "dm": result[2]}
+        tag = self.get_visible_tags(server_id).get(tag_name.lower())
+        if tag:
+            return {"content": tag["content"], "autodelete": tag["autodelete"], "dm": tag["dm"]}
         return None
 
     def delete_tag(self, tag_id: int, server_id: int) -> None:
@@ -718,60 +1088,161 @@ class MercuriusDatabase:
         self._execute_query(tag_server_link_query, tag_id, server_id, commit=True)
         try:
             query = f"DELETE FROM tags WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
-            self._execute_query(query, tag_id, server_id, server_id, server_id, commit=True)
+            self._execute_query(query, tag_id, server_id, commit=True)
         except pymysql.err.IntegrityError:
             pass
+        finally:
+            self.tag_resolver.invalidate_tag(tag_id=tag_id)
 
     def update_autodelete(self, tag_id: int, autodelete: bool, server_id: int) -> None:
         query = f"UPDATE tags SET autodelete = %s WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
-        self._execute_query(query, autodelete, tag_id, server_id, server_id, server_id, commit=True)
+        self._execute_query(query, autodelete, tag_id, server_id, commit=True)
+        self.tag_resolver.invalidate_tag(tag_id=tag_id)
 
     def update_dm(self, tag_id: int, dm: bool, server_id: int) -> None:
         query = f"UPDATE tags SET dm = %s WHERE id = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
-        self._execute_query(query, dm, tag_id, server_id, server_id, server_id, commit=True)
+        self._execute_query(query, dm, tag_id, server_id, commit=True)
+        self.tag_resolver.invalidate_tag(tag_id=tag_id)
 
     def link_tag_to_server(self, tag_id: int, server_id: int) -> None:
         self._execute_query(self._LINK_TAG_TO_SERVER_QUERY, tag_id, server_id, commit=True)
+        self.tag_resolver.invalidate_servers(server_id)
 
     def link_servers(self, server_id: int, linked_server_id: int) -> None:
-        self._execute_query(self._LINK_SERVERS_QUERY, server_id, linked_server_id,
-                            server_id, linked_server_id, linked_server_id, server_id, commit=True)
+        # The link and its visibility rows go in together, so server_visibility never disagrees with server_links
+        with self.transaction():
+            self._execute_query(self._LINK_SERVERS_QUERY, server_id, linked_server_id,
+                                server_id, linked_server_id, linked_server_id, server_id, commit=True)
+            self._execute_query(self._INSERT_SERVER_VISIBILITY_QUERY,
+                                [(server_id, server_id), (linked_server_id, linked_server_id)], many=True, commit=True)
+            self._execute_query(self._LINK_SERVER_VISIBILITY_QUERY, linked_server_id, server_id,
+                                linked_server_id, server_id, commit=True)
+        self.tag_resolver.invalidate_servers(server_id, linked_server_id)
+
+    @staticmethod
+    def _new_tag_import_stats() -> Dict[str, Any]:
+        return {'tags': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'duplicates': 0, 'unmatched': 0, 'links': 0,
+                'seconds': 0.0, 'rows_per_second': 0.0}
+
+    @staticmethod
+    def _chunk_tag_import(tags: Union[Dict[str, Dict[str, Any]], Iterable[Tuple[str, Dict[str, Any]]]],
+                          chunk_size: int, stats: Dict[str, Any]) -> Iterator[List[Tuple]]:
+        """
+        Split tags being imported into chunks of tags table rows.
+
+        Tag names are compared case-insensitively like MySQL does, and only the first of several tags sharing a name
+        is imported; the rest are counted as duplicates.
+        """
+        items = tags.items() if isinstance(tags, dict) else tags
+        seen: Set[str] = set()
+        chunk = []
+        for tag_name, tag_info in items:
+            if tag_name.lower() in seen:
+                stats['duplicates'] += 1
+                continue
+
+            seen.add(tag_name.lower())
+            chunk.append((tag_name, tag_info["content"], tag_info.get("autodelete", False), tag_info.get("dm", False)))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _get_tag_rows_to_write(chunk: List[Tuple], existing_rows: List[Tuple], overwrite: bool,
+                               stats: Dict[str, Any]) -> List[Tuple]:
+        existing = {tag_name.lower() for _, tag_name in existing_rows}
+        stats['tags'] += len(chunk)
+        stats['created'] += sum(1 for row in chunk if row[0].lower() not in existing)
+
+        if overwrite:
+            stats['updated'] += sum(1 for row in chunk if row[0].lower() in existing)
+            return chunk
+
+        stats['skipped'] += sum(1 for row in chunk if row[0].lower() in existing)
+        return [row for row in chunk if row[0].lower() not in existing]
+
+    @staticmethod
+    def _get_tag_link_rows(chunk: List[Tuple], id_rows: List[Tuple], server_ids: List[int],
+                           stats: Dict[str, Any]) -> List[Tuple[int, int]]:
+        tag_ids = {tag_name.lower(): tag_id for tag_id, tag_name in id_rows}
+
+        link_rows = []
+        for row in chunk:
+            tag_id = tag_ids.get(row[0].lower())
+            if tag_id is None:
+                # Collation-equal to a stored name without being equal once lowercased, e.g. differing in accents
+                stats['unmatched'] += 1
+                continue
+
+            link_rows.extend((tag_id, server_id) for server_id in server_ids)
+
+        stats['links'] += len(link_rows)
+        return link_rows
+
+    @staticmethod
+    def _finish_tag_import_stats(stats: Dict[str, Any], start: float) -> Dict[str, Any]:
+        stats['seconds'] = time.perf_counter() - start
+        if stats['seconds']:
+            stats['rows_per_second'] = (stats['created'] + stats['updated'] + stats['links']) / stats['seconds']
+        return stats
+
+    def bulk_insert_tags(self, tags: Union[Dict[str, Dict[str, Any]], Iterable[Tuple[str, Dict[str, Any]]]],
+                         server_ids: List[int], overwrite: bool = True,
+                         chunk_size: int = DEFAULT_TAG_IMPORT_CHUNK_SIZE) -> Dict[str, Any]:
+        """
+        Import tags and link them to servers in a single transaction.
+
+        Each chunk of tags costs a fixed number of queries: one to find which names already exist, one batched
+        upsert, one to read back the IDs of every name in the chunk and one batched insert of the links.
+
+        Args:
+            tags: A dict of tag name to {"content", "autodelete", "dm"} as in tag_data.json, or an iterable of
+                (name, info) pairs such as tag_import_utils.iter_tag_data, which is consumed one chunk at a time.
+            server_ids: The servers to link every imported tag to.
+            overwrite: Whether tags that already exist get the imported content and settings. Either way they are
+                linked to the servers.
+            chunk_size: The number of tags to send per query.
+
+        Returns:
+            Counts of tags created, updated, skipped because they exist, duplicated within the import, and links
+            made, along with the time taken and rows written per second.
+        """
+        stats = self._new_tag_import_stats()
+        start = time.perf_counter()
 
-    def bulk_insert_tags(self, tags: Dict[str, Dict[str, Any]], server_ids: List[int]) -> None:
-        tag_data = [(tag_name, tag_info["content"], tag_info["autodelete"], tag_info["dm"]) for tag_name, tag_info in tags.items()]
-        self._execute_query(self._STORE_TAG_QUERY, tag_data, many=True, commit=True)
-        tag_ids = [self._execute_query(f"SELECT id FROM tags WHERE tag_name = %s", (tag_name,), fetch='one')[0] for tag_name in tags.keys()]
-        for server_id in server_ids:
-            link_data = [(tag_id, server_id) for tag_id in tag_ids]
-            self._execute_query(self._LINK_TAG_TO_SERVER_QUERY, link_data, many=True, commit=True)
+        try:
+            with self.transaction():
+                for chunk in self._chunk_tag_import(tags, chunk_size, stats):
+                    query = self._GET_TAG_IDS_BY_NAME_QUERY.format(placeholders=', '.join(['%s'] * len(chunk)))
+                    names = [row[0] for row in chunk]
+
+                    existing_rows = self._execute_query(query, *names, fetch='all')
+                    rows = self._get_tag_rows_to_write(chunk, existing_rows, overwrite, stats)
+                    if rows:
+                        self._execute_query(self._STORE_TAG_QUERY, rows, many=True, commit=True)
+
+                    id_rows = self._execute_query(query, *names, fetch='all')
+                    link_rows = self._get_tag_link_rows(chunk, id_rows, server_ids, stats)
+                    if link_rows:
+                        self._execute_query(self._BULK_LINK_TAG_TO_SERVER_QUERY, link_rows, many=True, commit=True)
+        finally:
+            self.tag_resolver.clear()
+
+        return self._finish_tag_import_stats(stats, start)
 
     def get_tag_id(self, tag_name: str, server_id: int) -> Optional[int]:
-        query = f"SELECT id FROM tags WHERE tag_name = %s AND id IN ({self._TAG_SERVER_LINK_SUBQUERY})"
-        result = self._execute_query(query, tag_name, server_id, server_id, server_id, fetch='one')
-        return result[0] if result else None
+        tag = self.get_visible_tags(server_id).get(tag_name.lower())
+        return tag["id"] if tag else None
 
     def get_server_tags(self, server_id: int) -> List[Dict[str, Any]]:
-        query = f"""
-        SELECT t.id, t.tag_name, t.content, t.autodelete, t.dm
-        FROM tags t
-        JOIN tag_server_link tsl ON t.id = tsl.tag_id
-        WHERE tsl.server_id IN (
-            SELECT server_id
-            FROM linked_servers
-            WHERE linked_server_id = %s
-            UNION
-            SELECT linked_server_id
-            FROM linked_servers
-            WHERE server_id = %s
-            UNION
-            SELECT %s
-        )
-        """
-        results = self._execute_query(query, server_id, server_id, server_id, fetch='all')
-        return [
-            {"id": row[0], "tag_name": row[1], "content": row[2], "autodelete": row[3], "dm": row[4]}
-            for row in results
-        ]
+        return [dict(tag) for tag in self.get_visible_tags(server_id).values()]
+
+    def find_tag_names(self, server_id: int, text: str, limit: int = 25) -> List[str]:
+        """Find the names of tags visible in a server for autocomplete, see ServerTags.find_names."""
+        return self.get_visible_tags(server_id).find_names(text, limit)
 
     def add_mercoins(self, user_id: int, amount: int = 1) -> None:
         """Atomically add (increment) mercoins for a user; creates the row if needed."""
@@ -795,3 +1266,67 @@ class MercuriusDatabase:
     def get_mercoins(self, user_id: int) -> int:
         result = self._execute_query(self._GET_MERCOINS_QUERY, user_id, fetch='one')
         return result[0] if result else 0
+
+    def get_mercoin_balances(self, user_ids: List[int], lock: bool = False) -> Dict[int, int]:
+        """
+        Get the mercoin balances of several users in one query.
+
+        Args:
+            user_ids: The Discord IDs of the users.
+            lock: Whether to lock the users' rows until the surrounding transaction ends, so the balances can't
+                change between reading and updating them.
+
+        Returns:
+            A dict of user ID to balance, 0 for users without a row.
+        """
+        query = self._GET_MERCOIN_BALANCES_QUERY.format(placeholders=', '.join(['%s'] * len(user_ids)))
+        if lock:
+            query += " FOR UPDATE"
+
+        balances = {user_id: 0 for user_id in user_ids}
+        balances.update(self._execute_query(query, *user_ids, fetch='all'))
+        return balances
+
+    @staticmethod
+    def _check_mercoin_transfer(from_user_id: int, to_user_id: int, amount: int) -> None:
+        if from_user_id == to_user_id:
+            raise ValueError("Cannot transfer mercoins from a user to themselves.")
+        if amount is None or amount < 1:
+            raise ValueError("Mercoin transfers must be of at least 1 mercoin.")
+
+    def transfer_mercoins(self, from_user_id: int, to_user_id: int, amount: int = 1,
+                          balances: Optional[Dict[int, int]] = None) -> Optional[Tuple[int, int]]:
+        """
+        Atomically move mercoins from one user to another.
+
+        Runs as a single transaction of three statements, creating both users if needed, locking and reading both
+        balances, then applying both changes in one batched upsert.
+
+        Args:
+            from_user_id: The Discord ID of the user losing mercoins.
+            to_user_id: The Discord ID of the user receiving them.
+            amount: The number of mercoins to move.
+            balances: Both users' balances, if the caller already read them with get_mercoin_balances(lock=True)
+                in the transaction it has open. Only the upsert is run then, so both users must already exist.
+
+        Returns:
+            The new balances of the sender and receiver, or None if the sender doesn't have enough mercoins, in
+            which case nothing is moved.
+        """
+        self._check_mercoin_transfer(from_user_id, to_user_id, amount)
+
+        with self.transaction():
+            if balances is None:
+                self._execute_query(self._CREATE_USER_QUERY, [from_user_id, to_user_id], many=True, commit=True)
+                balances = self.get_mercoin_balances([from_user_id, to_user_id], lock=True)
+
+            return self._apply_mercoin_transfer(from_user_id, to_user_id, amount, balances)
+
+    def _apply_mercoin_transfer(self, from_user_id: int, to_user_id: int, amount: int,
+                                balances: Dict[int, int]) -> Optional[Tuple[int, int]]:
+        if balances[from_user_id] < amount:
+            return None
+
+        self._execute_query(self._ADD_MERCOINS_QUERY, [(from_user_id, -amount), (to_user_id, amount)],
+                            many=True, commit=True)
+        return balances[from_user_id] - amount, balances[to_user_id] + amount
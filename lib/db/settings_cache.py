@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class SettingsCache:
+    """
+    Bounded LRU cache of per-user settings read from the users tables, so commands that look up the same user's
+    platform or graph style over and over don't need a database round trip each time.
+
+    Entries are keyed by (user ID, setting name) and expire `ttl` seconds after they were stored, which bounds how
+    stale a value can get if the row is changed outside of this process. Once `max_size` entries are held, the least
+    recently used one is dropped for each new entry.
+
+    Every write through set() without a generation, invalidate() and clear() bumps `generation`. A reader that can
+    be interleaved with writers (the async database awaits its query) takes the generation before querying and
+    passes it to set(), so a value read before a concurrent change isn't stored over it.
+    """
+
+    DEFAULT_MAX_SIZE = 10000
+    DEFAULT_TTL = 600
+
+    # Returned by get() on a miss, since None is a valid setting value
+    MISSING = object()
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Tuple[Hashable, str], Tuple[Any, float]]' = OrderedDict()
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: Hashable, setting: str) -> Any:
+        """Get a cached setting, or SettingsCache.MISSING if it isn't cached or has expired."""
+        key = (user_id, setting)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return self.MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, user_id: Hashable, setting: str, value: Any, generation: int = None) -> None:
+        """
+        Store a setting.
+
+        Args:
+            user_id: The user the setting belongs to.
+            setting: The name of the setting.
+            value: The setting's value.
+            generation: The generation read before querying the value. If anything was written or invalidated since,
+                the value isn't stored. Leave out when storing a value that was just written.
+        """
+        if generation is None:
+            self.generation += 1
+        elif generation != self.generation:
+            return
+
+        key = (user_id, setting)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Hashable, setting: str) -> None:
+        self.generation += 1
+        self._entries.pop((user_id, setting), None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'entries': len(self._entries)
+        }
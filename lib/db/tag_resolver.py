@@ -0,0 +1,177 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class ServerTags(dict):
+    """
+    The tags visible in a server keyed by lowercased name, with the names also kept in a sorted list so autocomplete
+    can find them by prefix with a binary search. The names are joined into one string as well, so finding them by
+    substring is a str.find scan rather than a Python loop.
+
+    Instances are never modified after they're built; a tag change replaces the server's whole entry.
+    """
+
+    def __init__(self, tags: Iterable[Dict[str, Any]]):
+        super().__init__((tag['tag_name'].lower(), tag) for tag in tags)
+        self.names = sorted(self)
+
+        self._joined_names = '\0'.join(self.names)
+        self._name_offsets = []
+        offset = 0
+        for name in self.names:
+            self._name_offsets.append(offset)
+            offset += len(name) + 1
+
+    def find_names(self, text: str, limit: int = 25) -> List[str]:
+        """
+        Find tag names for autocomplete.
+
+        Args:
+            text: What the user has typed so far, matched case-insensitively.
+            limit: The maximum number of names to return.
+
+        Returns:
+            Names starting with the text in alphabetical order, followed by names containing it elsewhere if there
+            are fewer than `limit` of those.
+        """
+        text = text.lower()
+        start = bisect_left(self.names, text)
+        matches = []
+        for name in self.names[start:start + limit]:
+            if not name.startswith(text):
+                break
+            matches.append(name)
+
+        position = self._joined_names.find(text) if text and len(matches) < limit else -1
+        while position != -1:
+            index = bisect_right(self._name_offsets, position) - 1
+            name = self.names[index]
+            if not name.startswith(text):
+                matches.append(name)
+                if len(matches) == limit:
+                    break
+
+            if index + 1 == len(self.names):
+                break
+            position = self._joined_names.find(text, self._name_offsets[index + 1])
+
+        return [self[name]['tag_name'] for name in matches]
+
+
+class TagResolver:
+    """
+    In-memory copy of the tags each server can see, so looking up a tag (which Tags.on_message does for every
+    prefixed message, tag or not) costs no queries once the server has been loaded.
+
+    A server's entry holds every tag linked to the server itself or to a server it is linked with, keyed by the
+    lowercased tag name. Tag names are unique in the tags table and compared case-insensitively by MySQL, so the
+    lowercased name identifies a tag the same way the queries did. Alongside the tags the entry keeps the set of
+    servers they were collected from, which is what invalidation goes by.
+
+    Tag changes made through this process's database objects invalidate the affected servers straight away. Changes
+    made anywhere else, such as `launcher.py tag-import` or manual SQL, are only picked up once the entry expires,
+    `ttl` seconds after it was loaded, so that is how stale a server's tags can get. Once `max_size` servers are
+    loaded, the least recently used one is dropped for each new one.
+    """
+
+    DEFAULT_MAX_SIZE = 1000
+    DEFAULT_TTL = 600
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._tags: 'OrderedDict[int, ServerTags]' = OrderedDict()
+        self._visible_servers: Dict[int, Set[int]] = {}
+        self._expiries: Dict[int, float] = {}
+
+        # Bumped on every invalidation, so a load that raced with a tag change isn't stored
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, server_id: int) -> bool:
+        return server_id in self._tags
+
+    def get_tags(self, server_id: int) -> Optional[ServerTags]:
+        """Get a server's visible tags keyed by lowercased name, or None if the server isn't loaded or has expired."""
+        tags = self._tags.get(server_id)
+        if tags is None or self._expiries[server_id] < time.monotonic():
+            if tags is not None:
+                # Dropping an expired entry doesn't make loads already in progress stale, so the generation is kept
+                self._discard(server_id)
+            self.misses += 1
+            return None
+
+        self._tags.move_to_end(server_id)
+        self.hits += 1
+        return tags
+
+    def set_tags(self, server_id: int, visible_servers: Iterable[int], tags: List[Dict[str, Any]],
+                 generation: int = None) -> ServerTags:
+        """
+        Store the tags a server can see.
+
+        Args:
+            server_id: The server the tags were resolved for.
+            visible_servers: Every server whose tags the server can see, including itself.
+            tags: The tags as returned by the server tags query.
+            generation: The generation read before querying the tags. If anything was invalidated since, the tags
+                are returned but not stored.
+
+        Returns:
+            The tags keyed by lowercased name.
+        """
+        server_tags = ServerTags(tags)
+        if generation is None or generation == self.generation:
+            self._tags[server_id] = server_tags
+            self._tags.move_to_end(server_id)
+            self._visible_servers[server_id] = set(visible_servers) | {server_id}
+            self._expiries[server_id] = time.monotonic() + self.ttl
+
+            while len(self._tags) > self.max_size:
+                self._discard(next(iter(self._tags)))
+        return server_tags
+
+    def _discard(self, server_id: int) -> None:
+        del self._tags[server_id]
+        del self._visible_servers[server_id]
+        del self._expiries[server_id]
+
+    def _remove(self, server_ids: List[int]) -> None:
+        self.generation += 1
+        for server_id in server_ids:
+            self._discard(server_id)
+
+    def invalidate_servers(self, *server_ids: int) -> None:
+        """Drop every loaded server that can see tags linked to any of the given servers."""
+        server_ids = set(server_ids)
+        self._remove([server_id for server_id, visible_servers in self._visible_servers.items()
+                      if not visible_servers.isdisjoint(server_ids)])
+
+    def invalidate_tag(self, tag_id: int = None, tag_name: str = None) -> None:
+        """Drop every loaded server that can see the given tag, by ID or name."""
+        if tag_name is not None:
+            tag_name = tag_name.lower()
+
+        self._remove([server_id for server_id, tags in self._tags.items()
+                      if (tag_name is not None and tag_name in tags)
+                      or (tag_id is not None and any(tag['id'] == tag_id for tag in tags.values()))])
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._tags.clear()
+        self._visible_servers.clear()
+        self._expiries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'servers': len(self._tags),
+            'tags': sum(len(tags) for tags in self._tags.values())
+        }
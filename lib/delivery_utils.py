@@ -0,0 +1,293 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import discord
+from aiolimiter import AsyncLimiter
+
+from lib.stats_utils import RollingSample
+
+Route = Tuple[str, int]
+
+
+class DeliveryLane(IntEnum):
+    """Priority lanes, lowest value is delivered first."""
+    LOG = 0
+    THREAD = 1
+    DM = 2
+
+
+@dataclass
+class DeliveryJob:
+    lane: DeliveryLane
+    route: Route
+    factory: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    submitted: float = field(default_factory=time.monotonic)
+
+
+class LaneMetrics:
+    def __init__(self, sample_size: int = 1000):
+        self.depth = 0
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.latency = RollingSample(sample_size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'depth': self.depth,
+            'submitted': self.submitted,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'retries': self.retries,
+            'p50': self.latency.get_percentile(0.5),
+            'p99': self.latency.get_percentile(0.99)
+        }
+
+
+class DeliveryScheduler:
+    """
+    Central queue for outbound Discord messages.
+
+    Jobs are taken in lane order (log channels, then threads, then DMs) by a fixed number of workers, which is the
+    global cap on in-flight requests. Every request also waits on a global token bucket and on a token bucket for its
+    route (the channel or DM it goes to), and jobs for the same route are sent one at a time in submission order.
+    Rate limit (429) and server (5xx) errors are retried with exponential backoff; any other error is raised to the
+    caller.
+    """
+
+    DEFAULT_WORKERS = 10
+    DEFAULT_GLOBAL_RATE = 40
+    DEFAULT_ROUTE_RATE = 5
+    DEFAULT_ROUTE_PERIOD = 5
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_BACKOFF = 1.0
+
+    # Idle route limiters are swept once there are this many, and again each time their number doubles after that
+    ROUTE_LIMITER_SWEEP_SIZE = 1000
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, global_rate: float = DEFAULT_GLOBAL_RATE,
+                 route_rate: float = DEFAULT_ROUTE_RATE, route_period: float = DEFAULT_ROUTE_PERIOD,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff: float = DEFAULT_BACKOFF):
+        self.logger = logging.getLogger('delivery')
+        self.worker_count = workers
+        self.route_rate = route_rate
+        self.route_period = route_period
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._global_limiter = AsyncLimiter(global_rate, 1)
+        self._route_limiters: Dict[Route, AsyncLimiter] = {}
+        self._next_limiter_sweep = self.ROUTE_LIMITER_SWEEP_SIZE
+        self._route_backlogs: Dict[Route, Deque[DeliveryJob]] = defaultdict(deque)
+        self._busy_routes = set()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._sequence = itertools.count()
+
+        self.metrics = {lane: LaneMetrics() for lane in DeliveryLane}
+
+    def start(self) -> None:
+        if self._workers:
+            return
+
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @staticmethod
+    def get_route(destination: discord.abc.Snowflake) -> Route:
+        if isinstance(destination, (discord.User, discord.Member)):
+            return 'dm', destination.id
+
+        return 'channel', destination.id
+
+    def submit(self, lane: DeliveryLane, route: Route, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Queue a request. `factory` is called to create the request coroutine, once per attempt.
+
+        Returns: A future resolved with the request's result, or its exception if it could not be delivered.
+        """
+        self.start()
+
+        job = DeliveryJob(lane, route, factory, asyncio.get_running_loop().create_future())
+        self.metrics[lane].depth += 1
+        self.metrics[lane].submitted += 1
+        self._queue.put_nowait((lane, next(self._sequence), job))
+
+        return job.future
+
+    async def send(self, lane: DeliveryLane, destination: discord.abc.Messageable, **kwargs) -> discord.Message:
+        return await self.submit(lane, self.get_route(destination), lambda: destination.send(**kwargs))
+
+    async def edit(self, lane: DeliveryLane, message: discord.Message, **kwargs) -> discord.Message:
+        return await self.submit(lane, self.get_route(message.channel), lambda: message.edit(**kwargs))
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {lane.name.lower(): metrics.to_dict() for lane, metrics in self.metrics.items()}
+
+    def _get_route_limiter(self, route: Route) -> AsyncLimiter:
+        if route not in self._route_limiters:
+            if len(self._route_limiters) >= self._next_limiter_sweep:
+                self._sweep_route_limiters()
+            self._route_limiters[route] = AsyncLimiter(self.route_rate, self.route_period)
+
+        return self._route_limiters[route]
+
+    def _sweep_route_limiters(self) -> None:
+        """
+        Drop the limiters of routes that aren't being sent to and whose buckets have fully drained, which behave the
+        same as a new limiter. Without this every channel and DM ever sent to would keep a limiter.
+        """
+        for route, limiter in list(self._route_limiters.items()):
+            if route not in self._busy_routes and limiter.has_capacity(self.route_rate):
+                del self._route_limiters[route]
+
+        self._next_limiter_sweep = max(self.ROUTE_LIMITER_SWEEP_SIZE, len(self._route_limiters) * 2)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+
+            # Another worker is sending to this route; it will pick the job up once it's done, keeping route order.
+            if job.route in self._busy_routes:
+                self._route_backlogs[job.route].append(job)
+                continue
+
+            route = job.route
+            self._busy_routes.add(route)
+            try:
+                while job is not None:
+                    await self._run(job)
+
+                    backlog = self._route_backlogs.get(route)
+                    job = backlog.popleft() if backlog else None
+            finally:
+                self._busy_routes.discard(route)
+                self._route_backlogs.pop(route, None)
+
+    async def _run(self, job: DeliveryJob) -> None:
+        metrics = self.metrics[job.lane]
+        metrics.depth -= 1
+
+        for attempt in range(self.max_retries + 1):
+            await self._global_limiter.acquire()
+            await self._get_route_limiter(job.route).acquire()
+
+            try:
+                result = await job.factory()
+            except discord.HTTPException as e:
+                if (e.status == 429 or e.status >= 500) and attempt < self.max_retries:
+                    metrics.retries += 1
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+                    continue
+
+                self._fail(job, e)
+                return
+            except Exception as e:
+                self._fail(job, e)
+                return
+
+            metrics.delivered += 1
+            metrics.latency.add(time.monotonic() - job.submitted)
+            if not job.future.done():
+                job.future.set_result(result)
+            return
+
+    def _fail(self, job: DeliveryJob, error: Exception) -> None:
+        self.metrics[job.lane].failed += 1
+        if not job.future.done():
+            job.future.set_exception(error)
+
+
+class CoalescingQueue:
+    """
+    Collects items per key and hands them to `flush` in batches, so several items for the same destination can go
+    out in a single request.
+
+    A key's items are flushed `window` seconds after its first pending item arrives, or straight away once
+    `max_items` are pending. Items keep their order and no batch holds more than `max_items`.
+    """
+
+    def __init__(self, flush: Callable[[Any, list], Awaitable[Any]], window: float = 5.0, max_items: int = 10):
+        self.logger = logging.getLogger('delivery')
+        self.flush = flush
+        self.window = window
+        self.max_items = max_items
+
+        self._pending: Dict[Any, list] = {}
+        self._timers: Dict[Any, asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+        self.items = 0
+        self.batches = 0
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    def add(self, key: Any, items: list) -> None:
+        pending = self._pending.setdefault(key, [])
+        pending.extend(items)
+        self.items += len(items)
+
+        while len(pending) >= self.max_items:
+            self._start_flush(key, pending[:self.max_items])
+            del pending[:self.max_items]
+
+        if not pending:
+            self._cancel_timer(key)
+            del self._pending[key]
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush_key, key)
+
+    async def flush_all(self) -> None:
+        """Flush every pending item now and wait for all flushes to finish."""
+        for key in list(self._pending):
+            self._flush_key(key)
+
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _cancel_timer(self, key: Any) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _flush_key(self, key: Any) -> None:
+        self._cancel_timer(key)
+        items = self._pending.pop(key, None)
+        if items:
+            self._start_flush(key, items)
+
+    def _start_flush(self, key: Any, items: list) -> None:
+        self.batches += 1
+        task = asyncio.create_task(self._run_flush(key, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_flush(self, key: Any, items: list) -> None:
+        try:
+            await self.flush(key, items)
+        except Exception as e:
+            self.logger.error(f"Failed to flush {len(items)} items for {key}", exc_info=e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'items': self.items,
+            'batches': self.batches,
+            'pending': len(self),
+            'items_per_batch': self.items / self.batches if self.batches else None
+        }
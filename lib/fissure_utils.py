@@ -0,0 +1,564 @@
+import asyncio
+import hashlib
+import json
+from bisect import bisect_left
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Set, Tuple, Union
+
+import discord
+from fissure_engine.fissure_engine import Fissure, FissureEngine
+
+SUBSCRIPTION_EXACT_FIELDS = ('fissure_type', 'era', 'node', 'planet', 'tileset', 'enemy')
+SUBSCRIPTION_FIELDS = SUBSCRIPTION_EXACT_FIELDS + ('mission', 'max_tier')
+
+
+def get_embeds_hash(embeds: List[discord.Embed]) -> str:
+    """Hash the content of a list of embeds, so two renders can be compared without keeping them around."""
+    return hashlib.sha256(json.dumps([embed.to_dict() for embed in embeds], sort_keys=True).encode()).hexdigest()
+
+
+def match_subscription(subscription: Dict[str, Union[str, int]], fissure: Fissure) -> bool:
+    """
+    Check one subscription against a fissure by scanning its fields. This is the reference rule SubscriptionIndex
+    implements; the bot matches through the index.
+
+    Args:
+        subscription: A subscription row, as returned by the database.
+        fissure: The fissure to check.
+
+    Returns: Whether every field the subscription sets matches the fissure.
+
+    """
+    for key, value in subscription.items():
+        if key == 'user_id' or value is None:
+            continue
+        if key == 'mission':
+            if value.lower() not in fissure.mission.lower():
+                return False
+        elif key == 'max_tier':
+            if fissure.tier > value:
+                return False
+        elif getattr(fissure, key) != value:
+            return False
+    return True
+
+
+class SubscriptionIndex:
+    """
+    In-memory index of fissure subscriptions that answers "which users want this fissure?" without scanning
+    every subscription.
+
+    Subscriptions are grouped by which of the exact-match fields (fissure type, era, node, planet, tileset, enemy)
+    they set, then keyed by the values of those fields. A fissure is looked up once per group, so the cost of a
+    match depends on the number of distinct field combinations in use (at most 64) rather than on the number of
+    subscriptions. Inside each bucket subscriptions are further split by mission and max tier, which are checked
+    with the same substring and range rules as `match_subscription`.
+
+    Buckets are copy-on-write between an index and its snapshots, see `snapshot`.
+    """
+
+    def __init__(self):
+        # fields set -> field values -> (mission, max_tier) -> user_id -> number of identical subscriptions
+        self._buckets: Dict[Tuple[str, ...],
+                            Dict[Tuple, Dict[Tuple, Dict[int, int]]]] = {}
+        self._user_subscriptions: Dict[int, List[Dict[str, Union[str, int]]]] = defaultdict(list)
+        self._size = 0
+        # (fields, values) of the buckets created or copied since the last snapshot, which no snapshot shares
+        self._owned: Set[Tuple[Tuple[str, ...], Tuple]] = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._user_subscriptions
+
+    @staticmethod
+    def _get_subscription_key(subscription: Dict[str, Union[str, int]]) -> Tuple[Tuple, Tuple, Tuple]:
+        fields = tuple(field for field in SUBSCRIPTION_EXACT_FIELDS if subscription.get(field) is not None)
+        values = tuple(subscription[field] for field in fields)
+        mission = subscription.get('mission')
+        return fields, values, (mission.lower() if mission is not None else None, subscription.get('max_tier'))
+
+    def load(self, subscriptions: List[Dict[str, Union[str, int]]]) -> None:
+        """Replace the contents of the index with the given subscription rows (as returned by the database)."""
+        self.clear()
+        for subscription in subscriptions:
+            self.add(subscription['user_id'], subscription)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self._user_subscriptions.clear()
+        self._size = 0
+        self._owned.clear()
+
+    def snapshot(self) -> 'SubscriptionIndex':
+        """
+        Copy the index for reading while this one keeps changing.
+
+        Only the maps down to the buckets and the user map are copied, which costs about one entry per
+        (fields, values) bucket and per user. The buckets themselves are shared, and whichever index next changes
+        a shared bucket copies it first, so a subscription change costs one bucket copy rather than a copy of the
+        whole index. Per-user subscription lists are never changed in place, so they are shared as they are.
+        """
+        index = SubscriptionIndex()
+        index._buckets = {fields: dict(buckets) for fields, buckets in self._buckets.items()}
+        index._user_subscriptions = defaultdict(list, self._user_subscriptions)
+        index._size = self._size
+        self._owned.clear()
+        return index
+
+    def _get_owned_leaves(self, fields: Tuple[str, ...], values: Tuple) -> Dict[Tuple, Dict[int, int]]:
+        buckets = self._buckets.setdefault(fields, {})
+        if (fields, values) not in self._owned:
+            leaves = buckets.get(values, {})
+            buckets[values] = {leaf_key: dict(users) for leaf_key, users in leaves.items()}
+            self._owned.add((fields, values))
+
+        return buckets[values]
+
+    def add(self, user_id: int, subscription: Dict[str, Union[str, int]]) -> None:
+        subscription = {field: subscription.get(field) for field in SUBSCRIPTION_FIELDS}
+        fields, values, leaf_key = self._get_subscription_key(subscription)
+
+        leaf = self._get_owned_leaves(fields, values).setdefault(leaf_key, {})
+        leaf[user_id] = leaf.get(user_id, 0) + 1
+
+        self._user_subscriptions[user_id] = self._user_subscriptions[user_id] + [subscription]
+        self._size += 1
+
+    def _discard(self, user_id: int, subscription: Dict[str, Union[str, int]]) -> None:
+        fields, values, leaf_key = self._get_subscription_key(subscription)
+
+        leaves = self._get_owned_leaves(fields, values)
+        buckets = self._buckets[fields]
+        leaf = leaves[leaf_key]
+
+        leaf[user_id] -= 1
+        if not leaf[user_id]:
+            del leaf[user_id]
+        if not leaf:
+            del leaves[leaf_key]
+        if not leaves:
+            del buckets[values]
+            self._owned.discard((fields, values))
+        if not buckets:
+            del self._buckets[fields]
+
+        self._size -= 1
+
+    def remove(self, user_id: int, **conditions) -> None:
+        """
+        Remove a user's subscriptions that match every given (non-None) field, mirroring
+        `MercuriusDatabase.remove_fissure_subscription`.
+        """
+        conditions = {field: value for field, value in conditions.items() if value is not None}
+
+        kept = []
+        for subscription in self._user_subscriptions.get(user_id, []):
+            if all(subscription.get(field) == value for field, value in conditions.items()):
+                self._discard(user_id, subscription)
+            else:
+                kept.append(subscription)
+
+        if kept:
+            self._user_subscriptions[user_id] = kept
+        else:
+            self._user_subscriptions.pop(user_id, None)
+
+    def remove_user(self, user_id: int) -> None:
+        self.remove(user_id)
+
+    def match(self, fissure: Fissure) -> Set[int]:
+        """Return the IDs of all users with at least one subscription matching the fissure."""
+        user_ids = set()
+        fissure_mission = fissure.mission.lower()
+
+        for fields, buckets in self._buckets.items():
+            leaves = buckets.get(tuple(getattr(fissure, field) for field in fields))
+            if not leaves:
+                continue
+
+            for (mission, max_tier), users in leaves.items():
+                if max_tier is not None and fissure.tier > max_tier:
+                    continue
+                if mission is not None and mission not in fissure_mission:
+                    continue
+                user_ids.update(users)
+
+        return user_ids
+
+
+class SubscriptionSnapshot:
+    """
+    Frozen copy of the per-notification-type subscription indexes, taken once per worldstate tick and shared by
+    every log channel, thread and DM delivered during that tick.
+
+    The version is the value of the owner's change counter when the snapshot was taken; a snapshot is only
+    rebuilt after that counter has been bumped by a subscription change, so any number of subscription changes
+    between two ticks cost one snapshot. The indexes share their buckets with the live ones (see
+    `SubscriptionIndex.snapshot`), so taking a snapshot costs one entry per bucket and per user, and each change
+    after it copies one bucket.
+    """
+
+    def __init__(self, version: int, indexes: Dict[str, SubscriptionIndex]):
+        self.version = version
+        self.indexes = {notification_type: index.snapshot() for notification_type, index in indexes.items()}
+
+    def match(self, fissure: Fissure, notification_type: str) -> Set[int]:
+        return self.indexes[notification_type].match(fissure)
+
+
+class RenderCache:
+    """
+    Memo of rendered fissure list embeds, keyed on the list's configuration signature and valid for a single
+    version of the fissure data. Entries for older versions are dropped as soon as a newer version is requested.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple, Any] = {}
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, version: int, signature: Tuple, render: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached render for the signature at this version, calling `render` to build it on a miss."""
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+        if signature in self._entries:
+            self.hits += 1
+            return self._entries[signature]
+
+        self.misses += 1
+        self._entries[signature] = result = await render()
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+@dataclass
+class FissureDiff:
+    """What changed in the fissure lists between two updates, per fissure type."""
+    version: int
+    added: Dict[str, List[Fissure]] = field(default_factory=dict)
+    expired: Dict[str, List[Fissure]] = field(default_factory=dict)
+    changed_resets: Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.changed_types)
+
+    @property
+    def changed_types(self) -> Set[str]:
+        return set(self.added) | set(self.expired) | self.changed_resets
+
+
+class FissureDiffStream:
+    """
+    Turns successive fissure list states into a stream of diffs: fissures added, fissures expired (or otherwise
+    gone) and era resets changed, per fissure type.
+
+    Each fissure type has a version that is bumped whenever a diff touches it, so anything rendered from a single
+    type can be cached against that type's version alone.
+    """
+
+    def __init__(self, max_diffs: int = 100):
+        self.version = 0
+        self.type_versions: Dict[str, int] = defaultdict(int)
+        self.diffs: Deque[FissureDiff] = deque(maxlen=max_diffs)
+        self._fissures: Dict[str, Dict[int, Fissure]] = {}
+        self._resets: Dict[str, Dict[str, datetime]] = {}
+
+    def update(self, fissure_lists: Dict[str, List[Fissure]],
+               last_expiries: Dict[str, Dict[str, datetime]]) -> FissureDiff:
+        """
+        Compare the current fissure lists and per-era last expiries (from FissureEngine.get_last_expiry) with the
+        previous ones.
+
+        Returns: The diff, which is empty (falsy) if nothing changed. Non-empty diffs are added to the stream.
+        """
+        diff = FissureDiff(self.version + 1)
+
+        for fissure_type, fissures in fissure_lists.items():
+            current = {hash(fissure): fissure for fissure in fissures}
+            previous = self._fissures.get(fissure_type, {})
+
+            added = [fissure for key, fissure in current.items() if key not in previous]
+            expired = [fissure for key, fissure in previous.items() if key not in current]
+            if added:
+                diff.added[fissure_type] = added
+            if expired:
+                diff.expired[fissure_type] = expired
+
+            resets = dict(last_expiries.get(fissure_type, {}))
+            if resets != self._resets.get(fissure_type, {}):
+                diff.changed_resets.add(fissure_type)
+
+            self._fissures[fissure_type] = current
+            self._resets[fissure_type] = resets
+
+        if diff:
+            self.version = diff.version
+            for fissure_type in diff.changed_types:
+                self.type_versions[fissure_type] += 1
+            self.diffs.append(diff)
+
+        return diff
+
+    def get_diffs_since(self, version: int) -> List[FissureDiff]:
+        return [diff for diff in self.diffs if diff.version > version]
+
+    def get_versions(self, fissure_types: List[str]) -> Tuple[int, ...]:
+        return tuple(self.type_versions[fissure_type] for fissure_type in fissure_types)
+
+
+class RefreshScheduler:
+    """
+    Paces a cycle of fissure list refreshes under a requests-per-second budget.
+
+    Each cycle gets the lists that need a request (ones whose content changed). Those that have been waiting
+    longest go first, and at most `window * rate` of them are sent in one cycle. The rest are deferred to the
+    next cycle, which sends them first. The lists sent in a cycle are spread evenly over the window, so
+    requests stay steady instead of bursting at the start of each cycle.
+    """
+
+    DEFAULT_WINDOW = 25.0
+    DEFAULT_RATE = 5.0
+
+    def __init__(self, window: float = DEFAULT_WINDOW, rate: float = DEFAULT_RATE):
+        self.window = window
+        self.rate = rate
+        self._pending_since: Dict[Any, float] = {}
+        self.last_report: Dict[str, Any] = {}
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.window * self.rate))
+
+    async def run(self, jobs: Dict[Any, Callable[[], Awaitable[Any]]]) -> Dict[str, Any]:
+        """
+        Run one refresh cycle.
+
+        Args:
+            jobs: The refreshes needed this cycle, keyed by a stable list identifier.
+
+        Returns: A report with the number of lists refreshed and deferred, the worst lag behind their scheduled
+            start time, how long the oldest list has been waiting for a refresh, and any errors raised.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        # Lists that no longer need a refresh are forgotten; new ones start waiting now
+        self._pending_since = {key: self._pending_since.get(key, start) for key in jobs}
+
+        order = sorted(jobs, key=self._pending_since.get)
+        due, deferred = order[:self.capacity], order[self.capacity:]
+        interval = self.window / len(due) if due else 0
+        max_staleness = start - self._pending_since[order[0]] if order else 0
+
+        errors = []
+
+        async def run_job(key):
+            try:
+                await jobs[key]()
+            except Exception as e:
+                errors.append((key, e))
+            else:
+                self._pending_since.pop(key, None)
+
+        tasks = []
+        max_lag = 0.0
+        for i, key in enumerate(due):
+            target = start + i * interval
+            delay = target - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            max_lag = max(max_lag, loop.time() - target)
+            tasks.append(asyncio.create_task(run_job(key)))
+
+        await asyncio.gather(*tasks)
+
+        self.last_report = {
+            'refreshed': len(due),
+            'deferred': len(deferred),
+            'max_lag': max_lag,
+            'max_staleness': max_staleness,
+            'duration': loop.time() - start,
+            'errors': errors
+        }
+        return self.last_report
+
+
+# Nodes that can never have fissures
+NODE_BLACKLIST = {
+    'type': {'Relay', 'Ancient Retribution', 'Salvage', 'Arena', 'Conclave', 'Hijack', 'Assassination',
+             'Pursuit (Archwing)', 'Mobile Defense (Archwing)', 'Sabotage (Archwing)', 'Orphix', 'Rush (Archwing)',
+             'Exterminate (Archwing)', 'Interception (Archwing)', 'Assassinate', 'Void Armageddon', 'Defection',
+             'Free Roam'},
+    'enemy': {'Tenno'},
+    'planet': {'Mercury'}
+}
+
+# Where fissures of each era / fissure type can appear. Exclusive rules also keep other eras / types off their planets.
+NODE_FILTER_RULES = {
+    'era': [
+        {'field': 'planet', 'type': 'whitelist', 'values': {'Venus', 'Earth', 'Mars'},
+         'condition': FissureEngine.ERA_LITH, 'exclusive': True},
+        {'field': 'planet', 'type': 'whitelist', 'values': {'Ceres', 'Jupiter', 'Phobos', 'Saturn'},
+         'condition': FissureEngine.ERA_MESO, 'exclusive': True},
+        {'field': 'planet', 'type': 'whitelist', 'values': {'Neptune', 'Europa', 'Uranus', 'Void'},
+         'condition': FissureEngine.ERA_NEO, 'exclusive': False},
+        {'field': 'planet', 'type': 'whitelist', 'values': {'Pluto', 'Sedna', 'Eris', 'Void'},
+         'condition': FissureEngine.ERA_AXI, 'exclusive': False},
+        {'field': 'planet', 'type': 'whitelist', 'values': {'Kuva Fortress'},
+         'condition': FissureEngine.ERA_REQUIEM, 'exclusive': True},
+        {'field': 'planet', 'type': 'whitelist', 'values': {'Lua', 'Zariman Ten Zero', "Albrecht's Laboratories"},
+         'condition': FissureEngine.ERA_OMNIA, 'exclusive': True}
+    ],
+    'fissure_type': [
+        {'field': 'planet', 'type': 'whitelist',
+         'values': {'Saturn Proxima', 'Earth Proxima', 'Venus Proxima', 'Neptune Proxima', 'Pluto Proxima',
+                    'Veil Proxima'},
+         'condition': FissureEngine.FISSURE_TYPE_VOID_STORMS, 'exclusive': True}
+    ]
+}
+
+NODE_FACETS = ('node', 'type', 'planet', 'tileset', 'enemy')
+
+# Stands in for any era / fissure type that no rule mentions; they all filter nodes the same way
+_OTHER_CONDITION = object()
+
+
+class NodeFacetIndex:
+    """
+    Precomputed index of sol nodes for fissure subscription autocomplete.
+
+    The era and fissure type rules only ever narrow nodes down one of a handful of ways, so the nodes left for each
+    (era, fissure type) combination are worked out once up front. For each combination and facet (node, mission
+    type, planet, tileset, enemy) the index holds the sorted distinct values, for prefix lookups by bisection, and
+    the nodes carrying each value, for narrowing by the other facets already filled in.
+    """
+
+    def __init__(self, nodes: List[Dict[str, Any]]):
+        nodes = [node for node in nodes
+                 if all(attr not in node or node[attr] not in values for attr, values in NODE_BLACKLIST.items())]
+
+        era_conditions = [None, _OTHER_CONDITION] + [rule['condition'] for rule in NODE_FILTER_RULES['era']]
+        fissure_type_conditions = [None, _OTHER_CONDITION] + [rule['condition']
+                                                              for rule in NODE_FILTER_RULES['fissure_type']]
+
+        self._combinations = {
+            (era, fissure_type): self._build_combination(self._apply_rules(nodes, {'era': era,
+                                                                                   'fissure_type': fissure_type}))
+            for era in era_conditions for fissure_type in fissure_type_conditions
+        }
+
+    @staticmethod
+    def _apply_rules(nodes: List[Dict[str, Any]], conditions: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for filter_key, filter_rules in NODE_FILTER_RULES.items():
+            filter_value = conditions.get(filter_key)
+            for rule in filter_rules:
+                field, values = rule['field'], rule['values']
+                if filter_value == rule['condition']:
+                    if rule['type'] == 'whitelist':
+                        nodes = [node for node in nodes if node.get(field) in values]
+                    else:
+                        nodes = [node for node in nodes if node.get(field) not in values]
+                elif rule['exclusive'] and filter_value is not None:
+                    nodes = [node for node in nodes if node.get(field) not in values]
+
+        return nodes
+
+    @staticmethod
+    def _build_combination(nodes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        facets = {}
+        for facet in NODE_FACETS:
+            value_nodes = defaultdict(set)
+            for i, node in enumerate(nodes):
+                if node.get(facet):
+                    value_nodes[node[facet]].add(i)
+
+            values = sorted(value_nodes, key=str.lower)
+            facets[facet] = {
+                'keys': [value.lower() for value in values],
+                'values': values,
+                'nodes': {value: frozenset(node_ids) for value, node_ids in value_nodes.items()},
+                # Nodes without the facet at all aren't filtered on it
+                'missing': frozenset(i for i, node in enumerate(nodes) if facet not in node)
+            }
+
+        return {'nodes': nodes, 'facets': facets}
+
+    def _get_combination(self, selected_values: Dict[str, Any]) -> Dict[str, Any]:
+        era, fissure_type = selected_values.get('era'), selected_values.get('fissure_type')
+        if (era, None) not in self._combinations:
+            era = _OTHER_CONDITION
+        if (None, fissure_type) not in self._combinations:
+            fissure_type = _OTHER_CONDITION
+
+        return self._combinations[(era, fissure_type)]
+
+    @staticmethod
+    def _get_prefix_range(facet: Dict[str, Any], prefix: str) -> Tuple[int, int]:
+        prefix = prefix.lower()
+        return bisect_left(facet['keys'], prefix), bisect_left(facet['keys'], prefix + '\uffff')
+
+    def _get_node_ids(self, combination: Dict[str, Any], selected_values: Dict[str, Any],
+                      exclude: str = None) -> Union[Set[int], None]:
+        """Nodes matching the prefix of every selected facet they have, or None if no facet is selected."""
+        node_ids = None
+        for attr in NODE_FACETS:
+            value = selected_values.get(attr)
+            if not value or attr == exclude:
+                continue
+
+            facet = combination['facets'][attr]
+            start, end = self._get_prefix_range(facet, value)
+            matching = set(facet['missing']).union(*(facet['nodes'][facet['values'][i]] for i in range(start, end)))
+            node_ids = matching if node_ids is None else node_ids & matching
+
+        return node_ids
+
+    def filter_nodes(self, selected_values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Get the nodes fissures can appear on given the selected values. Facet values are matched as
+        case-insensitive prefixes.
+        """
+        combination = self._get_combination(selected_values)
+        node_ids = self._get_node_ids(combination, selected_values)
+        if node_ids is None:
+            return list(combination['nodes'])
+
+        return [combination['nodes'][i] for i in sorted(node_ids)]
+
+    def get_choices(self, facet_name: str, current: str, selected_values: Dict[str, Any],
+                    limit: int = 10) -> List[str]:
+        """
+        Get up to `limit` values of a facet for autocomplete, narrowed by the other selected values. Values starting
+        with `current` come first, then values containing it.
+        """
+        combination = self._get_combination(selected_values)
+        facet = combination['facets'][facet_name]
+        node_ids = self._get_node_ids(combination, selected_values, exclude=facet_name)
+
+        def is_valid(value):
+            return node_ids is None or not node_ids.isdisjoint(facet['nodes'][value])
+
+        start, end = self._get_prefix_range(facet, current)
+        choices = [value for value in islice(filter(is_valid, facet['values'][start:end]), limit)]
+
+        if len(choices) < limit and current:
+            current = current.lower()
+            choices += islice((value for key, value in zip(facet['keys'], facet['values'])
+                               if current in key and not key.startswith(current) and is_valid(value)),
+                              limit - len(choices))
+
+        return choices
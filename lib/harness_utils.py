@@ -0,0 +1,343 @@
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from fissure_engine.common import sol_nodes
+from fissure_engine.fissure_engine import FissureEngine
+
+from lib.db.mercurius_db import MercuriusDatabase
+from lib.delivery_utils import DeliveryScheduler
+from lib.fissure_utils import RefreshScheduler
+from lib.presence_utils import PresenceIndex
+from lib.stats_utils import get_percentile
+from lib.worldstate_utils import PolledFissureEngine, ReplayWorldstatePoller
+
+FISSURE_TYPES = (FissureEngine.FISSURE_TYPE_NORMAL, FissureEngine.FISSURE_TYPE_STEEL_PATH,
+                 FissureEngine.FISSURE_TYPE_VOID_STORMS)
+ERAS = (FissureEngine.ERA_LITH, FissureEngine.ERA_MESO, FissureEngine.ERA_NEO, FissureEngine.ERA_AXI,
+        FissureEngine.ERA_REQUIEM, FissureEngine.ERA_OMNIA)
+
+
+class StubRest:
+    """Counts the REST calls made through the stub Discord objects, each taking `latency` seconds."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = Counter()
+        self._ids = itertools.count(10 ** 17)
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    async def request(self, name: str) -> None:
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class StubGuild:
+    def __init__(self, rest: StubRest):
+        self.id = rest.next_id()
+        self.channels: Dict[int, StubChannel] = {}
+
+    def get_channel(self, channel_id: int) -> Optional['StubChannel']:
+        return self.channels.get(channel_id)
+
+
+class StubChannel:
+    def __init__(self, rest: StubRest, guild: Optional[StubGuild]):
+        self.rest = rest
+        self.id = rest.next_id()
+        self.guild = guild
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, content: str = None, embed=None, embeds=None, **kwargs) -> 'StubMessage':
+        await self.rest.request('send_message')
+        return StubMessage(self.rest, self, self.rest.next_id(), [embed] if embed else embeds or [])
+
+    def get_partial_message(self, message_id: int) -> 'StubMessage':
+        return StubMessage(self.rest, self, message_id, [])
+
+
+class StubThread(StubChannel):
+    pass
+
+
+class StubMessage:
+    def __init__(self, rest: StubRest, channel: StubChannel, message_id: int, embeds: list):
+        self.rest = rest
+        self.channel = channel
+        self.guild = channel.guild
+        self.id = message_id
+        self.embeds = embeds
+
+    async def edit(self, embeds=None, **kwargs) -> 'StubMessage':
+        await self.rest.request('edit_message')
+        if embeds is not None:
+            self.embeds = embeds
+        return self
+
+    async def create_thread(self, name: str, **kwargs) -> StubThread:
+        await self.rest.request('create_thread')
+        return StubThread(self.rest, self.guild)
+
+
+class StubUser:
+    def __init__(self, rest: StubRest, user_id: int):
+        self.rest = rest
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+    async def send(self, content: str = None, embed=None, embeds=None, **kwargs) -> StubMessage:
+        await self.rest.request('send_dm')
+        return StubMessage(self.rest, StubChannel(self.rest, None), self.rest.next_id(),
+                           [embed] if embed else embeds or [])
+
+
+class StubDatabase:
+    """
+    Stand-in for AsyncMercuriusDatabase covering the queries made by the fissure pipeline, seeded with synthetic
+    servers, channels and subscriptions. Every call is counted as one database round trip.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.fissure_log_channels = defaultdict(lambda: defaultdict(list))
+        self.fissure_list_channels = defaultdict(list)
+        self.subscriptions = {'DM': [], 'Thread': []}
+        self.notification_rows = {}
+        self.thread_archives = {}
+
+    @classmethod
+    def seed(cls, rest: StubRest, guilds: List[StubGuild], log_channels: int, list_channels: int, users: int,
+             subscriptions_per_user: int, thread_ratio: float, digest_ratio: float,
+             rng: random.Random) -> 'StubDatabase':
+        """
+        Create channels in every guild and a database configured with fissure logs and lists in them, plus `users`
+        users with random subscriptions. Each subscription is either to an era of a fissure type or to a node, and
+        `digest_ratio` of the DM users have DM digests enabled.
+        """
+        database = cls()
+        nodes = [node['node'] for node in sol_nodes.values() if 'node' in node]
+        list_ids = itertools.count(1)
+
+        for guild in guilds:
+            for _ in range(log_channels):
+                channel = StubChannel(rest, guild)
+                guild.channels[channel.id] = channel
+                for fissure_type in FISSURE_TYPES:
+                    database.fissure_log_channels[fissure_type][guild.id].append(channel.id)
+
+            for _ in range(list_channels):
+                channel = StubChannel(rest, guild)
+                guild.channels[channel.id] = channel
+                config = {
+                    "id": next(list_ids),
+                    "server_id": guild.id,
+                    "channel_id": channel.id,
+                    "message_id": rest.next_id(),
+                    "max_tier": rng.randint(1, 5),
+                    "display_type": rng.choice([FissureEngine.DISPLAY_TYPE_DISCORD,
+                                                FissureEngine.DISPLAY_TYPE_TIME_LEFT]),
+                    "show_normal": rng.random() < 0.7,
+                    "show_steel_path": rng.random() < 0.5,
+                    "show_void_storms": rng.random() < 0.3
+                }
+                if not (config["show_normal"] or config["show_steel_path"] or config["show_void_storms"]):
+                    config["show_normal"] = True
+                for era in ERAS:
+                    config[f"show_{era.lower()}"] = rng.random() < 0.8
+                database.fissure_list_channels[guild.id].append(config)
+
+        for user_id in range(1, users + 1):
+            notification_type = 'Thread' if rng.random() < thread_ratio else 'DM'
+            if notification_type == 'DM' and rng.random() < digest_ratio:
+                database.notification_rows[user_id] = (user_id, None, True, True, True, True, True, True)
+            for _ in range(subscriptions_per_user):
+                subscription = dict.fromkeys(["fissure_type", "era", "node", "mission", "planet", "tileset",
+                                              "enemy", "max_tier"])
+                subscription["user_id"] = user_id
+                if rng.random() < 0.5:
+                    subscription["node"] = rng.choice(nodes)
+                else:
+                    subscription["fissure_type"] = rng.choice(FISSURE_TYPES)
+                    subscription["era"] = rng.choice(ERAS)
+                database.subscriptions[notification_type].append(subscription)
+
+        return database
+
+    async def get_fissure_log_channels(self) -> defaultdict:
+        self.calls['get_fissure_log_channels'] += 1
+        return self.fissure_log_channels
+
+    async def get_fissure_list_channels(self) -> defaultdict:
+        self.calls['get_fissure_list_channels'] += 1
+        return self.fissure_list_channels
+
+    async def set_fissure_list_message_id(self, fissure_list_id: int, message_id: int) -> None:
+        self.calls['set_fissure_list_message_id'] += 1
+        for configs in self.fissure_list_channels.values():
+            for config in configs:
+                if config["id"] == fissure_list_id:
+                    config["message_id"] = message_id
+
+    async def get_all_fissure_subscriptions(self, notification_type: str = 'DM') -> List[Dict[str, Any]]:
+        self.calls['get_all_fissure_subscriptions'] += 1
+        return [dict(subscription) for subscription in self.subscriptions[notification_type]]
+
+    async def get_fissure_notification_settings(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        self.calls['get_fissure_notification_settings'] += 1
+        user_ids = list(set(user_ids))
+        rows = [self.notification_rows[user_id] for user_id in user_ids if user_id in self.notification_rows]
+        return MercuriusDatabase._build_fissure_notification_settings(user_ids, rows)
+
+    async def add_fissure_thread_archive(self, thread_id: int, channel_id: int, expiry) -> None:
+        self.calls['add_fissure_thread_archive'] += 1
+        self.thread_archives[thread_id] = (channel_id, expiry)
+
+
+class TaskTracker:
+    """Stands in for the bot's event loop so the harness can wait on the tasks the cog starts in the background."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def create_task(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.append(task)
+        return task
+
+    async def wait(self) -> None:
+        tasks, self.tasks = self.tasks, []
+        await asyncio.gather(*tasks)
+
+
+class StubBot:
+    """The parts of the bot used by the fissure pipeline, backed by stub guilds, users and database."""
+
+    def __init__(self, poller: ReplayWorldstatePoller, database: StubDatabase, rest: StubRest,
+                 guilds: List[StubGuild], users: List[StubUser], delivery: DeliveryScheduler):
+        self.bot_config = {}
+        self.logger = logging.getLogger('harness')
+        self.worldstate_poller = poller
+        self.fissure_engine = PolledFissureEngine(poller)
+        self.async_database = database
+        self.delivery = delivery
+        self.presence_index = PresenceIndex()
+        self.emoji_dict = {}
+        self.loop = TaskTracker()
+        self.rest = rest
+
+        self.guilds = guilds
+        self._guilds = {guild.id: guild for guild in guilds}
+        self._channels = {channel.id: channel for guild in guilds for channel in guild.channels.values()}
+        self._users = {user.id: user for user in users}
+
+    def get_guild(self, guild_id: int) -> Optional[StubGuild]:
+        return self._guilds.get(guild_id)
+
+    def get_channel(self, channel_id: int) -> Optional[StubChannel]:
+        return self._channels.get(channel_id)
+
+    def get_user(self, user_id: int) -> Optional[StubUser]:
+        return self._users.get(user_id)
+
+
+class FissureReplayHarness:
+    """
+    Replays recorded worldstates through the fissure cog, one file per tick, against stub Discord objects and a
+    stub database.
+
+    Each tick runs the cog's update_fissure_list task once, waits for the new fissure notifications it starts, then
+    runs update_all_fissure_lists. The report gives the time each stage took and the database and REST calls made,
+    per tick and in total.
+    """
+
+    def __init__(self, paths: List[Union[str, Path]], servers: int = 50, log_channels: int = 2,
+                 list_channels: int = 1, users: int = 500, subscriptions_per_user: int = 3,
+                 thread_ratio: float = 0.5, digest_ratio: float = 0.0, rest_latency: float = 0.05,
+                 delivery_workers: int = 10,
+                 delivery_global_rate: float = 50, refresh_window: float = 1.0, seed: int = 0):
+        self.paths = paths
+        self.rest = StubRest(rest_latency)
+
+        rng = random.Random(seed)
+        guilds = [StubGuild(self.rest) for _ in range(servers)]
+        self.database = StubDatabase.seed(self.rest, guilds, log_channels, list_channels, users,
+                                          subscriptions_per_user, thread_ratio, digest_ratio, rng)
+        self.guilds = guilds
+        self.users = [StubUser(self.rest, user_id) for user_id in range(1, users + 1)]
+        self.delivery_workers = delivery_workers
+        self.delivery_global_rate = delivery_global_rate
+        self.refresh_window = refresh_window
+
+    @classmethod
+    def from_directory(cls, directory: Union[str, Path], **kwargs) -> 'FissureReplayHarness':
+        return cls(sorted(Path(directory).glob('*.json')), **kwargs)
+
+    async def run(self) -> Dict[str, Any]:
+        # Imported here so the stubs can be used without loading the cogs
+        from lib.cogs.Fissure import Fissure
+
+        poller = ReplayWorldstatePoller(self.paths)
+        delivery = DeliveryScheduler(workers=self.delivery_workers, global_rate=self.delivery_global_rate)
+        bot = StubBot(poller, self.database, self.rest, self.guilds, self.users, delivery)
+
+        cog = Fissure(bot)
+        # Refresh every list in one short window instead of pacing them for the live rate limits
+        cog.fissure_list_scheduler = RefreshScheduler(window=self.refresh_window, rate=10 ** 6)
+
+        ticks = []
+        start = time.perf_counter()
+        try:
+            for tick in range(len(poller)):
+                db_calls = sum(self.database.calls.values())
+                rest_calls = sum(self.rest.calls.values())
+                updates = len(bot.fissure_engine.update_log)
+
+                tick_start = time.perf_counter()
+                await cog.update_fissure_list()
+                await bot.loop.wait()
+                # Digests only coalesce within a tick here, since replayed ticks are not spaced out in time
+                await cog.fissure_dm_digests.flush_all()
+                notified = time.perf_counter()
+                await cog.update_all_fissure_lists()
+                end = time.perf_counter()
+
+                ticks.append({
+                    'tick': tick,
+                    'new_fissures': sum(len(fissures) for _, fissures in
+                                        list(bot.fissure_engine.update_log)[updates:]),
+                    'notify_duration': notified - tick_start,
+                    'list_duration': end - notified,
+                    'duration': end - tick_start,
+                    'db_calls': sum(self.database.calls.values()) - db_calls,
+                    'rest_calls': sum(self.rest.calls.values()) - rest_calls
+                })
+        finally:
+            await delivery.stop()
+
+        duration = time.perf_counter() - start
+        durations = [tick['duration'] for tick in ticks]
+        rest_calls = sum(self.rest.calls.values())
+
+        return {
+            'ticks': ticks,
+            'summary': {
+                'ticks': len(ticks),
+                'duration': duration,
+                'tick_p50': get_percentile(durations, 0.5),
+                'tick_p99': get_percentile(durations, 0.99),
+                'rest_calls_per_second': rest_calls / duration if duration else 0,
+                'db_calls': dict(self.database.calls),
+                'rest_calls': dict(self.rest.calls),
+                'delivery': delivery.get_metrics(),
+                'suppressed_fissure_list_edits': cog.suppressed_fissure_list_edits,
+                'dm_digests': cog.fissure_dm_digests.get_stats()
+            }
+        }
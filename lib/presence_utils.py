@@ -0,0 +1,108 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Set
+
+import discord
+
+STATUSES = ('online', 'idle', 'dnd', 'offline')
+
+
+class PresenceIndex:
+    """
+    Map of user ID to current status, kept up to date from gateway presence and member events so status lookups
+    don't have to walk every guild the bot is in.
+
+    Discord reports one status per user regardless of guild, so the index stores a single status per user and
+    tracks which guilds the user is a member of only to know when to forget them. Per-guild status counts are
+    kept alongside for server info embeds.
+    """
+
+    def __init__(self):
+        self._statuses: Dict[int, str] = {}
+        self._user_guilds: Dict[int, Set[int]] = defaultdict(set)
+        self._guild_members: Dict[int, Set[int]] = defaultdict(set)
+        self._guild_status_counts: Dict[int, Counter] = defaultdict(Counter)
+
+    def __len__(self) -> int:
+        return len(self._statuses)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._statuses
+
+    def build(self, guilds: Iterable[discord.Guild]) -> None:
+        """Replace the contents of the index with the members of the given guilds."""
+        self._statuses.clear()
+        self._user_guilds.clear()
+        self._guild_members.clear()
+        self._guild_status_counts.clear()
+
+        for guild in guilds:
+            self.add_guild(guild)
+
+    def add_guild(self, guild: discord.Guild) -> None:
+        for member in guild.members:
+            self.add_member(member)
+
+    def remove_guild(self, guild: discord.Guild) -> None:
+        for user_id in list(self._guild_members.get(guild.id, ())):
+            self._remove(guild.id, user_id)
+
+        self._guild_members.pop(guild.id, None)
+        self._guild_status_counts.pop(guild.id, None)
+
+    def add_member(self, member: discord.Member) -> None:
+        guild_id = member.guild.id
+        if member.id in self._guild_members[guild_id]:
+            self.update_member(member)
+            return
+
+        status = str(member.status)
+        if member.id in self._statuses:
+            self._set_status(member.id, status)
+        else:
+            self._statuses[member.id] = status
+
+        self._guild_members[guild_id].add(member.id)
+        self._user_guilds[member.id].add(guild_id)
+        self._guild_status_counts[guild_id][status] += 1
+
+    def remove_member(self, member: discord.Member) -> None:
+        self._remove(member.guild.id, member.id)
+
+    def update_member(self, member: discord.Member) -> None:
+        if member.id not in self._guild_members[member.guild.id]:
+            self.add_member(member)
+            return
+
+        self._set_status(member.id, str(member.status))
+
+    def _set_status(self, user_id: int, status: str) -> None:
+        old_status = self._statuses[user_id]
+        if old_status == status:
+            return
+
+        self._statuses[user_id] = status
+        for guild_id in self._user_guilds[user_id]:
+            counts = self._guild_status_counts[guild_id]
+            counts[old_status] -= 1
+            counts[status] += 1
+
+    def _remove(self, guild_id: int, user_id: int) -> None:
+        members = self._guild_members.get(guild_id)
+        if not members or user_id not in members:
+            return
+
+        members.discard(user_id)
+        self._guild_status_counts[guild_id][self._statuses[user_id]] -= 1
+
+        guilds = self._user_guilds[user_id]
+        guilds.discard(guild_id)
+        if not guilds:
+            del self._user_guilds[user_id]
+            del self._statuses[user_id]
+
+    def get_status(self, user_id: int, default: str = 'offline') -> str:
+        return self._statuses.get(user_id, default)
+
+    def get_status_counts(self, guild_id: int) -> Dict[str, int]:
+        counts = self._guild_status_counts.get(guild_id, Counter())
+        return {status: counts[status] for status in STATUSES}
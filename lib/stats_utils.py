@@ -0,0 +1,27 @@
+from collections import deque
+from typing import Deque, Iterable, Optional
+
+
+def get_percentile(values: Iterable[float], percentile: float) -> Optional[float]:
+    """Get the value at `percentile` (0 to 1) of a sample by nearest rank, or None if the sample is empty."""
+    values = sorted(values)
+    if not values:
+        return None
+
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+class RollingSample:
+    """The most recent `sample_size` observations of a value, such as a latency in seconds."""
+
+    def __init__(self, sample_size: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=sample_size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, value: float) -> None:
+        self.samples.append(value)
+
+    def get_percentile(self, percentile: float) -> Optional[float]:
+        return get_percentile(self.samples, percentile)
@@ -0,0 +1,92 @@
+import json
+from typing import Any, Dict, Iterator, TextIO, Tuple
+
+# Kept apart from tag_utils, which loads the whole file when it's imported.
+TAG_DATA_PATH = 'lib/data/tag_data.json'
+
+DEFAULT_READ_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _StreamReader:
+    """Buffered reader that decodes JSON values from a file object as they become available."""
+
+    def __init__(self, fp: TextIO, read_size: int):
+        self.fp = fp
+        self.read_size = read_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        data = self.fp.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+    def next_char(self) -> str:
+        """Skip whitespace and return the next character without consuming it, or an empty string at the end."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer) or not self._fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, chars: str) -> str:
+        char = self.next_char()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in tag data, got {char or 'end of file'!r}")
+        self.position += 1
+        return char
+
+    def decode(self) -> Any:
+        """Decode the next JSON value, reading more of the file until it's complete."""
+        self.next_char()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+
+            # A number could continue past the end of the buffer
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+
+            self.position = end
+            return value
+
+
+def iter_tag_data(path: str = TAG_DATA_PATH, read_size: int = DEFAULT_READ_SIZE) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream tags from a file in the legacy tag_data.json format, a single object mapping tag names to
+    {"content": ..., "autodelete": ..., "dm": ...}, without loading the whole file.
+
+    Args:
+        path: The path of the tag data file.
+        read_size: The number of characters to read from the file at a time.
+
+    Returns:
+        An iterator of (tag name, tag info) pairs in file order.
+    """
+    with open(path) as fp:
+        reader = _StreamReader(fp, read_size)
+        reader.expect('{')
+        if reader.next_char() == '}':
+            return
+
+        while True:
+            tag_name = reader.decode()
+            reader.expect(':')
+            tag_info = reader.decode()
+            yield tag_name, tag_info
+
+            if reader.expect(',}') == '}':
+                return
@@ -0,0 +1,117 @@
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fissure_engine.fissure_engine import Fissure
+
+from lib.stats_utils import RollingSample
+
+# Stages a new fissure goes through, in order. Latencies are measured from the fissure's activation time.
+STAGES = ('detected', 'log_post', 'thread_mention', 'dm')
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 1800)
+
+
+class RollingHistogram(RollingSample):
+    """Latency histogram over the most recent `sample_size` observations."""
+
+    def __init__(self, sample_size: int = 5000, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(sample_size)
+        self.buckets = buckets
+
+    def get_bucket_counts(self) -> List[Tuple[str, int]]:
+        """Cumulative counts per bucket upper bound, ending with +Inf."""
+        counts = [0] * (len(self.buckets) + 1)
+        for sample in self.samples:
+            counts[bisect_left(self.buckets, sample)] += 1
+
+        cumulative = []
+        total = 0
+        for bound, count in zip([str(bucket) for bucket in self.buckets] + ['+Inf'], counts):
+            total += count
+            cumulative.append((bound, total))
+
+        return cumulative
+
+
+class FissureTrace:
+    """Timestamps of the stages one fissure went through. Fan-out stages keep their first and last time."""
+
+    def __init__(self, fissure: Fissure):
+        self.fissure = fissure
+        self.activation = fissure.activation.timestamp()
+        self.first: Dict[str, float] = {}
+        self.last: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def mark(self, stage: str, timestamp: float) -> None:
+        self.first.setdefault(stage, timestamp)
+        self.last[stage] = timestamp
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+
+class FissureTracer:
+    """
+    Records when each new fissure reaches each notification stage, keeping the traces of the most recent fissures
+    and a rolling histogram per stage of the time since activation. Every delivery is a sample, so a fissure posted
+    to 300 log channels adds 300 samples to the log_post histogram.
+    """
+
+    def __init__(self, max_traces: int = 500, sample_size: int = 5000):
+        self.max_traces = max_traces
+        self.traces: 'OrderedDict[int, FissureTrace]' = OrderedDict()
+        self.histograms = {stage: RollingHistogram(sample_size) for stage in STAGES}
+
+    def mark(self, fissure: Fissure, stage: str, timestamp: float = None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+
+        key = hash(fissure)
+        trace = self.traces.get(key)
+        if trace is None:
+            trace = self.traces[key] = FissureTrace(fissure)
+            if len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+
+        trace.mark(stage, timestamp)
+        self.histograms[stage].add(max(0.0, timestamp - trace.activation))
+
+    def get_summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            stage: {
+                'count': len(histogram),
+                'p50': histogram.get_percentile(0.5),
+                'p90': histogram.get_percentile(0.9),
+                'p99': histogram.get_percentile(0.99)
+            }
+            for stage, histogram in self.histograms.items()
+        }
+
+    def export(self) -> str:
+        """Export the histograms and recent traces in the Prometheus text exposition format."""
+        lines = ['# HELP fissure_stage_latency_seconds Time from fissure activation to each notification stage.',
+                 '# TYPE fissure_stage_latency_seconds histogram']
+        for stage, histogram in self.histograms.items():
+            for bound, count in histogram.get_bucket_counts():
+                lines.append(f'fissure_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'fissure_stage_latency_seconds_sum{{stage="{stage}"}} {sum(histogram.samples):.3f}')
+            lines.append(f'fissure_stage_latency_seconds_count{{stage="{stage}"}} {len(histogram)}')
+
+        lines += ['# HELP fissure_trace_stage_seconds Time from activation to the first and last time a recent '
+                  'fissure reached each stage.',
+                  '# TYPE fissure_trace_stage_seconds gauge']
+        for trace in self.traces.values():
+            fissure = trace.fissure
+            labels = (f'node="{fissure.node}",era="{fissure.era}",fissure_type="{fissure.fissure_type}",'
+                      f'activation="{int(trace.activation)}"')
+            for stage in STAGES:
+                if stage not in trace.first:
+                    continue
+
+                for edge, timestamps in (('first', trace.first), ('last', trace.last)):
+                    lines.append(f'fissure_trace_stage_seconds{{{labels},stage="{stage}",edge="{edge}"}} '
+                                 f'{timestamps[stage] - trace.activation:.3f}')
+
+        return '\n'.join(lines) + '\n'
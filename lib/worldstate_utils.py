@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Union
+
+import aiohttp
+from aiohttp import web
+from fissure_engine.fissure_engine import FissureEngine
+
+from lib.stats_utils import get_percentile
+
+WORLDSTATE_URL = "http://5.161.72.79/worldstate.php"
+FISSURE_SECTIONS = ('ActiveMissions', 'VoidStorms')
+
+
+class WorldstatePoller:
+    """
+    Fetches the worldstate over a single long-lived session and works out whether its fissure section changed.
+
+    Requests are conditional (ETag / If-Modified-Since), so an unchanged worldstate usually costs a 304 and no body.
+    A full response whose body is byte-for-byte the same as the last one is not parsed at all, and a parsed one is
+    only reported as changed if the hash of its fissure section differs from the last.
+    """
+
+    DEFAULT_TIMEOUT = 10
+    SAMPLE_SIZE = 360
+
+    def __init__(self, data_url: str = WORLDSTATE_URL, timeout: float = DEFAULT_TIMEOUT):
+        self.logger = logging.getLogger('worldstate')
+        self.data_url = data_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self.world_state: Optional[Dict[str, Any]] = None
+        self._etag = None
+        self._last_modified = None
+        self._body_hash = None
+        self._fissure_hash = None
+
+        self.fetches = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.changed = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.latencies: Deque[float] = deque(maxlen=self.SAMPLE_SIZE)
+        self.payload_sizes: Deque[int] = deque(maxlen=self.SAMPLE_SIZE)
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+
+        return headers
+
+    @staticmethod
+    def get_fissure_hash(world_state: Dict[str, Any]) -> str:
+        fissure_data = {section: world_state.get(section, []) for section in FISSURE_SECTIONS}
+        return hashlib.sha256(json.dumps(fissure_data, sort_keys=True).encode()).hexdigest()
+
+    async def poll(self) -> bool:
+        """
+        Fetch the worldstate once.
+
+        Returns: True if the fissure section changed since the last poll (always True for the first one).
+
+        Raises:
+            aiohttp.ClientError: If the request fails.
+            asyncio.TimeoutError: If the request times out.
+        """
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+
+        self.fetches += 1
+        start = time.perf_counter()
+        try:
+            async with self.session.get(self.data_url, headers=self._get_headers()) as res:
+                if res.status == 304:
+                    self.latencies.append(time.perf_counter() - start)
+                    self.not_modified += 1
+                    return False
+
+                res.raise_for_status()
+                body = await res.read()
+                self._etag = res.headers.get('ETag')
+                self._last_modified = res.headers.get('Last-Modified')
+        except Exception:
+            self.errors += 1
+            raise
+
+        self.latencies.append(time.perf_counter() - start)
+        self.payload_sizes.append(len(body))
+        self.bytes_received += len(body)
+
+        body_hash = hashlib.sha256(body).hexdigest()
+        if body_hash == self._body_hash and self.world_state is not None:
+            self.unchanged += 1
+            return False
+        self._body_hash = body_hash
+
+        return self.set_world_state(json.loads(body))
+
+    def set_world_state(self, world_state: Dict[str, Any]) -> bool:
+        """
+        Replace the current worldstate if its fissure section differs from the current one.
+
+        Returns: True if the fissure section changed.
+        """
+        fissure_hash = self.get_fissure_hash(world_state)
+        if fissure_hash == self._fissure_hash:
+            self.unchanged += 1
+            return False
+
+        self.world_state = world_state
+        self._fissure_hash = fissure_hash
+        self.changed += 1
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'fetches': self.fetches,
+            'not_modified': self.not_modified,
+            'unchanged': self.unchanged,
+            'changed': self.changed,
+            'errors': self.errors,
+            'change_rate': self.changed / self.fetches if self.fetches else 0,
+            'latency_p50': get_percentile(self.latencies, 0.5),
+            'latency_max': max(self.latencies, default=None),
+            'average_payload_size': sum(self.payload_sizes) / len(self.payload_sizes) if self.payload_sizes else None,
+            'bytes_received': self.bytes_received
+        }
+
+
+class ReplayWorldstatePoller(WorldstatePoller):
+    """
+    Poller that reads recorded worldstate files instead of the endpoint, one file per poll, staying on the last file
+    once they run out.
+
+    By default the fissure timestamps are shifted so the first recording starts now. Otherwise fissures from an old
+    recording would already be expired and dropped by the fissure engine.
+    """
+
+    def __init__(self, paths: List[Union[str, Path]], rebase: bool = True):
+        super().__init__(data_url='replay')
+        self.payloads = [json.loads(Path(path).read_bytes()) for path in paths]
+        self.index = 0
+
+        if rebase and self.payloads:
+            self.rebase(self.payloads, int(time.time() * 1000) - self.get_recorded_time(self.payloads[0]))
+
+    @classmethod
+    def from_directory(cls, directory: Union[str, Path], rebase: bool = True) -> 'ReplayWorldstatePoller':
+        return cls(sorted(Path(directory).glob('*.json')), rebase)
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    @staticmethod
+    def get_recorded_time(world_state: Dict[str, Any]) -> int:
+        """The time a worldstate was generated, in milliseconds, falling back to its earliest fissure activation."""
+        if 'Time' in world_state:
+            return int(world_state['Time']) * 1000
+
+        activations = [int(mission['Activation']['$date']['$numberLong'])
+                       for section in FISSURE_SECTIONS for mission in world_state.get(section, [])]
+        return min(activations, default=int(time.time() * 1000))
+
+    @staticmethod
+    def rebase(payloads: List[Dict[str, Any]], offset: int) -> None:
+        for world_state in payloads:
+            for section in FISSURE_SECTIONS:
+                for mission in world_state.get(section, []):
+                    for key in ('Activation', 'Expiry'):
+                        date = mission[key]['$date']
+                        date['$numberLong'] = str(int(date['$numberLong']) + offset)
+
+    async def poll(self) -> bool:
+        self.fetches += 1
+        world_state = self.payloads[min(self.index, len(self.payloads) - 1)]
+        self.index += 1
+
+        return self.set_world_state(world_state)
+
+    async def close(self) -> None:
+        pass
+
+
+async def record_worldstates(directory: Union[str, Path], count: int, interval: float,
+                             data_url: str = WORLDSTATE_URL) -> int:
+    """
+    Poll the worldstate and save every version with changed fissures to `directory`, for replaying later.
+
+    Args:
+        directory: The directory to save the worldstate files in.
+        count: The number of polls to make.
+        interval: The time between polls, in seconds.
+        data_url: The worldstate endpoint.
+
+    Returns: The number of worldstate files saved.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    poller = WorldstatePoller(data_url)
+    saved = 0
+    try:
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+
+            try:
+                changed = await poller.poll()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                poller.logger.warning(f"Failed to fetch the worldstate: {e}")
+                continue
+
+            if changed:
+                path = directory / f"worldstate_{int(time.time() * 1000)}.json"
+                path.write_text(json.dumps(poller.world_state))
+                saved += 1
+    finally:
+        await poller.close()
+
+    return saved
+
+
+class PolledFissureEngine(FissureEngine):
+    """FissureEngine that builds its lists from the poller's last worldstate instead of downloading it again."""
+
+    def __init__(self, poller: WorldstatePoller):
+        super().__init__()
+        self.poller = poller
+
+    async def get_world_state(self, data_url: str = None) -> Dict[str, Any]:
+        return self.poller.world_state
+
+    def has_expired_fissures(self) -> bool:
+        now = datetime.now()
+        return any(fissure.expiry < now for fissures in self.fissure_lists.values() for fissure in fissures)
+
+
+class RecordedWorldstateServer:
+    """
+    Local stand-in for the worldstate endpoint that serves recorded worldstate files in order.
+
+    Each file is served for `requests_per_file` requests before moving on to the next, and the last file is served
+    from then on. Responses carry an ETag and honour If-None-Match, like the real endpoint.
+    """
+
+    def __init__(self, paths: List[Union[str, Path]], requests_per_file: int = 1):
+        self.payloads = [Path(path).read_bytes() for path in paths]
+        self.requests_per_file = requests_per_file
+        self.requests = 0
+
+    @classmethod
+    def from_directory(cls, directory: Union[str, Path], requests_per_file: int = 1) -> 'RecordedWorldstateServer':
+        return cls(sorted(Path(directory).glob('*.json')), requests_per_file)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        index = min(self.requests // self.requests_per_file, len(self.payloads) - 1)
+        self.requests += 1
+
+        body = self.payloads[index]
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    def get_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/worldstate.php', self.handle)
+        return app